@@ -0,0 +1,307 @@
+"""Offline benchmarks for the physics kernels and end-to-end per-coordinate processing.
+
+Usage: `PYTHONPATH=. python benchmarks/run_benchmarks.py [--benchmarks NAME ...] [--save_baseline]`
+
+Results are written to benchmarks/results/ and compared with benchmarks/baseline.json when it exists.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Final
+
+import numpy as np
+from astropy import units as u
+
+from benchmarks.synthetic_era5 import (
+    create_synthetic_climate_data,
+    write_synthetic_month_datasets,
+)
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.sky_temperature import SkyTemperature
+from src.calculators.total_power_output import TotalPowerOutput
+from src.dates import get_hourly_datetimes_between_period
+from src.processing.save_output_between_dates import save_power_output_between_dates
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS_DIR: Final[str] = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR: Final[str] = os.path.join(BENCHMARKS_DIR, "results")
+BASELINE_FILEPATH: Final[str] = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+LAT: Final[float] = 53.4
+LON: Final[float] = -6.3
+YEAR: Final[int] = 2022
+MONTH: Final[int] = 1
+BANDGAP: Final[u.Quantity] = 0.17 * u.eV
+
+# (t_sky, t_cell) pairs in kelvin, spread over the range seen in ERA5 data so that cache keys don't collide
+TEMPERATURE_PAIRS: Final[list[tuple[float, float]]] = [
+    (240.3, 265.1),
+    (255.7, 280.4),
+    (262.2, 290.9),
+    (270.0, 300.0),
+    (281.6, 310.2),
+]
+
+
+def _photon_flux_emitted_from_semiconductor() -> Callable[[], Any]:
+    total_power_output: Final[TotalPowerOutput] = TotalPowerOutput(E_g=BANDGAP)
+
+    def run() -> None:
+        for t_sky, _ in TEMPERATURE_PAIRS:
+            total_power_output.get_photon_flux_emitted_from_semiconductor(
+                T=t_sky * u.K, Delta_mu=-0.05 * u.eV
+            )
+
+    return run
+
+
+def _maximum_power_point_tracker_cold_cache() -> Callable[[], Any]:
+    def run() -> None:
+        MaximumPowerPointTracker.cache.clear()
+        for t_sky, t_cell in TEMPERATURE_PAIRS:
+            MaximumPowerPointTracker(
+                t_sky=t_sky * u.K, t_cell=t_cell * u.K, E_g=BANDGAP
+            )
+
+    return run
+
+
+def _maximum_power_point_tracker_warm_cache() -> Callable[[], Any]:
+    def run() -> None:
+        for t_sky, t_cell in TEMPERATURE_PAIRS:
+            MaximumPowerPointTracker(
+                t_sky=t_sky * u.K, t_cell=t_cell * u.K, E_g=BANDGAP
+            )
+
+    MaximumPowerPointTracker.cache.clear()
+    run()
+    return run
+
+
+def _sky_temperature_day() -> Callable[[], Any]:
+    sky_temperature: Final[SkyTemperature] = SkyTemperature(
+        surface_temperature_obj=create_synthetic_climate_data(
+            lat=LAT, lon=LON, year=YEAR, month=MONTH
+        ),
+        lat=LAT,
+        lon=LON,
+    )
+    dates: Final[list[datetime]] = get_hourly_datetimes_between_period(
+        start_date=datetime(YEAR, MONTH, 2), end_date=datetime(YEAR, MONTH, 2)
+    )
+
+    def run() -> None:
+        for date in dates:
+            sky_temperature.get_sky_temperature(date=date, formula="martin-berdahl")
+
+    return run
+
+
+def _climate_data_open() -> Callable[[], Any]:
+    directory: Final[str] = tempfile.mkdtemp(prefix="benchmark_era5_")
+    filepaths: Final[dict[tuple[int, str], str]] = write_synthetic_month_datasets(
+        directory=directory, lat=LAT, lon=LON, year=YEAR, month=MONTH
+    )
+
+    def run() -> None:
+        CopernicusClimateData.from_datasets(
+            temperature_datasets={
+                key: CopernicusClimateData.open_dataset(filepath=filepath)
+                for key, filepath in filepaths.items()
+            }
+        )
+
+    return run
+
+
+def _climate_data_extract_day() -> Callable[[], Any]:
+    climate_data_obj: Final[CopernicusClimateData] = create_synthetic_climate_data(
+        lat=LAT, lon=LON, year=YEAR, month=MONTH
+    )
+    dates: Final[list[datetime]] = get_hourly_datetimes_between_period(
+        start_date=datetime(YEAR, MONTH, 2), end_date=datetime(YEAR, MONTH, 2)
+    )
+
+    def run() -> None:
+        for date in dates:
+            for dataset_shortname in ["skt", "t2m", "tcc", "sp", "cbh"]:
+                climate_data_obj.get_value_from_dataset(
+                    lat=LAT, lon=LON, dataset_shortname=dataset_shortname, date=date
+                )
+
+    return run
+
+
+def _save_power_output_between_dates_month() -> Callable[[], Any]:
+    climate_data_obj: Final[CopernicusClimateData] = create_synthetic_climate_data(
+        lat=LAT, lon=LON, year=YEAR, month=MONTH
+    )
+    directory: Final[str] = tempfile.mkdtemp(prefix="benchmark_output_")
+
+    def run() -> None:
+        MaximumPowerPointTracker.cache.clear()
+        working_directory: Final[str] = os.getcwd()
+        os.chdir(directory)
+        try:
+            save_power_output_between_dates(
+                climate_data_obj=climate_data_obj,
+                lon=LON,
+                lat=LAT,
+                start_date=datetime(YEAR, MONTH, 1),
+                end_date=datetime(YEAR, MONTH, 31),
+                emissivity_method="martin-berdahl",
+            )
+        finally:
+            os.chdir(working_directory)
+
+    return run
+
+
+# name: (setup returning the callable to time, default number of repeats)
+BENCHMARKS: Final[dict[str, tuple[Callable[[], Callable[[], Any]], int]]] = {
+    "total_power_output.photon_flux": (_photon_flux_emitted_from_semiconductor, 5),
+    "maximum_power_point_tracker.cold_cache": (
+        _maximum_power_point_tracker_cold_cache,
+        3,
+    ),
+    "maximum_power_point_tracker.warm_cache": (
+        _maximum_power_point_tracker_warm_cache,
+        100,
+    ),
+    "sky_temperature.day": (_sky_temperature_day, 5),
+    "climate_data.open": (_climate_data_open, 5),
+    "climate_data.extract_day": (_climate_data_extract_day, 5),
+    "save_power_output_between_dates.month": (
+        _save_power_output_between_dates_month,
+        1,
+    ),
+}
+
+
+def run_benchmark(name: str, repeats: int | None = None) -> dict[str, float | int]:
+    setup, default_repeats = BENCHMARKS[name]
+    run: Final[Callable[[], Any]] = setup()
+    timings: list[float] = []
+    for _ in range(repeats if repeats is not None else default_repeats):
+        start_time: float = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start_time)
+
+    result: Final[dict[str, float | int]] = {
+        "repeats": len(timings),
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "mean_seconds": statistics.fmean(timings),
+    }
+    logger.info(
+        "%s: median %.6fs, min %.6fs over %d repeats",
+        name,
+        result["median_seconds"],
+        result["min_seconds"],
+        result["repeats"],
+    )
+    return result
+
+
+def compare_with_baseline(
+    results: dict[str, dict[str, float | int]],
+    baseline: dict[str, dict[str, float | int]],
+    tolerance: float,
+) -> list[str]:
+    """Log the median ratio against the baseline for each benchmark, returning the names of regressions"""
+    regressions: list[str] = []
+    for name, result in results.items():
+        if name not in baseline:
+            logger.info("%s: no baseline", name)
+            continue
+        ratio: float = result["median_seconds"] / baseline[name]["median_seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+        logger.info(
+            "%s: %.2fx baseline median%s",
+            name,
+            ratio,
+            " (REGRESSION)" if ratio > 1 + tolerance else "",
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="Offline benchmarks")
+    parser.add_argument(
+        "--benchmarks",
+        help="Names of the benchmarks to run. Runs all if not passed.",
+        choices=list(BENCHMARKS),
+        nargs="+",
+        default=list(BENCHMARKS),
+    )
+    parser.add_argument(
+        "--repeats",
+        help="If passed, overrides the number of timed repeats of every benchmark",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--save_baseline",
+        help="If passed, the results are also saved as the new baseline",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--tolerance",
+        help="Fractional slowdown of the median relative to the baseline that counts as a regression",
+        type=float,
+        default=0.1,
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    results: Final[dict[str, dict[str, float | int]]] = {
+        name: run_benchmark(name=name, repeats=args.repeats) for name in args.benchmarks
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    report: Final[dict[str, Any]] = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    with open(
+        os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"),
+        "w",
+    ) as outfile:
+        json.dump(report, outfile, indent=2)
+
+    regressions: list[str] = []
+    if os.path.isfile(BASELINE_FILEPATH):
+        with open(BASELINE_FILEPATH, "r") as infile:
+            regressions = compare_with_baseline(
+                results=results,
+                baseline=json.load(infile)["results"],
+                tolerance=args.tolerance,
+            )
+
+    if args.save_baseline:
+        baseline: dict[str, Any] = report
+        if os.path.isfile(BASELINE_FILEPATH):
+            with open(BASELINE_FILEPATH, "r") as infile:
+                baseline = json.load(infile)
+            baseline["results"].update(results)
+        with open(BASELINE_FILEPATH, "w") as outfile:
+            json.dump(baseline, outfile, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+from datetime import datetime, timedelta
+from typing import Final
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from src.api.copernicus_climate_data import CopernicusClimateData
+
+
+def _get_grid(centre: float, resolution: float) -> np.ndarray:
+    return np.round(
+        np.arange(np.floor(centre), np.ceil(centre) + resolution / 2, resolution), 2
+    )
+
+
+def _diurnal_field(
+    valid_times: pd.DatetimeIndex,
+    shape: tuple[int, ...],
+    mean: float,
+    amplitude: float,
+    noise: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """A daily cycle peaking mid-afternoon, with Gaussian noise. The leading dimensions of `shape` must hold
+    len(valid_times) values, and the cycle is broadcast over the trailing (latitude, longitude) dimensions.
+    """
+    cycle: Final[np.ndarray] = mean + amplitude * np.sin(
+        2 * np.pi * (np.asarray(valid_times.hour) - 9) / 24
+    )
+    return (
+        cycle.reshape(shape[:-2] + (1, 1)) + rng.normal(scale=noise, size=shape)
+    ).astype(np.float32)
+
+
+def _hourly_dataset(
+    shortname: str,
+    times: pd.DatetimeIndex,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    values: np.ndarray,
+) -> xr.Dataset:
+    return xr.Dataset(
+        {shortname: (("time", "latitude", "longitude"), values)},
+        coords={"time": times, "latitude": lats[::-1], "longitude": lons},
+    )
+
+
+def _stepped_dataset(
+    shortname: str,
+    times: pd.DatetimeIndex,
+    steps: pd.TimedeltaIndex,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    values: np.ndarray,
+) -> xr.Dataset:
+    return xr.Dataset(
+        {shortname: (("time", "step", "latitude", "longitude"), values)},
+        coords={
+            "time": times,
+            "step": steps,
+            "latitude": lats[::-1],
+            "longitude": lons,
+        },
+    )
+
+
+def create_synthetic_month_datasets(
+    lat: float, lon: float, year: int, month: int, seed: int = 0
+) -> dict[tuple[int, str], xr.Dataset]:
+    """Deterministic datasets laid out like the ERA5 and ERA5-Land GRIB files opened by CopernicusClimateData:
+    hourly `skt`, `t2m` and `tcc`; `sp` and `d2m` as (day, hourly step) with the first day being the last day of
+    the previous month; `cbh` as twice-daily forecasts with hourly steps."""
+    rng: Final[np.random.Generator] = np.random.default_rng(seed)
+    month_start: Final[datetime] = datetime(year, month, 1)
+    month_end: Final[datetime] = (month_start + timedelta(days=32)).replace(day=1)
+
+    land_lats: Final[np.ndarray] = _get_grid(centre=lat, resolution=0.1)
+    land_lons: Final[np.ndarray] = _get_grid(centre=lon, resolution=0.1)
+    single_level_lats: Final[np.ndarray] = _get_grid(centre=lat, resolution=0.25)
+    single_level_lons: Final[np.ndarray] = _get_grid(centre=lon, resolution=0.25)
+
+    hourly_times: Final[pd.DatetimeIndex] = pd.date_range(
+        month_start, month_end, freq="h", inclusive="left"
+    )
+    single_level_shape: Final[tuple[int, int, int]] = (
+        len(hourly_times),
+        len(single_level_lats),
+        len(single_level_lons),
+    )
+
+    daily_times: Final[pd.DatetimeIndex] = pd.date_range(
+        month_start - timedelta(days=1), month_end, freq="D", inclusive="left"
+    )
+    hourly_steps: Final[pd.TimedeltaIndex] = pd.timedelta_range(
+        start="1h", periods=24, freq="h"
+    )
+    land_valid_times: Final[pd.DatetimeIndex] = pd.DatetimeIndex(
+        (daily_times.values[:, np.newaxis] + hourly_steps.values).ravel()
+    )
+    land_shape: Final[tuple[int, int, int, int]] = (
+        len(daily_times),
+        len(hourly_steps),
+        len(land_lats),
+        len(land_lons),
+    )
+
+    forecast_times: Final[pd.DatetimeIndex] = pd.date_range(
+        month_start - timedelta(hours=6), month_end, freq="12h"
+    )
+    forecast_steps: Final[pd.TimedeltaIndex] = pd.timedelta_range(
+        start="1h", periods=12, freq="h"
+    )
+    cloud_base_height: Final[np.ndarray] = rng.uniform(
+        low=200,
+        high=4000,
+        size=(
+            len(forecast_times),
+            len(forecast_steps),
+            len(single_level_lats),
+            len(single_level_lons),
+        ),
+    ).astype(np.float32)
+
+    datasets: dict[str, xr.Dataset] = {
+        "skt": _hourly_dataset(
+            shortname="skt",
+            times=hourly_times,
+            lats=single_level_lats,
+            lons=single_level_lons,
+            values=_diurnal_field(
+                hourly_times, single_level_shape, 280.0, 6.0, 0.5, rng
+            ),
+        ),
+        "t2m": _hourly_dataset(
+            shortname="t2m",
+            times=hourly_times,
+            lats=single_level_lats,
+            lons=single_level_lons,
+            values=_diurnal_field(
+                hourly_times, single_level_shape, 279.0, 4.0, 0.5, rng
+            ),
+        ),
+        "tcc": _hourly_dataset(
+            shortname="tcc",
+            times=hourly_times,
+            lats=single_level_lats,
+            lons=single_level_lons,
+            values=rng.uniform(size=single_level_shape).astype(np.float32),
+        ),
+        "sp": _stepped_dataset(
+            shortname="sp",
+            times=daily_times,
+            steps=hourly_steps,
+            lats=land_lats,
+            lons=land_lons,
+            values=_diurnal_field(
+                land_valid_times, land_shape, 100500.0, 150.0, 50.0, rng
+            ),
+        ),
+        "d2m": _stepped_dataset(
+            shortname="d2m",
+            times=daily_times,
+            steps=hourly_steps,
+            lats=land_lats,
+            lons=land_lons,
+            values=_diurnal_field(land_valid_times, land_shape, 275.0, 2.0, 0.5, rng),
+        ),
+        "cbh": _stepped_dataset(
+            shortname="cbh",
+            times=forecast_times,
+            steps=forecast_steps,
+            lats=single_level_lats,
+            lons=single_level_lons,
+            values=cloud_base_height,
+        ),
+    }
+    return {(month, shortname): dataset for shortname, dataset in datasets.items()}
+
+
+def create_synthetic_climate_data(
+    lat: float, lon: float, year: int, month: int, seed: int = 0
+) -> CopernicusClimateData:
+    return CopernicusClimateData.from_datasets(
+        temperature_datasets=create_synthetic_month_datasets(
+            lat=lat, lon=lon, year=year, month=month, seed=seed
+        )
+    )
+
+
+def write_synthetic_month_datasets(
+    directory: str, lat: float, lon: float, year: int, month: int, seed: int = 0
+) -> dict[tuple[int, str], str]:
+    """Write the synthetic datasets as NetCDF files, returning their filepaths keyed like the datasets"""
+    filepaths: dict[tuple[int, str], str] = dict()
+    for key, dataset in create_synthetic_month_datasets(
+        lat=lat, lon=lon, year=year, month=month, seed=seed
+    ).items():
+        filepath: str = os.path.join(directory, f"era5_{key[1]}_{year}_{month}.nc")
+        dataset.to_netcdf(filepath)
+        filepaths[key] = filepath
+    return filepaths
@@ -1,16 +1,27 @@
 import argparse
+import logging
 from datetime import datetime
 from typing import Final, Literal
 
+from src.api.grib_cache import grib_cache
+from src.calculators.device_spec import DeviceSpec
+from src.logs import configure_logging
 from src.plots.extra import ExtraPlots
+from src.plots.figure_renderer import renderer
 from src.plots.resource_assessment_choropleth_map import CreateChoroplethMap
 from src.plots.temperature_plot import CreateTemperaturePlots
 from src.processing.process_power_output import (
     process_batch,
     save_test_power_output_for_set_lon_lat,
 )
+from src.processing.stage_cache import StageCache
+from src.profiling import profiler
+from src.service.power_service import serve
+from src.stats.regional_statistics import RegionalStatistics
 from src.stats.summary_statistics import SummaryStatistics
 
+logger = logging.getLogger(__name__)
+
 parser = argparse.ArgumentParser(prog="Thermoradiative Power Output Prediction")
 parser.add_argument(
     "--batch_start",
@@ -18,6 +29,20 @@ parser.add_argument(
     type=int,
     required=False,
 )
+parser.add_argument(
+    "--start_date",
+    help="First day of the period to process, and of the outputs to plot and summarise, in ISO format. "
+    "Example usage: `python main.py --batch_start 0 --start_date 2023-01-01 --end_date 2023-01-31`",
+    type=datetime.fromisoformat,
+    default=datetime(2023, 1, 1),
+)
+parser.add_argument(
+    "--end_date",
+    help="Last day of the period to process, and of the outputs to plot and summarise, in ISO format. "
+    "Example usage: `python main.py --batch_start 0 --start_date 2023-01-01 --end_date 2023-01-31`",
+    type=datetime.fromisoformat,
+    default=datetime(2023, 1, 31),
+)
 parser.add_argument(
     "--skip_worldmap",
     help="If passed, the application will not create worldmap with saved datapoints overlaid. "
@@ -25,6 +50,22 @@ parser.add_argument(
     action="store_true",
     required=False,
 )
+parser.add_argument(
+    "--raster_map_resolution",
+    help="If passed, the worldmap is rendered as a raster with cells of this many degrees, and the grid is also "
+    "exported as NetCDF."
+    "Example usage: `python main.py --skip_predict --raster_map_resolution 0.25`",
+    type=float,
+    required=False,
+)
+parser.add_argument(
+    "--raster_geotiff",
+    help="With --raster_map_resolution, also export the grid as GeoTIFF. Requires rioxarray, installed by "
+    "`poetry install --extras geotiff`. "
+    "Example usage: `python main.py --skip_predict --raster_map_resolution 0.25 --raster_geotiff`",
+    action="store_true",
+    required=False,
+)
 parser.add_argument(
     "--skip_tempplot",
     help="If passed, the application will not create plots of surface vs sky temperatures. "
@@ -32,6 +73,28 @@ parser.add_argument(
     action="store_true",
     required=False,
 )
+parser.add_argument(
+    "--plot_max_points",
+    help="Maximum number of points per series in the PDF plots of surface vs sky temperatures, which are "
+    "downsampled to preserve their shape. 0 plots every point."
+    "Example usage: `python main.py --skip_predict --plot_max_points 1000 --downsampling_method min-max`",
+    type=int,
+    default=2000,
+)
+parser.add_argument(
+    "--downsampling_method",
+    help="How plots of surface vs sky temperatures are downsampled."
+    "Example usage: `python main.py --skip_predict --downsampling_method min-max`",
+    choices=["lttb", "min-max"],
+    default="lttb",
+)
+parser.add_argument(
+    "--tempplot_html",
+    help="If passed, plots of surface vs sky temperatures are also exported as interactive HTML with every point."
+    "Example usage: `python main.py --skip_predict --tempplot_html`",
+    action="store_true",
+    required=False,
+)
 parser.add_argument(
     "--skip_predict",
     help="If passed, the application will not process potential power output at locations"
@@ -46,6 +109,21 @@ parser.add_argument(
     action="store_true",
     required=False,
 )
+parser.add_argument(
+    "--consolidated_summarystatistics",
+    help="If passed, summary statistics for all locations are computed together and written to one table, "
+    "without plots unless --summarystatistics_plots is also passed."
+    "Example usage: `python main.py --consolidated_summarystatistics`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--summarystatistics_plots",
+    help="If passed with --consolidated_summarystatistics, also renders the per-location bar charts."
+    "Example usage: `python main.py --consolidated_summarystatistics --summarystatistics_plots`",
+    action="store_true",
+    required=False,
+)
 parser.add_argument(
     "--skip_extraplots",
     help="If passed, the application will not create generic plots to show relationships"
@@ -61,49 +139,321 @@ parser.add_argument(
     nargs=1,
     default=["martin-berdahl"],
 )
+parser.add_argument(
+    "--log_level",
+    help="If passed, sets the logging level. Per-hour detail is only logged at DEBUG."
+    "Example usage: `python main.py --log_level DEBUG`",
+    choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+    default="INFO",
+)
+parser.add_argument(
+    "--progress_json",
+    help="If passed, appends machine-readable progress reports to this file, one JSON object per line."
+    "Example usage: `python main.py --batch_start 0 --progress_json progress.jsonl`",
+    type=str,
+    required=False,
+)
+parser.add_argument(
+    "--profile",
+    help="If passed, records wall time, call counts and peak memory per pipeline stage and saves a JSON report "
+    "and folded stacks for flamegraphs to data/out/profile/."
+    "Example usage: `python main.py --profile`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--incremental",
+    help="If passed, existing results with the same start date are extended so that only missing hours are computed."
+    "Example usage: `python main.py --batch_start 0 --incremental`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--resolution",
+    help="If passed, sets the spacing in degrees of the grid of land coordinates to process, down to 0.1. "
+    "Changing it changes which coordinates --batch_start refers to."
+    "Example usage: `python main.py --batch_start 0 --resolution 0.25`",
+    type=float,
+    default=5.0,
+)
+parser.add_argument(
+    "--pipeline",
+    help="If passed, climate data for upcoming coordinates is downloaded and opened while the current ones are "
+    "computed and written."
+    "Example usage: `python main.py --batch_start 0 --pipeline`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--prefetch",
+    help="With --pipeline, how many month windows of climate data are downloaded and opened ahead of the one being "
+    "computed, which also bounds how many are held in memory at once. "
+    "Example usage: `python main.py --batch_start 0 --pipeline --prefetch 4`",
+    type=int,
+    default=2,
+)
+parser.add_argument(
+    "--headless_plots",
+    help="If passed, figures are not shown. They are exported in batches through persistent kaleido processes, "
+    "skipping figures whose data has not changed since they were last exported."
+    "Example usage: `python main.py --skip_predict --headless_plots --render_processes 4`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--render_processes",
+    help="Number of processes exporting figures with --headless_plots."
+    "Example usage: `python main.py --skip_predict --headless_plots --render_processes 4`",
+    type=int,
+    default=1,
+)
+parser.add_argument(
+    "--sweep_processes",
+    help="Number of processes solving the temperature sweeps behind the extra plots."
+    "Example usage: `python main.py --skip_predict --sweep_processes 4`",
+    type=int,
+    default=1,
+)
+parser.add_argument(
+    "--serve",
+    help="If passed, runs a local HTTP service answering GET /power?lat=&lon=&start=&end=&method=&eg= queries "
+    "from warm caches, and GET /sites?lat=&lon=&start=&end=&method=&n= queries for the nearest processed results, "
+    "instead of the steps below."
+    "Example usage: `python main.py --serve --port 8000`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--port",
+    help="Port for --serve to listen on."
+    "Example usage: `python main.py --serve --port 8000`",
+    type=int,
+    default=8000,
+)
+parser.add_argument(
+    "--uncertainty_samples",
+    help="If passed, also saves 5th, 50th and 95th percentile bands of power output for each co-ordinate of the "
+    "batch, from this many Monte Carlo samples of the inputs and model coefficients."
+    "Example usage: `python main.py --batch_start 0 --uncertainty_samples 100`",
+    type=int,
+    default=None,
+)
+parser.add_argument(
+    "--masked",
+    help="If passed, hours with missing climate data are saved as NaN and the data completeness of each co-ordinate "
+    "is recorded, instead of skipping the co-ordinate."
+    "Example usage: `python main.py --batch_start 0 --masked --max_gap_fill_hours 3`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--max_gap_fill_hours",
+    help="With --masked, runs of up to this many missing hours are filled by interpolating temperatures."
+    "Example usage: `python main.py --batch_start 0 --masked --max_gap_fill_hours 3`",
+    type=int,
+    default=0,
+)
+parser.add_argument(
+    "--stage_cache",
+    help="If passed, hourly temperatures and maximum power points are cached under data/cache/stages/ by a hash of "
+    "their inputs, and reused by later runs, skipping the climate data download where temperatures are cached."
+    "Example usage: `python main.py --batch_start 0 --stage_cache`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--device",
+    help="A device to evaluate, as name:E_g[:eta[:emissivity[:lower voltage bound:upper voltage bound]]] in eV and "
+    "V. Pass more than once to evaluate several devices on the same climate data and sky temperatures; the first "
+    "fills the usual output columns and the others add columns suffixed with their name."
+    "Example usage: `python main.py --batch_start 0 --device HgCdTe:0.17 --device InSb:0.23:0.05`",
+    type=DeviceSpec.from_string,
+    action="append",
+    default=None,
+)
+parser.add_argument(
+    "--era5_cache_budget_gb",
+    help="Disk budget for downloaded ERA5 files. Once exceeded, the least recently used files are deleted. "
+    "Unlimited if not passed."
+    "Example usage: `python main.py --batch_start 0 --era5_cache_budget_gb 50`",
+    type=float,
+    default=None,
+)
+parser.add_argument(
+    "--verify_era5_checksums",
+    help="If passed, downloaded ERA5 files are checked against their SHA-256 checksum before reuse, as well as "
+    "their size and GRIB framing. Files downloaded without it are checksummed when first verified."
+    "Example usage: `python main.py --batch_start 0 --verify_era5_checksums`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--interpolation",
+    help="How climate data is interpolated to each co-ordinate: from the nearest ERA5 grid cell, or bilinearly from "
+    "the surrounding grid cells, excluding those without data or across a coastline."
+    "Example usage: `python main.py --batch_start 0 --interpolation bilinear`",
+    choices=["nearest", "bilinear"],
+    default="nearest",
+)
+parser.add_argument(
+    "--sensitivities",
+    help="If passed, also saves the derivatives of hourly power output, and of each co-ordinate's total kWh, with "
+    "respect to sky temperature, surface temperature and bandgap, to estimate the effect of small changes to them."
+    "Example usage: `python main.py --batch_start 0 --sensitivities`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--skip_hourly_output",
+    help="If passed, hourly data is not saved, only each co-ordinate's total and its hour of day and month "
+    "aggregates, from which consolidated summary statistics are computed. Temperature plots and per-location summary "
+    "statistics need the hourly data, and skip co-ordinates saved without it."
+    "Example usage: `python main.py --batch_start 0 --skip_hourly_output`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--regional_statistics",
+    help="If passed, the application will also aggregate the total kWh of processed locations by region, weighted "
+    "by area, into regional_statistics.csv. Requires --regions_filepath."
+    "Example usage: `python main.py --regional_statistics --regions_filepath data/ne_110m_admin_0_countries.zip "
+    "--region_column NAME`",
+    action="store_true",
+    required=False,
+)
+parser.add_argument(
+    "--regions_filepath",
+    help="With --regional_statistics, a file of region polygons readable by geopandas, such as the Natural Earth "
+    "admin 0 countries or admin areas, named by --region_column."
+    "Example usage: `python main.py --regional_statistics --regions_filepath data/admin1.shp --region_column NAME_1`",
+    type=str,
+    default=None,
+)
+parser.add_argument(
+    "--region_column",
+    help="With --regional_statistics, the column naming each region."
+    "Example usage: `python main.py --regional_statistics --regions_filepath data/admin1.shp --region_column NAME_1`",
+    type=str,
+    default="name",
+)
 args = parser.parse_args()
+if args.end_date < args.start_date:
+    parser.error("--end_date must not be before --start_date")
+if args.raster_geotiff and args.raster_map_resolution is None:
+    parser.error("--raster_geotiff requires --raster_map_resolution")
+if args.prefetch < 1:
+    parser.error("--prefetch must be at least 1")
+if args.regional_statistics and args.regions_filepath is None:
+    parser.error("--regional_statistics requires --regions_filepath")
 
 
 if __name__ == "__main__":
+    configure_logging(level=args.log_level)
+    if args.profile:
+        profiler.enable()
+    renderer.configure(headless=args.headless_plots, processes=args.render_processes)
+    grib_cache.configure(
+        budget_bytes=(
+            int(args.era5_cache_budget_gb * 1e9)
+            if args.era5_cache_budget_gb is not None
+            else None
+        ),
+        verify_checksums=args.verify_era5_checksums,
+    )
+
     allowed_emissivity_methods = {"swinbank", "martin-berdahl"}
     emissivity_method: Final[
         Literal["swinbank", "martin-berdahl"]
     ] = args.emissivity_method[0]
     if emissivity_method not in allowed_emissivity_methods:
         raise ValueError("Emissivity method not allowed", emissivity_method)
+    start_date: Final[datetime] = args.start_date
+    end_date: Final[datetime] = args.end_date
 
-    if not args.skip_predict:
-        start_date: Final[datetime] = datetime(2023, 1, 1)
-        end_date: Final[datetime] = datetime(2023, 1, 31)
+    if args.serve:
+        serve(port=args.port)
 
-        if args.batch_start is None:
-            print(
-                "Running in demonstration mode. Pass --batch_start to process real data."
-            )
-            save_test_power_output_for_set_lon_lat(emissivity_method=emissivity_method)
+    else:
+        if not args.skip_predict:
+            if args.batch_start is None:
+                logger.info(
+                    "Running in demonstration mode. Pass --batch_start to process real data."
+                )
+                save_test_power_output_for_set_lon_lat(
+                    emissivity_method=emissivity_method,
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+
+            else:
+                logger.info("Processing from %d", args.batch_start)
+                process_batch(
+                    batch_start=args.batch_start,
+                    batch_quantity=None,
+                    start_date=start_date,
+                    end_date=end_date,
+                    emissivity_method=emissivity_method,
+                    progress_json_path=args.progress_json,
+                    incremental=args.incremental,
+                    resolution=args.resolution,
+                    pipelined=args.pipeline,
+                    prefetch=args.prefetch,
+                    uncertainty_samples=args.uncertainty_samples,
+                    masked=args.masked,
+                    max_gap_fill_hours=args.max_gap_fill_hours,
+                    stage_cache=StageCache() if args.stage_cache else None,
+                    devices=args.device,
+                    interpolation=args.interpolation,
+                    sensitivities=args.sensitivities,
+                    if_save_hourly=not args.skip_hourly_output,
+                )
+            grib_cache.flush()
+            grib_cache.log_statistics()
 
-        else:
-            print(f"Processing from {args.batch_start}")
-            process_batch(
-                batch_start=args.batch_start,
-                batch_quantity=None,
+        if not args.skip_worldmap:
+            CreateChoroplethMap().create_map(
+                emissivity_method=emissivity_method,
+                raster_resolution=args.raster_map_resolution,
+                if_export_geotiff=args.raster_geotiff,
                 start_date=start_date,
                 end_date=end_date,
+            )
+
+        if not args.skip_tempplot:
+            CreateTemperaturePlots().plot_temperatures_and_power_vs_dates(
                 emissivity_method=emissivity_method,
+                max_points=args.plot_max_points or None,
+                downsampling_method=args.downsampling_method,
+                if_export_html=args.tempplot_html,
+                start_date=start_date,
+                end_date=end_date,
             )
 
-    if not args.skip_worldmap:
-        CreateChoroplethMap().create_map(emissivity_method=emissivity_method)
+        if not args.skip_summarystatistics:
+            if args.consolidated_summarystatistics:
+                SummaryStatistics(
+                    start_date=start_date, end_date=end_date
+                ).output_consolidated_summary_statistics(
+                    emissivity_method=emissivity_method,
+                    if_render_plots=args.summarystatistics_plots,
+                )
+            else:
+                SummaryStatistics(
+                    start_date=start_date, end_date=end_date
+                ).output_summary_statistics(emissivity_method=emissivity_method)
+
+        if args.regional_statistics:
+            RegionalStatistics.from_file(
+                filepath=args.regions_filepath,
+                region_column=args.region_column,
+                start_date=start_date,
+                end_date=end_date,
+            ).output_regional_statistics(emissivity_method=emissivity_method)
 
-    if not args.skip_tempplot:
-        CreateTemperaturePlots().plot_temperatures_and_power_vs_dates(
-            emissivity_method=emissivity_method
-        )
+        if not args.skip_extraplots:
+            ExtraPlots(processes=args.sweep_processes)
 
-    if not args.skip_summarystatistics:
-        SummaryStatistics().output_summary_statistics(
-            emissivity_method=emissivity_method
-        )
+        renderer.close()
 
-    if not args.skip_extraplots:
-        ExtraPlots()
+    if args.profile:
+        profiler.save_report(output_dir="data/out/profile/")
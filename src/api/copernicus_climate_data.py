@@ -1,16 +1,104 @@
-import math
+import logging
 import os
 import pathlib
 import warnings
+from collections import OrderedDict
 from datetime import datetime
 from typing import Final, Literal
 
 import cdsapi
+import numpy as np
 import pandas as pd
 import xarray as xr
 from astropy import units as u
+from global_land_mask import globe
 from xarray import DataArray
 
+from src.api.grib_cache import grib_cache
+from src.calculators.coordinates_for_assessment import (
+    CLIMATE_DATA_TILE_DEGREES,
+    get_climate_data_tile,
+)
+from src.profiling import profiled, profiler
+
+logger = logging.getLogger(__name__)
+
+INTERPOLATION_METHODS: Final[tuple[str, ...]] = ("nearest", "bilinear")
+# Interpolated series kept per CopernicusClimateData, enough for every dataset at dozens of points
+INTERPOLATED_POINTS_CACHE_SIZE: Final[int] = 256
+
+
+def interpolate_bilinearly(data_array: DataArray, lat: float, lon: float) -> DataArray:
+    """`data_array` interpolated to (lat, lon) with get_bilinear_weights, for every time (and step) at once, without
+    the latitude and longitude dimensions"""
+    values: Final[np.ndarray] = data_array.transpose(
+        ..., "latitude", "longitude"
+    ).values
+    lat_indices, lon_indices, weights = get_bilinear_weights(
+        latitudes=data_array["latitude"].values,
+        longitudes=data_array["longitude"].values,
+        lat=lat,
+        lon=lon,
+        if_valid=~np.all(np.isnan(values.reshape(-1, *values.shape[-2:])), axis=0),
+    )
+    return data_array.isel(latitude=0, longitude=0, drop=True).copy(
+        data=values[..., lat_indices, lon_indices] @ weights
+    )
+
+
+def get_axis_weights(
+    coordinates: np.ndarray, value: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the two grid coordinates either side of `value` and their linear weights. Coordinates may be
+    descending, as ERA5 latitudes are, and values beyond the grid take the weight of its edge.
+    """
+    order: Final[np.ndarray] = np.argsort(coordinates)
+    position: Final[float] = float(
+        np.interp(value, coordinates[order], np.arange(len(coordinates)))
+    )
+    lower: Final[int] = int(position)
+    upper: Final[int] = min(lower + 1, len(coordinates) - 1)
+    fraction: Final[float] = position - lower
+    return order[[lower, upper]], np.array([1 - fraction, fraction])
+
+
+def get_bilinear_weights(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    lat: float,
+    lon: float,
+    if_valid: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(latitude indices, longitude indices, weights) of the grid cells surrounding (lat, lon), weighted bilinearly.
+
+    Weighting is land-aware: corners without valid data (`if_valid` is a (latitude, longitude) mask), such as ocean
+    cells of ERA5-Land, are excluded, and so are corners on the other side of a coastline from the point if any
+    corner is on the same side, so that e.g. sea surface temperatures aren't mixed into skin temperatures on land.
+    The remaining weights are renormalised to sum to 1. If no corner is valid, the weights are left as they are
+    and the interpolated values are NaN.
+    """
+    lat_indices, lat_weights = get_axis_weights(coordinates=latitudes, value=lat)
+    lon_indices, lon_weights = get_axis_weights(coordinates=longitudes, value=lon)
+    corner_lat_indices: Final[np.ndarray] = np.repeat(lat_indices, 2)
+    corner_lon_indices: Final[np.ndarray] = np.tile(lon_indices, 2)
+    weights: Final[np.ndarray] = np.outer(lat_weights, lon_weights).ravel()
+
+    if_used: np.ndarray = if_valid[corner_lat_indices, corner_lon_indices] & (
+        weights > 0
+    )
+    if_same_surface: Final[np.ndarray] = globe.is_land(
+        lat=latitudes[corner_lat_indices], lon=longitudes[corner_lon_indices]
+    ) == globe.is_land(lat=lat, lon=lon)
+    if np.any(if_used & if_same_surface):
+        if_used = if_used & if_same_surface
+    if not np.any(if_used):
+        return corner_lat_indices, corner_lon_indices, weights
+    return (
+        corner_lat_indices[if_used],
+        corner_lon_indices[if_used],
+        weights[if_used] / np.sum(weights[if_used]),
+    )
+
 
 class CopernicusClimateData:
     def __init__(
@@ -20,8 +108,12 @@ class CopernicusClimateData:
         months: list[int],
         lon: float | None = None,
         lat: float | None = None,
+        interpolation: Literal["nearest", "bilinear"] = "nearest",
     ):
-        self.c: Final[cdsapi.Client] = cdsapi.Client()
+        """With `interpolation` "bilinear", values at a point are interpolated from the surrounding grid cells (see
+        get_bilinear_weights) instead of taken from the nearest one"""
+        self._client: cdsapi.Client | None = None
+        self._set_interpolation(interpolation)
 
         if if_load_entire_earth:
             if lat is not None or lon is not None:
@@ -39,10 +131,13 @@ class CopernicusClimateData:
                     "When not loading data for all of Earth, the latitude and longitude must be provided"
                 )
 
-            lon_min = math.floor(lon)
-            lon_max = math.ceil(lon)
-            lat_min = math.floor(lat)
-            lat_max = math.ceil(lat)
+            # The whole tile, so that every coordinate within it shares the download, and the box has a width even
+            # for coordinates on whole degrees
+            lat_tile, lon_tile = get_climate_data_tile(lat=lat, lon=lon)
+            lon_min = lon_tile * CLIMATE_DATA_TILE_DEGREES
+            lon_max = lon_min + CLIMATE_DATA_TILE_DEGREES
+            lat_min = lat_tile * CLIMATE_DATA_TILE_DEGREES
+            lat_max = lat_min + CLIMATE_DATA_TILE_DEGREES
 
         required_dataset_shortnames: Final[list[str]] = [
             "skt",
@@ -56,8 +151,9 @@ class CopernicusClimateData:
         self.temperature_datasets: dict[tuple[int, str], xr.Dataset] = dict()
         month: int
         iterator = [(f, s) for f in months for s in required_dataset_shortnames]
+        loaded_filepaths: Final[list[str]] = []
         for month, dataset_shortname in iterator:
-            print(f"Downloading for month {month} and shortname {dataset_shortname}")
+            logger.debug("Loading month %d for shortname %s", month, dataset_shortname)
 
             filepath: str = self._generate_filepath(
                 dataset_shortname=dataset_shortname,
@@ -68,24 +164,108 @@ class CopernicusClimateData:
                 year=year,
                 month=month,
             )
-            if os.path.isfile(filepath):
-                print(f"Already exists at {filepath}!")
+            if grib_cache.get_cached(filepath):
+                logger.debug("Already exists at %s", filepath)
             else:
-                print("File doesn't exist! Downloading...")
-                self._download_dataset_for_month_for_region(
-                    filepath=filepath,
-                    variable_shortname=dataset_shortname,
-                    lon_min=lon_min,
-                    lon_max=lon_max,
-                    lat_min=lat_min,
-                    lat_max=lat_max,
-                    year=year,
-                    month=month,
+                logger.info("Downloading %s", filepath)
+                with profiler.stage("climate_data.download"):
+                    self._download_dataset_for_month_for_region(
+                        filepath=filepath,
+                        variable_shortname=dataset_shortname,
+                        lon_min=lon_min,
+                        lon_max=lon_max,
+                        lat_min=lat_min,
+                        lat_max=lat_max,
+                        year=year,
+                        month=month,
+                    )
+                grib_cache.add(filepath)
+            self.temperature_datasets[(month, dataset_shortname)] = self.open_dataset(
+                filepath=filepath
+            )
+            loaded_filepaths.append(filepath)
+        grib_cache.evict(keep=loaded_filepaths)
+
+    @classmethod
+    def from_datasets(
+        cls,
+        temperature_datasets: dict[tuple[int, str], xr.Dataset],
+        interpolation: Literal["nearest", "bilinear"] = "nearest",
+    ) -> "CopernicusClimateData":
+        """Wrap already-opened datasets, keyed by (month, dataset_shortname), without touching the CDS API"""
+        climate_data_obj: Final[CopernicusClimateData] = cls.__new__(cls)
+        climate_data_obj._client = None
+        climate_data_obj._set_interpolation(interpolation)
+        climate_data_obj.temperature_datasets = temperature_datasets
+        return climate_data_obj
+
+    def _set_interpolation(self, interpolation: Literal["nearest", "bilinear"]) -> None:
+        if interpolation not in INTERPOLATION_METHODS:
+            raise ValueError("Unknown interpolation", interpolation)
+        self.interpolation: Literal["nearest", "bilinear"] = interpolation
+        # Interpolated series by (month, dataset_shortname, lat, lon), least recently used first
+        self._interpolated_points: OrderedDict[
+            tuple[int, str, float, float], DataArray
+        ] = OrderedDict()
+
+    @staticmethod
+    def open_dataset(filepath: str) -> xr.Dataset:
+        """Open and load into memory. GRIB files from the CDS API are read with cfgrib, anything else (e.g. NetCDF
+        fixtures) with xarray's default engine."""
+        with profiler.stage("climate_data.open"):
+            dataset: Final[xr.Dataset] = xr.open_dataset(
+                filepath, engine="cfgrib" if filepath.endswith(".grib") else None
+            )
+            dataset.load()
+        return dataset
+
+    def close(self) -> None:
+        """Release the loaded datasets"""
+        for dataset in self.temperature_datasets.values():
+            dataset.close()
+        self.temperature_datasets.clear()
+        self._interpolated_points.clear()
+
+    def select_point(
+        self, month: int, dataset_shortname: str, lat: float, lon: float
+    ) -> DataArray:
+        """The dataset's values at (lat, lon) for every time (and step), without the latitude and longitude
+        dimensions. Bilinear interpolation runs once per point and dataset, for all hours at once, and the series is
+        kept for the per-hour lookups that follow.
+        """
+        data_array: Final[DataArray] = self.temperature_datasets[
+            (month, dataset_shortname)
+        ][dataset_shortname]
+        match self.interpolation:
+            case "nearest":
+                return data_array.sel(latitude=lat, longitude=lon, method="nearest")
+            case "bilinear":
+                key: Final[tuple[int, str, float, float]] = (
+                    month,
+                    dataset_shortname,
+                    lat,
+                    lon,
                 )
-            temperature_dataset: xr.Dataset = xr.open_dataset(filepath, engine="cfgrib")
-            temperature_dataset.load()
-            self.temperature_datasets[(month, dataset_shortname)] = temperature_dataset
+                if key in self._interpolated_points:
+                    self._interpolated_points.move_to_end(key)
+                    return self._interpolated_points[key]
+                interpolated: Final[DataArray] = interpolate_bilinearly(
+                    data_array=data_array, lat=lat, lon=lon
+                )
+                self._interpolated_points[key] = interpolated
+                if len(self._interpolated_points) > INTERPOLATED_POINTS_CACHE_SIZE:
+                    self._interpolated_points.popitem(last=False)
+                return interpolated
+            case _:
+                raise ValueError("Unknown interpolation", self.interpolation)
+
+    @property
+    def c(self) -> cdsapi.Client:
+        if self._client is None:
+            self._client = cdsapi.Client()
+        return self._client
 
+    @profiled("climate_data.get_value_from_dataset")
     def get_value_from_dataset(
         self, lat: float, lon: float, dataset_shortname: str, date: datetime
     ) -> float:
@@ -94,9 +274,9 @@ class CopernicusClimateData:
         month_str = str(date.month) if date.month >= 10 else f"0{date.month}"
         time_str: Final[str] = f"{date.year}-{month_str}-{day_str}T{hour_str}:00"
 
-        selected_data = self.temperature_datasets[(date.month, dataset_shortname)][
-            dataset_shortname
-        ].sel(latitude=lat, longitude=lon, method="nearest")
+        selected_data: Final[DataArray] = self.select_point(
+            month=date.month, dataset_shortname=dataset_shortname, lat=lat, lon=lon
+        )
 
         match dataset_shortname:
             case "skt" | "tcc" | "t2m":
@@ -117,6 +297,76 @@ class CopernicusClimateData:
             case _:
                 raise ValueError("Unknown dataset_shortname", dataset_shortname)
 
+    @profiled("climate_data.get_value_from_dataset")
+    def get_values_from_dataset(
+        self, lat: float, lon: float, dataset_shortname: str, dates: pd.DatetimeIndex
+    ) -> np.ndarray:
+        """Vectorised get_value_from_dataset for many hourly dates, selecting the grid cell once per month"""
+        values: Final[np.ndarray] = np.empty(len(dates), dtype=float)
+        months: Final[np.ndarray] = np.asarray(dates.month)
+        for month in np.unique(months):
+            if_month: np.ndarray = months == month
+            month_dates: pd.DatetimeIndex = dates[if_month]
+            selected_data: DataArray = self.select_point(
+                month=int(month),
+                dataset_shortname=dataset_shortname,
+                lat=lat,
+                lon=lon,
+            )
+
+            match dataset_shortname:
+                case "skt" | "tcc" | "t2m":
+                    values[if_month] = selected_data.sel(
+                        time=month_dates, method=None
+                    ).values
+                case "sp":
+                    values[if_month] = selected_data.values[
+                        month_dates.day, month_dates.hour
+                    ]
+                case "cbh":
+                    data_times: pd.DatetimeIndex = selected_data.get_index("time")
+                    time_indices: np.ndarray = data_times.get_indexer(
+                        month_dates, method="ffill"
+                    )
+                    if np.any(time_indices < 0):
+                        raise KeyError(
+                            "Dates precede the first cloud base height forecast",
+                            month_dates[time_indices < 0],
+                        )
+                    step_indices: np.ndarray = np.asarray(
+                        (month_dates - data_times[time_indices])
+                        // pd.Timedelta(value=1, unit="h")
+                    )
+                    values[if_month] = selected_data.values[time_indices, step_indices]
+                case _:
+                    raise ValueError("Unknown dataset_shortname", dataset_shortname)
+        return values
+
+    def get_average_values_from_dataset(
+        self,
+        dataset_shortname: str,
+        lat: float,
+        lon: float,
+        dates: pd.DatetimeIndex,
+        period: Literal["month"],
+    ) -> np.ndarray:
+        """Vectorised get_average_value_from_dataset, returning the average of the period containing each date"""
+        match period:
+            case "month":
+                months: Final[np.ndarray] = np.asarray(dates.month)
+                values: Final[np.ndarray] = np.empty(len(dates), dtype=float)
+                for month in np.unique(months):
+                    values[months == month] = self.get_average_value_from_dataset(
+                        dataset_shortname=dataset_shortname,
+                        lat=lat,
+                        lon=lon,
+                        date=dates[months == month][0],
+                        period=period,
+                    )
+                return values
+            case _:
+                raise ValueError("Unknown period", period)
+
     def get_average_value_from_dataset(
         self,
         dataset_shortname: str,
@@ -127,9 +377,12 @@ class CopernicusClimateData:
     ) -> float:
         match period:
             case "month":
-                selected_data: Final[DataArray] = self.temperature_datasets[
-                    (date.month, dataset_shortname)
-                ][dataset_shortname].sel(latitude=lat, longitude=lon, method="nearest")
+                selected_data: Final[DataArray] = self.select_point(
+                    month=date.month,
+                    dataset_shortname=dataset_shortname,
+                    lat=lat,
+                    lon=lon,
+                )
                 result: Final[float] = float(
                     selected_data.mean(dim=["time", "step"], skipna=True)
                 )
@@ -351,5 +604,5 @@ class CopernicusClimateData:
                     filepath,
                 )
         except Exception:
-            print(request_arguments)
+            logger.error("Download failed for request %s", request_arguments)
             raise
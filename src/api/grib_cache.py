@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from glob import escape, glob
+from typing import Final, Iterable
+
+from src.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+GRIB_CACHE_MANIFEST_FILEPATH: Final[str] = "data/era5_cache_manifest.json"
+
+
+def get_file_checksum(filepath: str) -> str:
+    file_hash: Final = hashlib.sha256()
+    with open(filepath, "rb") as infile:
+        for block in iter(lambda: infile.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def if_grib_framing_valid(filepath: str) -> bool:
+    """Whether the file starts with a GRIB message header and ends with a message end marker, which a truncated or
+    failed download does not"""
+    with open(filepath, "rb") as infile:
+        header: Final[bytes] = infile.read(4)
+        infile.seek(-4, os.SEEK_END)
+        return header == b"GRIB" and infile.read(4) == b"7777"
+
+
+class GribCacheManager:
+    """Accounts for the size and last access of each downloaded ERA5 file, and evicts the least recently used files
+    once their total size exceeds `budget_bytes` (unlimited if None).
+
+    Files are verified before reuse: their size must match the one recorded when they were downloaded and GRIB files
+    must be complete messages. With `verify_checksums`, their SHA-256 must match too. Checksums are only computed
+    with `verify_checksums`, as files are recorded or, for files recorded without one, when first verified. Files
+    that fail are deleted so that they are downloaded again. Files present on disk but not in the manifest, such as
+    those downloaded before it existed, are adopted if they pass the same checks.
+
+    The manifest is written by flush, if it has changed. evict calls it when files have been recorded or removed;
+    without a budget, accesses alone are only written by the flush at the end of a run. Entries written meanwhile by
+    other processes sharing the cache are merged rather than overwritten.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int | None = None,
+        verify_checksums: bool = False,
+        manifest_filepath: str = GRIB_CACHE_MANIFEST_FILEPATH,
+    ):
+        self.budget_bytes: int | None = budget_bytes
+        self.verify_checksums: bool = verify_checksums
+        self.manifest_filepath: Final[str] = manifest_filepath
+        self.statistics: Final[dict[str, int]] = {
+            "hits": 0,
+            "misses": 0,
+            "invalid": 0,
+            "evictions": 0,
+            "evicted_bytes": 0,
+        }
+        self._manifest: dict[str, dict] | None = None
+        self._removed_filepaths: Final[set[str]] = set()
+        self._if_entries_changed: bool = False
+        self._if_accessed: bool = False
+        self._lock: Final[threading.Lock] = threading.Lock()
+
+    def configure(
+        self, budget_bytes: int | None, verify_checksums: bool = False
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.verify_checksums = verify_checksums
+
+    def get_cached(self, filepath: str) -> bool:
+        """Whether `filepath` can be reused, recording the access if so"""
+        with self._lock:
+            manifest: Final[dict[str, dict]] = self._get_manifest()
+            if not os.path.isfile(filepath):
+                if manifest.pop(filepath, None) is not None:
+                    self._removed_filepaths.add(filepath)
+                    self._if_entries_changed = True
+                self._count("misses")
+                return False
+
+            entry: dict | None = manifest.get(filepath)
+            if not self._if_valid(filepath=filepath, entry=entry):
+                logger.warning("Discarding invalid cached file %s", filepath)
+                self._remove(filepath)
+                manifest.pop(filepath, None)
+                self._count("invalid")
+                self._count("misses")
+                return False
+
+            if entry is None:
+                entry = self._get_entry(filepath)
+                manifest[filepath] = entry
+                self._if_entries_changed = True
+            entry["last_access"] = time.time()
+            self._if_accessed = True
+            self._count("hits")
+            return True
+
+    def add(self, filepath: str) -> None:
+        """Record a newly downloaded file"""
+        with self._lock:
+            self._get_manifest()[filepath] = self._get_entry(filepath)
+            self._removed_filepaths.discard(filepath)
+            self._if_entries_changed = True
+
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """Delete least recently used files until the cache is within budget, never deleting those in `keep`, and
+        flush the manifest"""
+        if self.budget_bytes is None:
+            if self._if_entries_changed:
+                self.flush()
+            return
+        with self._lock:
+            self._merge_manifest()
+            manifest: Final[dict[str, dict]] = self._get_manifest()
+            kept_filepaths: Final[set[str]] = set(keep)
+            total_bytes: int = sum(entry["size"] for entry in manifest.values())
+            for filepath, entry in sorted(
+                manifest.items(), key=lambda item: item[1]["last_access"]
+            ):
+                if total_bytes <= self.budget_bytes:
+                    break
+                if filepath in kept_filepaths:
+                    continue
+                logger.info("Evicting %s (%d bytes)", filepath, entry["size"])
+                self._remove(filepath)
+                del manifest[filepath]
+                total_bytes -= entry["size"]
+                self._count("evictions")
+                self._count("evicted_bytes", entry["size"])
+            if total_bytes > self.budget_bytes:
+                logger.warning(
+                    "ERA5 cache is %d bytes, over its budget of %d, with only files in use left",
+                    total_bytes,
+                    self.budget_bytes,
+                )
+            self._save_manifest()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._manifest is not None and (
+                self._if_entries_changed or self._if_accessed
+            ):
+                self._merge_manifest()
+                self._save_manifest()
+
+    def get_size(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._get_manifest().values())
+
+    def log_statistics(self) -> None:
+        logger.info(
+            "ERA5 cache: %d hits, %d misses, %d invalid, %d evictions (%d bytes), %d bytes cached",
+            self.statistics["hits"],
+            self.statistics["misses"],
+            self.statistics["invalid"],
+            self.statistics["evictions"],
+            self.statistics["evicted_bytes"],
+            self.get_size(),
+        )
+
+    def _if_valid(self, filepath: str, entry: dict | None) -> bool:
+        try:
+            if entry is not None and os.path.getsize(filepath) != entry["size"]:
+                return False
+            if filepath.endswith(".grib") and not if_grib_framing_valid(filepath):
+                return False
+            if self.verify_checksums and entry is not None:
+                checksum: str = get_file_checksum(filepath)
+                if "sha256" not in entry:
+                    # Recorded while verification was off, so it is verified from now on
+                    entry["sha256"] = checksum
+                    self._if_entries_changed = True
+                elif checksum != entry["sha256"]:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def _get_entry(self, filepath: str) -> dict:
+        return {
+            "size": os.path.getsize(filepath),
+            "last_access": time.time(),
+            **(
+                {"sha256": get_file_checksum(filepath)} if self.verify_checksums else {}
+            ),
+        }
+
+    def _count(self, statistic: str, value: int = 1) -> None:
+        self.statistics[statistic] += value
+        profiler.count(f"grib_cache.{statistic}", value)
+
+    def _remove(self, filepath: str) -> None:
+        """Delete the file and the index files cfgrib writes alongside it"""
+        self._removed_filepaths.add(filepath)
+        self._if_entries_changed = True
+        for removed_filepath in [filepath, *glob(f"{escape(filepath)}.*.idx")]:
+            try:
+                os.remove(removed_filepath)
+            except FileNotFoundError:
+                pass
+
+    def _get_manifest(self) -> dict[str, dict]:
+        if self._manifest is None:
+            self._manifest = dict()
+            if os.path.isfile(self.manifest_filepath):
+                with open(self.manifest_filepath, "r") as infile:
+                    self._manifest = json.load(infile)
+        return self._manifest
+
+    def _merge_manifest(self) -> None:
+        """Add entries that other processes have written to the manifest on disk since it was read"""
+        if not os.path.isfile(self.manifest_filepath):
+            return
+        with open(self.manifest_filepath, "r") as infile:
+            disk_manifest: Final[dict[str, dict]] = json.load(infile)
+        manifest: Final[dict[str, dict]] = self._get_manifest()
+        for filepath, entry in disk_manifest.items():
+            if filepath in self._removed_filepaths:
+                continue
+            if filepath not in manifest:
+                manifest[filepath] = entry
+            elif entry["last_access"] > manifest[filepath]["last_access"]:
+                manifest[filepath]["last_access"] = entry["last_access"]
+
+    def _save_manifest(self) -> None:
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.manifest_filepath)), exist_ok=True
+        )
+        # Written under a temporary name and renamed so that the manifest is never left partially written
+        temporary_filepath: Final[str] = f"{self.manifest_filepath}.{os.getpid()}.tmp"
+        with open(temporary_filepath, "w") as outfile:
+            json.dump(self._get_manifest(), outfile)
+        os.replace(temporary_filepath, self.manifest_filepath)
+        self._if_entries_changed = False
+        self._if_accessed = False
+
+
+grib_cache: Final[GribCacheManager] = GribCacheManager()
@@ -1,21 +1,67 @@
-import itertools
+import logging
+import math
 from typing import Final
 
 import numpy as np
 from global_land_mask import globe
 
+logger = logging.getLogger(__name__)
 
-def get_coordinates_for_assessment() -> list[tuple[float, float]]:
-    """EPSG3857"""
-    lats: Final[np.ndarray] = np.arange(start=-84.5, stop=84.5, step=5)
-    lons: Final[np.ndarray] = np.arange(start=-179.5, stop=179.5, step=5)
+# CopernicusClimateData requests the tile of this many degrees containing a coordinate
+CLIMATE_DATA_TILE_DEGREES: Final[int] = 1
 
-    lon: float
-    lat: float
-    coords_to_assess: list[tuple[float, float]] = list()
-    for lon, lat in itertools.product(lons, lats):
-        if globe.is_land(lat=lat, lon=lon):
-            coords_to_assess.append((lon, lat))
-    print(f"{len(coords_to_assess)} coordinates to assess")
+
+def _get_axis(start: float, stop: float, resolution: float) -> np.ndarray:
+    decimals: Final[int] = max(1, len(f"{resolution:g}".partition(".")[2]))
+    quantity: Final[int] = math.ceil(round((stop - start) / resolution, 9))
+    return np.round(start + np.arange(quantity) * resolution, decimals)
+
+
+def get_climate_data_tile(lat: float, lon: float) -> tuple[int, int]:
+    """(lat, lon) index of the climate data tile containing the point, whose south-west corner is at the index times
+    CLIMATE_DATA_TILE_DEGREES. Points on the north pole or the antimeridian belong to the tile below or west of them,
+    as there is none beyond."""
+    return (
+        min(
+            math.floor(lat / CLIMATE_DATA_TILE_DEGREES),
+            math.ceil(90 / CLIMATE_DATA_TILE_DEGREES) - 1,
+        ),
+        min(
+            math.floor(lon / CLIMATE_DATA_TILE_DEGREES),
+            math.ceil(180 / CLIMATE_DATA_TILE_DEGREES) - 1,
+        ),
+    )
+
+
+def get_coordinates_for_assessment(resolution: float = 5.0) -> np.ndarray:
+    """EPSG3857. Land coordinates as an (N, 2) array of (lon, lat), sorted so that coordinates within the same
+    climate data tile are contiguous, and so share its downloaded climate data. Resolution is in degrees, down to the
+    0.1° ERA5-Land native grid.
+    """
+    if not resolution > 0:
+        raise ValueError("Resolution must be positive", resolution)
+    lats: Final[np.ndarray] = _get_axis(start=-84.5, stop=84.5, resolution=resolution)
+    lons: Final[np.ndarray] = _get_axis(start=-179.5, stop=179.5, resolution=resolution)
+
+    lon_mesh, lat_mesh = np.meshgrid(lons, lats, indexing="ij")
+    is_land: Final[np.ndarray] = globe.is_land(lat=lat_mesh, lon=lon_mesh)
+    coords_to_assess: np.ndarray = np.column_stack(
+        (lon_mesh[is_land], lat_mesh[is_land])
+    )
+
+    tile_keys: Final[np.ndarray] = np.floor(
+        coords_to_assess / CLIMATE_DATA_TILE_DEGREES
+    ).astype(np.int16)
+    coords_to_assess = coords_to_assess[
+        np.lexsort(
+            (
+                coords_to_assess[:, 1],
+                coords_to_assess[:, 0],
+                tile_keys[:, 1],
+                tile_keys[:, 0],
+            )
+        )
+    ]
+    logger.info("%d coordinates to assess", len(coords_to_assess))
 
     return coords_to_assess
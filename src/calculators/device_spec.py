@@ -0,0 +1,91 @@
+from typing import Final
+
+from astropy import units as u
+
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.total_power_output import NONRADIATIVE_FRACTION
+
+
+class DeviceSpec:
+    """A thermoradiative device: its bandgap E_g (eV), non-radiative fraction eta, emissivity above the bandgap (it
+    is 0 below), and the bounds (V) within which the maximum power point is searched for
+    """
+
+    __slots__ = ("name", "E_g", "eta", "emissivity", "voltage_bounds")
+
+    def __init__(
+        self,
+        name: str = "default",
+        E_g: float = 0.17,
+        eta: float = NONRADIATIVE_FRACTION,
+        emissivity: float = 1.0,
+        voltage_bounds: tuple[float, float] = (-5.0, 0.0),
+    ):
+        if not 0 < emissivity <= 1:
+            raise ValueError("Emissivity must be in (0, 1]", emissivity)
+        if not 0 <= eta < 1:
+            raise ValueError("Non-radiative fraction must be in [0, 1)", eta)
+        if not 0 < E_g:
+            raise ValueError("Bandgap must be positive", E_g)
+        # At voltages of E_g/q and above the emitted photon flux diverges, so the power output is undefined (NaN)
+        if not voltage_bounds[0] < voltage_bounds[1] < E_g:
+            raise ValueError(
+                "Voltage bounds must be increasing and below the bandgap",
+                voltage_bounds,
+                E_g,
+            )
+        self.name: Final[str] = name
+        self.E_g: Final[float] = E_g
+        self.eta: Final[float] = eta
+        self.emissivity: Final[float] = emissivity
+        self.voltage_bounds: Final[tuple[float, float]] = voltage_bounds
+
+    @classmethod
+    def from_string(cls, device_str: str) -> "DeviceSpec":
+        """Parse name:E_g[:eta[:emissivity[:lower voltage bound:upper voltage bound]]], e.g. "InSb:0.23:0.05" """
+        name, *values = device_str.split(":")
+        if not name or not 1 <= len(values) <= 5 or len(values) == 4:
+            raise ValueError(
+                "Expected name:E_g[:eta[:emissivity[:lower:upper]]]", device_str
+            )
+        parameters: Final[list[float]] = [float(value) for value in values]
+        return cls(
+            name=name,
+            E_g=parameters[0],
+            eta=parameters[1] if len(parameters) > 1 else NONRADIATIVE_FRACTION,
+            emissivity=parameters[2] if len(parameters) > 2 else 1.0,
+            voltage_bounds=(
+                (parameters[3], parameters[4]) if len(parameters) > 3 else (-5.0, 0.0)
+            ),
+        )
+
+    def to_dict(self) -> dict:
+        """JSON-serialisable, as recorded with the outputs computed for the device"""
+        return {
+            "name": self.name,
+            "E_g": self.E_g,
+            "eta": self.eta,
+            "emissivity": self.emissivity,
+            "voltage_bounds": list(self.voltage_bounds),
+        }
+
+    def get_maximum_power_point_tracker(
+        self, t_sky: u.Quantity, t_cell: u.Quantity
+    ) -> MaximumPowerPointTracker:
+        return MaximumPowerPointTracker(
+            t_sky=t_sky,
+            t_cell=t_cell,
+            E_g=self.E_g * u.electronvolt,
+            eta=self.eta,
+            emissivity=self.emissivity,
+            voltage_bounds=self.voltage_bounds,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"DeviceSpec(name={self.name!r}, E_g={self.E_g!r}, eta={self.eta!r}, emissivity={self.emissivity!r}, "
+            f"voltage_bounds={self.voltage_bounds!r})"
+        )
+
+
+DEFAULT_DEVICE: Final[DeviceSpec] = DeviceSpec()
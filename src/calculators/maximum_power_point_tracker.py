@@ -1,40 +1,67 @@
+import math
 from typing import Final
 
+import numpy as np
 import scipy
 from astropy import units as u
 
-from src.calculators.total_power_output import TotalPowerOutput
+from src.calculators.total_power_output import (
+    ELEMENTARY_CHARGE_C,
+    NONRADIATIVE_FRACTION,
+    TotalPowerOutput,
+    get_photon_flux_array,
+    get_total_power_output_derivatives_array,
+)
+from src.profiling import profiler
 
 
 class MaximumPowerPointTracker:
-    cache: dict[
-        tuple[u.Quantity, u.Quantity, u.Quantity], tuple[u.Quantity, u.Quantity]
-    ] = dict()
+    __slots__ = (
+        "t_sky",
+        "t_cell",
+        "E_g",
+        "eta",
+        "emissivity",
+        "optimal_voltage",
+        "max_power",
+    )
+
+    cache: dict[tuple, tuple[u.Quantity, u.Quantity]] = dict()
 
     def __init__(
         self,
         t_sky: u.Quantity,
         t_cell: u.Quantity,
         E_g: u.Quantity,
+        eta: float = NONRADIATIVE_FRACTION,
+        emissivity: float = 1.0,
+        voltage_bounds: tuple[float, float] = (-5.0, 0.0),
     ):
         t_sky = round(t_sky.value, 1) * t_sky.unit
         t_cell = round(t_cell.value, 1) * t_cell.unit
         self.t_sky: Final[u.Quantity] = t_sky
         self.t_cell: Final[u.Quantity] = t_cell
         self.E_g: Final[u.Quantity] = E_g
+        self.eta: Final[float] = eta
+        self.emissivity: Final[float] = emissivity
 
-        cache_lookup: tuple[u.Quantity, u.Quantity, u.Quantity] = (
+        cache_lookup: tuple = (
             E_g,
             t_sky,
             t_cell,
+            eta,
+            emissivity,
+            voltage_bounds,
         )
 
         if cache_lookup not in self.cache:
-            voltage_optimise_function: Final[
-                scipy.optimize.OptimizeResult
-            ] = scipy.optimize.minimize_scalar(
-                fun=self._power_output, bounds=[-5.0, 0.0]
-            )
+            profiler.count("maximum_power_point_tracker.cache_misses")
+            with profiler.stage("maximum_power_point_tracker.solve"):
+                voltage_optimise_function: Final[
+                    scipy.optimize.OptimizeResult
+                ] = scipy.optimize.minimize_scalar(
+                    fun=self._power_output, bounds=list(voltage_bounds)
+                )
             optimal_voltage = round(voltage_optimise_function.x, 3) * u.volt
             max_power = -voltage_optimise_function.fun * (
                 u.watt / u.meter**2
@@ -42,6 +69,7 @@ class MaximumPowerPointTracker:
 
             self.cache[cache_lookup] = (optimal_voltage, max_power)
         else:
+            profiler.count("maximum_power_point_tracker.cache_hits")
             optimal_voltage, max_power = self.cache[cache_lookup]
 
         self.optimal_voltage: Final[u.Quantity] = optimal_voltage
@@ -63,14 +91,121 @@ class MaximumPowerPointTracker:
         t_cell: u.Quantity,
     ) -> float:
         chemical_potential_driving_emission: Final[u.Quantity] = voltage.value * u.eV
-        power_output: Final[float] = (
-            TotalPowerOutput(E_g=E_g)
-            .get_total_power_output(
-                voltage=voltage,
-                t_sky=t_sky,
-                t_cell=t_cell,
-                chemical_potential_driving_emission=chemical_potential_driving_emission,
-            )
-            .value
+        total_power_output: Final[TotalPowerOutput] = TotalPowerOutput(
+            E_g=E_g, eta=self.eta, emissivity=self.emissivity
+        )
+        power_output: Final[float] = total_power_output.get_total_power_output(
+            voltage=voltage,
+            t_sky=t_sky,
+            t_cell=t_cell,
+            chemical_potential_driving_emission=chemical_potential_driving_emission,
+        ).value
+        profiler.count("maximum_power_point_tracker.objective_evaluations")
+        profiler.count(
+            "total_power_output.quad_integrand_evaluations",
+            total_power_output.integration_iterator,
         )
         return power_output
+
+    @staticmethod
+    def solve_batch(
+        t_sky: np.ndarray,
+        t_cell: np.ndarray,
+        E_g: np.ndarray | float,
+        eta: np.ndarray | float = NONRADIATIVE_FRACTION,
+        voltage_bounds: tuple[float, float] = (-5.0, 0.0),
+        tolerance: float = 1e-7,
+        emissivity: np.ndarray | float = 1.0,
+        if_sensitivities: bool = False,
+    ) -> (
+        tuple[np.ndarray, np.ndarray]
+        | tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]
+    ):
+        """Vectorised equivalent of constructing a MaximumPowerPointTracker for each element, returning
+        (optimal voltage in V rounded to 3 decimal places as in the scalar solve, max power in W m^-2).
+
+        If `if_sensitivities`, the derivatives of max power with respect to "t_sky" and "t_cell" (W m^-2 K^-1) and
+        "E_g" (W m^-2 eV^-1) are returned too, as a third element. They are evaluated at the unrounded optimum
+        (see get_total_power_output_derivatives_array), so cost about one more evaluation of the power output.
+
+        Temperatures are in K and E_g in eV; all arguments are broadcast together. Every element is solved at once
+        by golden-section search on the closed-form power output, which has a single maximum within the bounds.
+        The flux absorbed from the sky does not depend on voltage, so it is evaluated once.
+        """
+        t_sky, t_cell, E_g, eta, emissivity = np.broadcast_arrays(
+            np.asarray(t_sky, dtype=float),
+            np.asarray(t_cell, dtype=float),
+            np.asarray(E_g, dtype=float),
+            np.asarray(eta, dtype=float),
+            np.asarray(emissivity, dtype=float),
+        )
+        profiler.count("maximum_power_point_tracker.batch_solves")
+        profiler.count("maximum_power_point_tracker.batch_elements", t_sky.size)
+        with profiler.stage("maximum_power_point_tracker.solve_batch"):
+            received_flux: Final[np.ndarray] = get_photon_flux_array(
+                E_g=E_g, T=t_sky, Delta_mu=0.0
+            ) / (1 - eta)
+
+            def get_power_output(voltage: np.ndarray) -> np.ndarray:
+                return (
+                    ELEMENTARY_CHARGE_C
+                    * emissivity
+                    * voltage
+                    * (
+                        received_flux
+                        - get_photon_flux_array(E_g=E_g, T=t_cell, Delta_mu=voltage)
+                    )
+                )
+
+            inverse_golden_ratio: Final[float] = (math.sqrt(5) - 1) / 2
+            lower: np.ndarray = np.full(t_sky.shape, voltage_bounds[0])
+            upper: np.ndarray = np.full(t_sky.shape, voltage_bounds[1])
+            left: np.ndarray = upper - inverse_golden_ratio * (upper - lower)
+            right: np.ndarray = lower + inverse_golden_ratio * (upper - lower)
+            left_power: np.ndarray = get_power_output(left)
+            right_power: np.ndarray = get_power_output(right)
+            for _ in range(
+                math.ceil(
+                    math.log(tolerance / (voltage_bounds[1] - voltage_bounds[0]))
+                    / math.log(inverse_golden_ratio)
+                )
+            ):
+                if_maximum_left: np.ndarray = left_power > right_power
+                upper = np.where(if_maximum_left, right, upper)
+                lower = np.where(if_maximum_left, lower, left)
+                left, right = (
+                    np.where(
+                        if_maximum_left,
+                        upper - inverse_golden_ratio * (upper - lower),
+                        right,
+                    ),
+                    np.where(
+                        if_maximum_left,
+                        left,
+                        lower + inverse_golden_ratio * (upper - lower),
+                    ),
+                )
+                new_power: np.ndarray = get_power_output(
+                    np.where(if_maximum_left, left, right)
+                )
+                left_power, right_power = (
+                    np.where(if_maximum_left, new_power, right_power),
+                    np.where(if_maximum_left, left_power, new_power),
+                )
+
+            optimal_voltage: Final[np.ndarray] = (lower + upper) / 2
+            max_power: Final[np.ndarray] = get_power_output(optimal_voltage)
+            if if_sensitivities:
+                return (
+                    np.round(optimal_voltage, 3),
+                    max_power,
+                    get_total_power_output_derivatives_array(
+                        voltage=optimal_voltage,
+                        t_sky=t_sky,
+                        t_cell=t_cell,
+                        E_g=E_g,
+                        eta=eta,
+                        emissivity=emissivity,
+                    ),
+                )
+        return np.round(optimal_voltage, 3), max_power
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Final
+
+import numpy as np
+import xarray as xr
+
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.total_power_output import NONRADIATIVE_FRACTION
+
+logger = logging.getLogger(__name__)
+
+SWEEP_CACHE_DIR: Final[str] = "data/cache/sweeps/"
+SWEEP_AXES: Final[tuple[str, ...]] = ("t_sky", "t_cell", "E_g", "eta")
+# Bump when the solver changes so that cached sweeps are recomputed
+SWEEP_CACHE_VERSION: Final[int] = 1
+
+
+def _solve_chunk(
+    parameters: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+) -> tuple[np.ndarray, np.ndarray]:
+    t_sky, t_cell, E_g, eta = parameters
+    return MaximumPowerPointTracker.solve_batch(
+        t_sky=t_sky, t_cell=t_cell, E_g=E_g, eta=eta
+    )
+
+
+class ParametricSweep:
+    """Maximum power point over the full grid of sky temperature (K), cell temperature (K), bandgap (eV) and
+    non-radiative fraction.
+
+    The grid is flattened and solved in chunks of `chunk_size` cells with MaximumPowerPointTracker.solve_batch,
+    across `processes` worker processes if more than one. Results are cached as .npz files named by a hash of every
+    axis, so repeating a sweep, or plotting a different slice of it, costs only a file read.
+    """
+
+    def __init__(
+        self,
+        t_sky: np.ndarray,
+        t_cell: np.ndarray,
+        E_g: np.ndarray | float,
+        eta: np.ndarray | float = NONRADIATIVE_FRACTION,
+        chunk_size: int = 65536,
+        processes: int = 1,
+        cache_dir: str | None = SWEEP_CACHE_DIR,
+    ):
+        self.axes: Final[dict[str, np.ndarray]] = {
+            name: np.atleast_1d(np.asarray(values, dtype=float))
+            for name, values in zip(SWEEP_AXES, (t_sky, t_cell, E_g, eta))
+        }
+        self.chunk_size: Final[int] = chunk_size
+        self.processes: Final[int] = processes
+        self.cache_dir: Final[str | None] = cache_dir
+
+    def get_cache_key(self) -> str:
+        cache_key: Final = hashlib.sha256(str(SWEEP_CACHE_VERSION).encode())
+        for name, values in self.axes.items():
+            cache_key.update(name.encode())
+            cache_key.update(values.tobytes())
+        return cache_key.hexdigest()
+
+    def get_results(self) -> xr.Dataset:
+        """`max_power` (W m^-2) and `optimal_voltage` (V) with dimensions t_sky, t_cell, E_g and eta"""
+        cache_filepath: Final[str | None] = (
+            os.path.join(self.cache_dir, f"{self.get_cache_key()}.npz")
+            if self.cache_dir is not None
+            else None
+        )
+        if cache_filepath is not None and os.path.isfile(cache_filepath):
+            logger.info("Loading cached sweep %s", cache_filepath)
+            with np.load(cache_filepath) as cached:
+                return self._to_dataset(
+                    optimal_voltage=cached["optimal_voltage"],
+                    max_power=cached["max_power"],
+                )
+
+        optimal_voltage, max_power = self._solve()
+        if cache_filepath is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written under a temporary name and renamed so that concurrent readers never see a partial file
+            temporary_filepath: Final[str] = f"{cache_filepath}.{os.getpid()}.tmp.npz"
+            np.savez(
+                temporary_filepath,
+                optimal_voltage=optimal_voltage,
+                max_power=max_power,
+            )
+            os.replace(temporary_filepath, cache_filepath)
+        return self._to_dataset(optimal_voltage=optimal_voltage, max_power=max_power)
+
+    def _solve(self) -> tuple[np.ndarray, np.ndarray]:
+        grid: Final[list[np.ndarray]] = [
+            mesh.ravel() for mesh in np.meshgrid(*self.axes.values(), indexing="ij")
+        ]
+        cell_count: Final[int] = grid[0].size
+        chunks: Final[list[tuple[np.ndarray, ...]]] = list(
+            zip(
+                *(
+                    np.array_split(
+                        values, max(1, math.ceil(cell_count / self.chunk_size))
+                    )
+                    for values in grid
+                )
+            )
+        )
+        logger.info(
+            "Sweeping %d cells in %d chunks over %d processes",
+            cell_count,
+            len(chunks),
+            self.processes,
+        )
+
+        if self.processes > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                solutions: list[tuple[np.ndarray, np.ndarray]] = list(
+                    executor.map(_solve_chunk, chunks)
+                )
+        else:
+            solutions = [_solve_chunk(chunk) for chunk in chunks]
+
+        shape: Final[tuple[int, ...]] = tuple(
+            len(values) for values in self.axes.values()
+        )
+        return (
+            np.concatenate([solution[0] for solution in solutions]).reshape(shape),
+            np.concatenate([solution[1] for solution in solutions]).reshape(shape),
+        )
+
+    def _to_dataset(
+        self, optimal_voltage: np.ndarray, max_power: np.ndarray
+    ) -> xr.Dataset:
+        return xr.Dataset(
+            {
+                "optimal_voltage": (SWEEP_AXES, optimal_voltage),
+                "max_power": (SWEEP_AXES, max_power),
+            },
+            coords=self.axes,
+        )
@@ -1,15 +1,98 @@
+import logging
 import math
 from datetime import datetime
 from typing import Final, Literal
 
 import numpy as np
+import pandas as pd
 from astropy import units as u
 
 from src.api.copernicus_climate_data import CopernicusClimateData
 from src.exceptions import InsufficientClimateDataError, UnitError
+from src.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+# https://publications.ibpsa.org/proceedings/bs/2017/papers/BS2017_569.pdf
+MARTIN_BERDAHL_MONTHLY_COEFFICIENTS: Final[tuple[float, float, float]] = (
+    0.711,
+    0.56,
+    0.73,
+)
+MARTIN_BERDAHL_DIURNAL_COEFFICIENT: Final[float] = 0.013
+MARTIN_BERDAHL_ELEVATION_COEFFICIENT: Final[float] = 0.00012
+
+
+def get_martin_berdahl_sky_emissivities(
+    t_dewpoint_monthly_average: np.ndarray,
+    surface_pressure_mbar: np.ndarray,
+    hours: np.ndarray,
+    cloud_base_height_m: np.ndarray,
+    total_cloud_cover: np.ndarray,
+    monthly_coefficients: tuple[
+        np.ndarray | float, ...
+    ] = MARTIN_BERDAHL_MONTHLY_COEFFICIENTS,
+    diurnal_coefficient: np.ndarray | float = MARTIN_BERDAHL_DIURNAL_COEFFICIENT,
+    elevation_coefficient: np.ndarray | float = MARTIN_BERDAHL_ELEVATION_COEFFICIENT,
+    masked: bool = False,
+) -> np.ndarray:
+    """Vectorised SkyEmissivity martin-berdahl method. Dewpoint temperature is in °C.
+
+    NaN surface pressure drops the elevation correction and NaN cloud base height is taken as a clear sky,
+    as in the scalar method, while NaN cloud cover under a cloud base makes the emissivity NaN, which raises
+    InsufficientClimateDataError unless `masked`. The coefficients
+    broadcast against the hourly inputs, so passing them with a leading sample dimension evaluates many coefficient
+    draws at once.
+    """
+    emissivity_monthly: Final[np.ndarray] = (
+        monthly_coefficients[0]
+        + monthly_coefficients[1] * (t_dewpoint_monthly_average / 100)
+        + monthly_coefficients[2] * (t_dewpoint_monthly_average / 100) ** 2
+    )
+    emissivity_hourly_diurnal_correction: Final[
+        np.ndarray
+    ] = diurnal_coefficient * np.cos(2 * np.pi * ((np.asarray(hours) + 1) / 24))
+    emissivity_elevation_correction: Final[np.ndarray] = np.where(
+        np.isnan(surface_pressure_mbar),
+        0.0,
+        elevation_coefficient * (surface_pressure_mbar - 1000),
+    )
+    emissivity_clearsky: Final[np.ndarray] = (
+        emissivity_monthly
+        + emissivity_hourly_diurnal_correction
+        + emissivity_elevation_correction
+    )
+
+    if_cloudy: Final[np.ndarray] = ~np.isnan(cloud_base_height_m)
+    fractional_sky_cover: Final[np.ndarray] = np.round(total_cloud_cover)
+    cloudy_sky_cover: Final[np.ndarray] = fractional_sky_cover[if_cloudy]
+    if np.any((cloudy_sky_cover < 0) | (cloudy_sky_cover > 1)):
+        raise ValueError(
+            "Sky cover must be greater than 0 and less than 1", cloudy_sky_cover
+        )
+
+    infrared_cloud_amount: Final[np.ndarray] = np.where(
+        if_cloudy,
+        fractional_sky_cover
+        * emissivity_clearsky
+        * np.exp(-np.where(if_cloudy, cloud_base_height_m, 0.0) / 8200),
+        0.0,
+    )
+    emissivity_sky: Final[np.ndarray] = (
+        emissivity_clearsky + (1 - emissivity_clearsky) * infrared_cloud_amount
+    )
+
+    if np.any((emissivity_sky < 0) | (emissivity_sky > 1)):
+        raise ValueError(
+            "Sky emissivity must be greater than 0 and less than 1", emissivity_sky
+        )
+    if not masked and np.any(np.isnan(emissivity_sky)):
+        raise InsufficientClimateDataError("Emissivity cannot be NaN")
+    return emissivity_sky
 
 
 class SkyEmissivity:
+    @profiled("sky_emissivity")
     def __init__(
         self,
         method: Literal["martin-berdahl"],
@@ -34,6 +117,44 @@ class SkyEmissivity:
                 raise ValueError("Unknown sky emissivity method", method)
         self.sky_emissivity: Final[float] = sky_emissivity
 
+    @staticmethod
+    @profiled("sky_emissivity")
+    def get_sky_emissivities(
+        method: Literal["martin-berdahl"],
+        dates: pd.DatetimeIndex,
+        surface_temperature_obj: CopernicusClimateData,
+        lat: float,
+        lon: float,
+        masked: bool = False,
+    ) -> np.ndarray:
+        """Sky emissivity at each of the hourly dates, NaN where the climate data is missing if `masked`"""
+        match method:
+            case "martin-berdahl":
+                return get_martin_berdahl_sky_emissivities(
+                    t_dewpoint_monthly_average=surface_temperature_obj.get_average_values_from_dataset(
+                        dataset_shortname="d2m",
+                        lat=lat,
+                        lon=lon,
+                        dates=dates,
+                        period="month",
+                    )
+                    - 273.15,
+                    surface_pressure_mbar=surface_temperature_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="sp", dates=dates
+                    )
+                    / 100,
+                    hours=np.asarray(dates.hour),
+                    cloud_base_height_m=surface_temperature_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="cbh", dates=dates
+                    ),
+                    total_cloud_cover=surface_temperature_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="tcc", dates=dates
+                    ),
+                    masked=masked,
+                )
+            case _:
+                raise ValueError("Unknown sky emissivity method", method)
+
     def _get_emissivity_via_martin_berdahl_method(self, date: datetime) -> float:
         """https://publications.ibpsa.org/proceedings/bs/2017/papers/BS2017_569.pdf"""
         t_dewpoint_monthly_average: Final[float] = (
@@ -46,21 +167,25 @@ class SkyEmissivity:
         ).to(u.mbar)
 
         emissivity_monthly: Final[float] = (
-            0.711
-            + 0.56 * (t_dewpoint_monthly_average / 100)
-            + 0.73 * (t_dewpoint_monthly_average / 100) ** 2
+            MARTIN_BERDAHL_MONTHLY_COEFFICIENTS[0]
+            + MARTIN_BERDAHL_MONTHLY_COEFFICIENTS[1]
+            * (t_dewpoint_monthly_average / 100)
+            + MARTIN_BERDAHL_MONTHLY_COEFFICIENTS[2]
+            * (t_dewpoint_monthly_average / 100) ** 2
         )
-        emissivity_hourly_diurnal_correction: Final[float] = 0.013 * math.cos(
+        emissivity_hourly_diurnal_correction: Final[
+            float
+        ] = MARTIN_BERDAHL_DIURNAL_COEFFICIENT * math.cos(
             2 * math.pi * ((date.hour + 1) / 24)
         )
 
         emissivity_elevation_correction: float = 0.0
         if not np.isnan(surface_pressure_mbar):
-            emissivity_elevation_correction = 0.00012 * (
+            emissivity_elevation_correction = MARTIN_BERDAHL_ELEVATION_COEFFICIENT * (
                 surface_pressure_mbar.value - 1000
             )
         else:
-            print("surface_pressure was NaN")
+            logger.debug("surface_pressure was NaN")
 
         emissivity_clearsky: Final[float] = (
             emissivity_monthly
@@ -116,12 +241,16 @@ class SkyEmissivity:
                 raise ValueError("Unknown period", period)
 
     def _get_opaque_sky_cover(self, date: datetime) -> float:
-        """opaque sky cover (tenths)"""
-        sky_cover: Final[int] = round(
-            self.surface_temperature_obj.get_total_cloud_cover(
-                date=date, lat=self.lat, lon=self.lon
-            )
+        """opaque sky cover (tenths), NaN where total cloud cover is missing"""
+        total_cloud_cover: Final[
+            float
+        ] = self.surface_temperature_obj.get_total_cloud_cover(
+            date=date, lat=self.lat, lon=self.lon
         )
+        if math.isnan(total_cloud_cover):
+            logger.debug("total_cloud_cover was NaN")
+            return math.nan
+        sky_cover: Final[int] = round(total_cloud_cover)
 
         if sky_cover < 0 or sky_cover > 1:
             raise ValueError(
@@ -2,14 +2,21 @@ from datetime import datetime
 from typing import Final, Literal
 
 import numpy as np
+import pandas as pd
 from astropy import units as u
 
 from src.api.copernicus_climate_data import CopernicusClimateData
 from src.calculators.sky_emissivity import SkyEmissivity
 from src.exceptions import InsufficientClimateDataError
+from src.profiling import profiled
+
+# DOI: 10.1016/0020-0891(89)90055-9
+SWINBANK_COEFFICIENT: Final[float] = 0.0553
 
 
 class SkyTemperature:
+    __slots__ = ("surface_temperature_obj", "lat", "lon")
+
     def __init__(
         self, surface_temperature_obj: CopernicusClimateData, lat: float, lon: float
     ):
@@ -20,6 +27,7 @@ class SkyTemperature:
         self.lat: Final[float] = lat
         self.lon: Final[float] = lon
 
+    @profiled("sky_temperature")
     def get_sky_temperature(
         self,
         date: datetime,
@@ -47,9 +55,45 @@ class SkyTemperature:
                 (0020-0891, Infrared Phys Vol. 29 No. 2-4 pp. 231-232, 1989),
                 243615948_The_sky_temperature_in_net_radiant_heat_loss_calculations_from_low-sloped_roofs
                 """
-                return (
-                    0.0553 * t_ambient.value**1.5
-                ) * u.Kelvin  # DOI: 10.1016/0020-0891(89)90055-9
+                return (SWINBANK_COEFFICIENT * t_ambient.value**1.5) * u.Kelvin
+            case _:
+                raise ValueError(
+                    "Formula not in defined formulae for sky temperature", formula
+                )
+
+    @profiled("sky_temperature")
+    def get_sky_temperatures(
+        self,
+        dates: pd.DatetimeIndex,
+        formula: Literal["swinbank", "martin-berdahl"],
+        masked: bool = False,
+    ) -> np.ndarray:
+        """Vectorised get_sky_temperature for many hourly dates, in kelvin. Hours without the climate data for the
+        sky emissivity raise InsufficientClimateDataError unless `masked`, in which case they are NaN.
+        """
+        t_ambient: Final[
+            np.ndarray
+        ] = self.surface_temperature_obj.get_values_from_dataset(
+            lat=self.lat, lon=self.lon, dataset_shortname="t2m", dates=dates
+        )
+        match formula:
+            case "martin-berdahl":
+                t_sky: Final[np.ndarray] = (
+                    SkyEmissivity.get_sky_emissivities(
+                        method="martin-berdahl",
+                        dates=dates,
+                        surface_temperature_obj=self.surface_temperature_obj,
+                        lat=self.lat,
+                        lon=self.lon,
+                        masked=masked,
+                    )
+                    ** 0.25
+                ) * t_ambient
+                if not masked and np.any(np.isnan(t_sky)):
+                    raise InsufficientClimateDataError("Sky temperature cannot be NaN")
+                return t_sky
+            case "swinbank":
+                return SWINBANK_COEFFICIENT * t_ambient**1.5
             case _:
                 raise ValueError(
                     "Formula not in defined formulae for sky temperature", formula
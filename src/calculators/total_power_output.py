@@ -4,16 +4,176 @@ from typing import Final
 import mpmath
 import numpy as np
 import scipy.integrate as integrate
+import scipy.special
 from astropy import constants as const
 from astropy import units as u
 from astropy.units import Quantity
 
 from src.exceptions import UnitError
+from src.profiling import profiler
+
+NONRADIATIVE_FRACTION: Final[
+    float
+] = 0.03  # nonradiative generation percentage, p.g. 7, DOI: 10.1021/acsphotonics.9b00679
+
+BOLTZMANN_CONSTANT_EV_PER_K: Final[float] = const.k_B.to(
+    u.electronvolt / u.Kelvin
+).value
+ELEMENTARY_CHARGE_C: Final[float] = const.si.e.value
+PHOTON_FLUX_PREFACTOR: Final[float] = (
+    ((2 * math.pi) / ((const.si.h.to(u.electronvolt / u.hertz)) ** 3 * const.c**2))
+    .to(1 / (u.second * u.meter**2 * u.electronvolt**3))
+    .value
+)  # 2π/(h³c²) in photons s^-1 m^-2 eV^-3
+
+
+def _get_trilogarithm(z: np.ndarray) -> np.ndarray:
+    """Li_3(z) for 0 <= z < 1: the power series below z = 1/2, otherwise the expansion in ln(z)"""
+    series_z: Final[np.ndarray] = np.where(z <= 0.5, z, 0.0)
+    k: Final[np.ndarray] = np.arange(1, 60).reshape((-1,) + (1,) * z.ndim)
+    series: Final[np.ndarray] = np.sum(series_z**k / k**3, axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu: Final[np.ndarray] = np.log(np.where(z > 0.5, z, 1.0))
+        expansion: Final[np.ndarray] = (
+            scipy.special.zeta(3)
+            + (math.pi**2 / 6) * mu
+            + (1.5 - np.log(-mu)) * mu**2 / 2
+            - mu**3 / 12
+            - mu**4 / 288
+            + mu**6 / 86400
+            - mu**8 / 10160640
+            + mu**10 / 870912000
+        )
+    return np.where(
+        z <= 0.5, series, np.where(mu == 0, scipy.special.zeta(3), expansion)
+    )
+
+
+def get_photon_flux_array(
+    E_g: np.ndarray | float, T: np.ndarray | float, Delta_mu: np.ndarray | float
+) -> np.ndarray:
+    """Vectorised TotalPowerOutput.get_photon_flux_emitted_from_semiconductor, in photons s^-1 m^-2.
+
+    Arguments are in eV, K and eV, and are broadcast together. For the step emissivity at E_g, the integral of
+    E²/(exp((E - Δμ)/kT) - 1) from E_g to infinity is exactly
+    kT [E_g² Li_1(z) + 2 E_g kT Li_2(z) + 2 (kT)² Li_3(z)] with z = exp(-(E_g - Δμ)/kT), which requires Δμ < E_g.
+    """
+    kT: Final[np.ndarray] = BOLTZMANN_CONSTANT_EV_PER_K * np.asarray(T, dtype=float)
+    E_g_array: Final[np.ndarray] = np.asarray(E_g, dtype=float)
+    z: Final[np.ndarray] = np.exp(-(E_g_array - np.asarray(Delta_mu)) / kT)
+
+    integral: Final[np.ndarray] = kT * (
+        E_g_array**2 * -np.log1p(-z)
+        + 2 * E_g_array * kT * scipy.special.spence(1 - z)
+        + 2 * kT**2 * _get_trilogarithm(z)
+    )
+    return PHOTON_FLUX_PREFACTOR * integral
+
+
+def get_photon_flux_derivatives_array(
+    E_g: np.ndarray | float, T: np.ndarray | float, Delta_mu: np.ndarray | float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Partial derivatives of get_photon_flux_array with respect to T, in photons s^-1 m^-2 K^-1, and E_g, in
+    photons s^-1 m^-2 eV^-1.
+
+    With τ = kT and Li_0(z) = z/(1 - z), differentiating the closed form using dLi_s(z)/dτ = Li_(s-1)(z) (E_g - Δμ)/τ²
+    gives E_g² Li_1 + 4 E_g τ Li_2 + 6 τ² Li_3 + (E_g - Δμ)/τ (E_g² Li_0 + 2 E_g τ Li_1 + 2 τ² Li_2) for the
+    integral with respect to τ. With respect to E_g, it is minus the integrand at E_g, -E_g² Li_0(z).
+    """
+    kT: Final[np.ndarray] = BOLTZMANN_CONSTANT_EV_PER_K * np.asarray(T, dtype=float)
+    E_g_array: Final[np.ndarray] = np.asarray(E_g, dtype=float)
+    reduced_gap: Final[np.ndarray] = (E_g_array - np.asarray(Delta_mu)) / kT
+    z: Final[np.ndarray] = np.exp(-reduced_gap)
+    polylogarithms: Final[tuple[np.ndarray, ...]] = (
+        z / (1 - z),
+        -np.log1p(-z),
+        scipy.special.spence(1 - z),
+        _get_trilogarithm(z),
+    )
+
+    integral_derivative_kT: Final[np.ndarray] = (
+        E_g_array**2 * polylogarithms[1]
+        + 4 * E_g_array * kT * polylogarithms[2]
+        + 6 * kT**2 * polylogarithms[3]
+        + reduced_gap
+        * (
+            E_g_array**2 * polylogarithms[0]
+            + 2 * E_g_array * kT * polylogarithms[1]
+            + 2 * kT**2 * polylogarithms[2]
+        )
+    )
+    return (
+        PHOTON_FLUX_PREFACTOR * BOLTZMANN_CONSTANT_EV_PER_K * integral_derivative_kT,
+        -PHOTON_FLUX_PREFACTOR * E_g_array**2 * polylogarithms[0],
+    )
+
+
+def get_total_power_output_array(
+    voltage: np.ndarray | float,
+    t_sky: np.ndarray | float,
+    t_cell: np.ndarray | float,
+    E_g: np.ndarray | float,
+    eta: np.ndarray | float = NONRADIATIVE_FRACTION,
+    emissivity: np.ndarray | float = 1.0,
+) -> np.ndarray:
+    """Vectorised TotalPowerOutput.get_total_power_output, in W m^-2, with the chemical potential driving emission
+    equal to the voltage. Arguments are in V, K, K and eV, and are broadcast together.
+    """
+    flux_from_sky: Final[np.ndarray] = get_photon_flux_array(
+        E_g=E_g, T=t_sky, Delta_mu=0.0
+    )
+    flux_from_cell: Final[np.ndarray] = get_photon_flux_array(
+        E_g=E_g, T=t_cell, Delta_mu=voltage
+    )
+    return (
+        ELEMENTARY_CHARGE_C
+        * np.asarray(emissivity)
+        * np.asarray(voltage)
+        * (flux_from_sky / (1 - np.asarray(eta)) - flux_from_cell)
+    )
+
+
+def get_total_power_output_derivatives_array(
+    voltage: np.ndarray | float,
+    t_sky: np.ndarray | float,
+    t_cell: np.ndarray | float,
+    E_g: np.ndarray | float,
+    eta: np.ndarray | float = NONRADIATIVE_FRACTION,
+    emissivity: np.ndarray | float = 1.0,
+) -> dict[str, np.ndarray]:
+    """Partial derivatives of get_total_power_output_array at fixed voltage with respect to "t_sky" and "t_cell",
+    in W m^-2 K^-1, and "E_g", in W m^-2 eV^-1.
+
+    At the maximum power point these are also the derivatives of the maximum power, by the envelope theorem: the
+    power output is stationary in voltage there, so the shift of the optimal voltage contributes nothing to first
+    order. This does not hold where the optimum is at a bound of the voltage search.
+    """
+    d_flux_from_sky_d_t, d_flux_from_sky_d_E_g = get_photon_flux_derivatives_array(
+        E_g=E_g, T=t_sky, Delta_mu=0.0
+    )
+    d_flux_from_cell_d_t, d_flux_from_cell_d_E_g = get_photon_flux_derivatives_array(
+        E_g=E_g, T=t_cell, Delta_mu=voltage
+    )
+    factor: Final[np.ndarray] = (
+        ELEMENTARY_CHARGE_C * np.asarray(emissivity) * np.asarray(voltage)
+    )
+    return {
+        "t_sky": factor * d_flux_from_sky_d_t / (1 - np.asarray(eta)),
+        "t_cell": -factor * d_flux_from_cell_d_t,
+        "E_g": factor
+        * (d_flux_from_sky_d_E_g / (1 - np.asarray(eta)) - d_flux_from_cell_d_E_g),
+    }
 
 
 class TotalPowerOutput:
-    def __init__(self, E_g):
+    def __init__(
+        self, E_g, eta: float = NONRADIATIVE_FRACTION, emissivity: float = 1.0
+    ):
+        """`emissivity` is that of the semiconductor above its bandgap, and equally its absorptivity"""
         self.E_g: Final[Quantity] = E_g
+        self.eta: Final[float] = eta
+        self.emissivity: Final[float] = emissivity
         self.integration_iterator = 0
         self.integration_results_dict: dict[int, tuple[float, float]] = dict()
 
@@ -30,6 +190,7 @@ class TotalPowerOutput:
         )
 
         E_unit: Final[u.Unit] = u.electronvolt
+        profiler.count("total_power_output.quad_calls")
         term_2: Final[Quantity] = (
             integrate.quad(
                 lambda E: self._get_term_in_photon_flux_integration(
@@ -68,7 +229,7 @@ class TotalPowerOutput:
         :return: energy-dependent emissivity epsilon(E)
         """
 
-        return 0 if E.to(self.E_g.unit) < self.E_g else 1
+        return 0 if E.to(self.E_g.unit) < self.E_g else self.emissivity
 
     def get_extractible_power_density(
         self, t_surface: Quantity, t_sky: Quantity
@@ -95,9 +256,7 @@ class TotalPowerOutput:
         t_cell: Quantity,
         chemical_potential_driving_emission: Quantity,
     ) -> Quantity:
-        eta: Final[
-            float
-        ] = 0.03  # nonradiative generation percentage, p.g. 7, DOI: 10.1021/acsphotonics.9b00679
+        eta: Final[float] = self.eta
 
         power_received = (
             const.si.e
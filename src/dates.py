@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 
+import pandas as pd
 from dateutil.rrule import DAILY, rrule
 
 
@@ -13,3 +14,32 @@ def get_hourly_datetimes_between_period(
                 datetime.combine(date, datetime.min.time()) + timedelta(hours=hour)
             )
     return hourly_datetimes
+
+
+def get_hourly_dates_between_period(
+    start_date: datetime, end_date: datetime
+) -> pd.DatetimeIndex:
+    """The hours of get_hourly_datetimes_between_period as a datetime64 index, without a Python object per hour"""
+    return pd.date_range(
+        start=datetime.combine(start_date, datetime.min.time()),
+        end=datetime.combine(end_date, datetime.min.time()) + timedelta(hours=23),
+        freq="h",
+    )
+
+
+def get_month_windows_between_period(
+    start_date: datetime, end_date: datetime
+) -> list[tuple[datetime, datetime]]:
+    """Split the days from start_date to end_date (inclusive) into (first day, last day) windows that each lie
+    within one calendar month, so that ranges spanning years can be processed a month at a time.
+    """
+    month_windows: list[tuple[datetime, datetime]] = []
+    window_start: datetime = datetime.combine(start_date, datetime.min.time())
+    while window_start <= end_date:
+        next_month_start: datetime = (
+            window_start.replace(day=1) + timedelta(days=32)
+        ).replace(day=1)
+        window_end: datetime = min(next_month_start - timedelta(days=1), end_date)
+        month_windows.append((window_start, window_end))
+        window_start = next_month_start
+    return month_windows
@@ -0,0 +1,122 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Final, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging(level: str = "INFO") -> None:
+    logging.basicConfig(
+        level=level.upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+class ProgressReporter:
+    """Rate-limited progress and throughput reporting for batch processing.
+
+    Progress lines are logged at most once per `min_interval_seconds`. If `json_stream_path` is provided, each
+    report is also appended to that file as one JSON object per line. Progress may be reported from several threads
+    at once, e.g. by the stages of PowerOutputPipeline.
+    """
+
+    def __init__(
+        self,
+        total_coordinates: int,
+        hours_per_coordinate: int,
+        min_interval_seconds: float = 10.0,
+        json_stream_path: str | None = None,
+    ):
+        self.total_coordinates: Final[int] = total_coordinates
+        self.hours_per_coordinate: Final[int] = hours_per_coordinate
+        self.min_interval_seconds: Final[float] = min_interval_seconds
+
+        self.coordinates_done: int = 0
+        self.coordinates_skipped: int = 0
+        self.hours_done: int = 0
+
+        self._start_time: Final[float] = time.monotonic()
+        self._last_report_time: float = self._start_time
+        self._lock: Final[threading.Lock] = threading.Lock()
+        self._json_stream: TextIO | None = (
+            open(json_stream_path, "a") if json_stream_path is not None else None
+        )
+
+    def add_hours(self, hours: int = 1) -> None:
+        with self._lock:
+            self.hours_done += hours
+            self._report_if_due_unlocked()
+
+    def coordinate_completed(self, skipped: bool = False) -> None:
+        with self._lock:
+            self.coordinates_done += 1
+            if skipped:
+                self.coordinates_skipped += 1
+            self._report_if_due_unlocked()
+
+    def close(self) -> None:
+        self._report(event="finished")
+        if self._json_stream is not None:
+            self._json_stream.close()
+            self._json_stream = None
+
+    def _report_if_due_unlocked(self) -> None:
+        if time.monotonic() - self._last_report_time >= self.min_interval_seconds:
+            self._report_unlocked(event="progress")
+
+    def _report(self, event: str) -> None:
+        with self._lock:
+            self._report_unlocked(event=event)
+
+    def _report_unlocked(self, event: str) -> None:
+        now: Final[float] = time.monotonic()
+        self._last_report_time = now
+        elapsed_seconds: Final[float] = max(now - self._start_time, 1e-9)
+
+        coordinates_per_second: Final[float] = self.coordinates_done / elapsed_seconds
+        hours_per_second: Final[float] = self.hours_done / elapsed_seconds
+        coordinates_remaining: Final[int] = max(
+            self.total_coordinates - self.coordinates_done, 0
+        )
+        eta_seconds: float | None = None
+        if coordinates_per_second > 0:
+            eta_seconds = coordinates_remaining / coordinates_per_second
+        elif hours_per_second > 0:
+            eta_seconds = (
+                coordinates_remaining * self.hours_per_coordinate - self.hours_done
+            ) / hours_per_second
+
+        logger.info(
+            "%d/%d coordinates (%d skipped), %.2f coordinates/s, %.1f hours/s, ETA %s",
+            self.coordinates_done,
+            self.total_coordinates,
+            self.coordinates_skipped,
+            coordinates_per_second,
+            hours_per_second,
+            timedelta(seconds=round(eta_seconds))
+            if eta_seconds is not None
+            else "unknown",
+        )
+
+        if self._json_stream is not None:
+            self._json_stream.write(
+                json.dumps(
+                    {
+                        "event": event,
+                        "timestamp": datetime.now().isoformat(),
+                        "elapsed_seconds": elapsed_seconds,
+                        "coordinates_done": self.coordinates_done,
+                        "coordinates_skipped": self.coordinates_skipped,
+                        "coordinates_total": self.total_coordinates,
+                        "hours_done": self.hours_done,
+                        "coordinates_per_second": coordinates_per_second,
+                        "hours_per_second": hours_per_second,
+                        "eta_seconds": eta_seconds,
+                    }
+                )
+                + "\n"
+            )
+            self._json_stream.flush()
@@ -0,0 +1,114 @@
+import math
+from typing import Final, Literal
+
+import numpy as np
+
+
+def get_min_max_indices(values: np.ndarray, max_points: int) -> list[np.ndarray]:
+    """For each row of `values` (series, time), the sorted indices of the first and last points and of the minimum
+    and maximum within each of max_points / 2 equal buckets. NaNs are ignored unless a bucket is entirely NaN.
+    """
+    series_count, point_count = values.shape
+    if point_count <= max_points:
+        return [np.arange(point_count)] * series_count
+
+    bucket_count: Final[int] = max(1, (max_points - 2) // 2)
+    bucket_size: Final[int] = math.ceil(point_count / bucket_count)
+    padded: Final[np.ndarray] = np.full(
+        (series_count, bucket_count * bucket_size), np.nan
+    )
+    padded[:, :point_count] = values
+    buckets: Final[np.ndarray] = padded.reshape(
+        (series_count, bucket_count, bucket_size)
+    )
+    bucket_offsets: Final[np.ndarray] = np.arange(bucket_count) * bucket_size
+
+    if_all_nan: Final[np.ndarray] = np.all(np.isnan(buckets), axis=2)
+    filled_for_min: Final[np.ndarray] = np.where(np.isnan(buckets), np.inf, buckets)
+    filled_for_max: Final[np.ndarray] = np.where(np.isnan(buckets), -np.inf, buckets)
+    minimum_indices: Final[np.ndarray] = (
+        np.argmin(filled_for_min, axis=2) + bucket_offsets
+    )
+    maximum_indices: Final[np.ndarray] = (
+        np.argmax(filled_for_max, axis=2) + bucket_offsets
+    )
+
+    return [
+        np.unique(
+            np.concatenate(
+                (
+                    [0, point_count - 1],
+                    minimum_indices[series][~if_all_nan[series]],
+                    maximum_indices[series][~if_all_nan[series]],
+                )
+            )
+        )
+        for series in range(series_count)
+    ]
+
+
+def get_lttb_indices(
+    x: np.ndarray, values: np.ndarray, max_points: int
+) -> list[np.ndarray]:
+    """Largest-Triangle-Three-Buckets (Steinarsson, 2013) indices for each row of `values` (series, time) against
+    the shared `x`. Buckets are walked in order, since each choice depends on the previous one, while all series and
+    all points within a bucket are evaluated at once. NaNs are never selected unless a bucket is entirely NaN.
+    """
+    series_count, point_count = values.shape
+    if point_count <= max_points or max_points < 3:
+        return [np.arange(point_count)] * series_count
+
+    x_values: Final[np.ndarray] = np.asarray(x, dtype=float)
+    bucket_edges: Final[np.ndarray] = np.floor(
+        np.linspace(1, point_count - 1, max_points - 1)
+    ).astype(int)
+    selected: Final[np.ndarray] = np.empty((series_count, max_points), dtype=int)
+    selected[:, 0] = 0
+    selected[:, -1] = point_count - 1
+    series_indices: Final[np.ndarray] = np.arange(series_count)
+
+    for bucket in range(max_points - 2):
+        start, stop = bucket_edges[bucket], max(
+            bucket_edges[bucket + 1], bucket_edges[bucket] + 1
+        )
+        next_start, next_stop = stop, (
+            max(bucket_edges[bucket + 2], stop + 1)
+            if bucket + 2 < len(bucket_edges)
+            else point_count
+        )
+        next_x: float = float(np.mean(x_values[next_start:next_stop]))
+        next_y: np.ndarray = np.nanmean(values[:, next_start:next_stop], axis=1)
+
+        previous: np.ndarray = selected[:, bucket]
+        previous_x: np.ndarray = x_values[previous]
+        previous_y: np.ndarray = values[series_indices, previous]
+
+        bucket_x: np.ndarray = x_values[start:stop]
+        bucket_y: np.ndarray = values[:, start:stop]
+        areas: np.ndarray = np.abs(
+            (previous_x[:, np.newaxis] - next_x)
+            * (bucket_y - previous_y[:, np.newaxis])
+            - (previous_x[:, np.newaxis] - bucket_x)
+            * (next_y - previous_y)[:, np.newaxis]
+        )
+        selected[:, bucket + 1] = start + np.argmax(
+            np.where(np.isnan(areas), -np.inf, areas), axis=1
+        )
+
+    return [np.unique(selected[series]) for series in range(series_count)]
+
+
+def downsample(
+    x: np.ndarray,
+    values: np.ndarray,
+    max_points: int,
+    method: Literal["lttb", "min-max"] = "lttb",
+) -> list[np.ndarray]:
+    """Indices of at most about `max_points` points per series that preserve the shape of each row of `values`"""
+    match method:
+        case "lttb":
+            return get_lttb_indices(x=x, values=values, max_points=max_points)
+        case "min-max":
+            return get_min_max_indices(values=values, max_points=max_points)
+        case _:
+            raise ValueError("Unknown downsampling method", method)
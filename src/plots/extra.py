@@ -1,17 +1,22 @@
+import logging
 import os
 from typing import Final
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.io as pio
-from astropy import units as u
+import xarray as xr
 
-from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.parametric_sweep import ParametricSweep
+from src.plots.figure_renderer import get_data_hash, renderer
+
+logger = logging.getLogger(__name__)
 
 
 class ExtraPlots:
-    def __init__(self):
+    def __init__(self, processes: int = 1):
         self.base_path: Final[str] = "data/out/extraplots/"
+        self.processes: Final[int] = processes
         os.makedirs(self.base_path, exist_ok=True)
 
         for bandgap in [0.01, 0.10, 0.17]:
@@ -22,57 +27,40 @@ class ExtraPlots:
             self._save_voltage_vs_temperatures(df=df, bandgap=bandgap)
 
     def _get_temperatures_vs_power_and_voltage(self, bandgap: float):
-        csv_filename: Final[str] = f"power_voltage_per_temp_{bandgap}eV.csv"
-        if os.path.exists(os.path.join(self.base_path, csv_filename)):
-            print(f"{csv_filename} exists! Loading...")
-            return pd.read_csv(
-                os.path.join(self.base_path, csv_filename),
-                parse_dates=False,
-                index_col=0,
+        sweep: Final[xr.Dataset] = (
+            ParametricSweep(
+                t_sky=np.arange(200, 350),
+                t_cell=np.arange(200, 350),
+                E_g=bandgap,
+                processes=self.processes,
             )
-        else:
-            sky_temperatures = range(200, 350)
-            surface_temperatures = range(200, 350)
-
-            data_dict: dict[int, tuple[int, int, float, float]] = dict()
-            index: int = 0
-            for sky_temp, surf_temp in [
-                (sky_temp, surf_temp)
-                for sky_temp in sky_temperatures
-                for surf_temp in surface_temperatures
-            ]:
-                print(f"Trying sky_temp: {sky_temp}, surface_temp: {surf_temp}")
-                t_surf: u.Quantity = surf_temp * u.K
-                t_sky: u.Quantity = sky_temp * u.K
-
-                mpp_object = MaximumPowerPointTracker(
-                    E_g=bandgap * u.eV,
-                    t_sky=t_sky,
-                    t_cell=t_surf,
-                )
-                power_output = mpp_object.max_power
-                optimal_voltage = mpp_object.optimal_voltage
-                print(
-                    f"Produced {power_output} at optimal voltage of {mpp_object.optimal_voltage}"
-                )
-                data_dict[index] = (
-                    t_surf.value,
-                    t_sky.value,
-                    power_output.value,
-                    optimal_voltage.value,
-                )
-                index += 1
-
-            df: Final[pd.DataFrame] = pd.DataFrame.from_dict(
-                data=data_dict,
-                columns=["t_surf", "t_sky", "power_output", "optimum_voltage"],
-                orient="index",
+            .get_results()
+            .squeeze(dim=["E_g", "eta"], drop=True)
+        )
+        return (
+            sweep.rename(
+                {
+                    "t_cell": "t_surf",
+                    "optimal_voltage": "optimum_voltage",
+                    "max_power": "power_output",
+                }
             )
-            df.to_csv(os.path.join(self.base_path, csv_filename))
-
-            return df
+            .to_dataframe()
+            .reset_index()[["t_surf", "t_sky", "power_output", "optimum_voltage"]]
+        )
 
     def _save_power_vs_temperatures(self, df: pd.DataFrame, bandgap: float) -> None:
+        filepath_stem: Final[str] = os.path.join(
+            self.base_path, f"power_per_temp_{bandgap}eV"
+        )
+        data_hash: Final[str] = get_data_hash(df[["t_surf", "t_sky", "power_output"]])
+        if renderer.is_up_to_date(
+            filepath=f"{filepath_stem}.pdf", data_hash=data_hash
+        ) and renderer.is_up_to_date(
+            filepath=f"{filepath_stem}.html", data_hash=data_hash
+        ):
+            return
+
         power_df: Final[pd.DataFrame] = df.set_index(["t_surf", "t_sky"])[
             "power_output"
         ].unstack()
@@ -96,15 +84,29 @@ class ExtraPlots:
                 ),
             ),
         )
-        fig.show()
-        pio.write_image(
+        renderer.show(fig)
+        renderer.write_image(fig, filepath=f"{filepath_stem}.pdf", data_hash=data_hash)
+        renderer.write_image(
             fig,
-            os.path.join(self.base_path, f"power_per_temp_{bandgap}eV.pdf"),
-            format="pdf",
+            filepath=f"{filepath_stem}.html",
+            image_format="html",
+            data_hash=data_hash,
         )
-        fig.write_html(os.path.join(self.base_path, f"power_per_temp_{bandgap}eV.html"))
 
     def _save_voltage_vs_temperatures(self, df: pd.DataFrame, bandgap: float) -> None:
+        filepath_stem: Final[str] = os.path.join(
+            self.base_path, f"voltage_per_temp_{bandgap}eV"
+        )
+        data_hash: Final[str] = get_data_hash(
+            df[["t_surf", "t_sky", "optimum_voltage"]]
+        )
+        if renderer.is_up_to_date(
+            filepath=f"{filepath_stem}.pdf", data_hash=data_hash
+        ) and renderer.is_up_to_date(
+            filepath=f"{filepath_stem}.html", data_hash=data_hash
+        ):
+            return
+
         voltage_df: Final[pd.DataFrame] = df.set_index(["t_surf", "t_sky"])[
             "optimum_voltage"
         ].unstack()
@@ -132,12 +134,11 @@ class ExtraPlots:
                 ),
             ),
         )
-        fig.show()
-        pio.write_image(
+        renderer.show(fig)
+        renderer.write_image(fig, filepath=f"{filepath_stem}.pdf", data_hash=data_hash)
+        renderer.write_image(
             fig,
-            os.path.join(self.base_path, f"voltage_per_temp_{bandgap}eV.pdf"),
-            format="pdf",
-        )
-        fig.write_html(
-            os.path.join(self.base_path, f"voltage_per_temp_{bandgap}eV.html")
+            filepath=f"{filepath_stem}.html",
+            image_format="html",
+            data_hash=data_hash,
         )
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Final
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+logger = logging.getLogger(__name__)
+
+pio.kaleido.scope.mathjax = None
+
+RENDER_MANIFEST_FILEPATH: Final[str] = "data/out/plots/render_manifest.json"
+
+
+def get_data_hash(*data: Any) -> str:
+    """Hash of the data a figure is built from. DataFrames and Series are hashed by value, including their index."""
+    data_hash: Final = hashlib.sha256()
+    for item in data:
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            data_hash.update(
+                repr(
+                    item.columns.tolist()
+                    if isinstance(item, pd.DataFrame)
+                    else item.name
+                ).encode()
+            )
+            data_hash.update(pd.util.hash_pandas_object(item, index=True).values)
+        else:
+            data_hash.update(repr(item).encode())
+    return data_hash.hexdigest()
+
+
+def _export_figure(fig: go.Figure, filepath: str, image_format: str) -> None:
+    if image_format == "html":
+        fig.write_html(filepath)
+    else:
+        pio.write_image(fig, filepath, format=image_format)
+
+
+def _export_figures(figures: list[tuple[str, str, str]]) -> None:
+    """Export (figure JSON, filepath, format) in this process, reusing its kaleido subprocess across figures"""
+    for figure_json, filepath, image_format in figures:
+        _export_figure(
+            fig=pio.from_json(figure_json), filepath=filepath, image_format=image_format
+        )
+
+
+class FigureRenderer:
+    """Shows and exports plotly figures.
+
+    By default figures are shown and exported immediately, as before. In headless mode figures are never shown;
+    exports are queued and written in batches of `batch_size` through persistent kaleido processes, split across
+    `processes` worker processes if more than one. Exports whose data hash matches the one recorded in the render
+    manifest at their last export are skipped, and callers can check is_up_to_date before building a figure at all.
+    """
+
+    def __init__(
+        self,
+        headless: bool = False,
+        processes: int = 1,
+        batch_size: int = 32,
+        manifest_filepath: str = RENDER_MANIFEST_FILEPATH,
+    ):
+        self.headless: bool = headless
+        self.processes: int = processes
+        self.batch_size: int = batch_size
+        self.manifest_filepath: Final[str] = manifest_filepath
+        self._manifest: dict[str, str] | None = None
+        self._queue: list[tuple[str, str, str, str | None]] = []
+        self._executor: ProcessPoolExecutor | None = None
+
+    def configure(self, headless: bool, processes: int = 1) -> None:
+        self.flush()
+        self.headless = headless
+        self.processes = processes
+
+    def show(self, fig: go.Figure) -> None:
+        if not self.headless:
+            fig.show()
+
+    def is_up_to_date(self, filepath: str, data_hash: str) -> bool:
+        """Whether, in headless mode, the figure at `filepath` was last exported from data with this hash"""
+        return (
+            self.headless
+            and self._get_manifest().get(os.path.abspath(filepath)) == data_hash
+            and os.path.isfile(filepath)
+        )
+
+    def write_image(
+        self,
+        fig: go.Figure,
+        filepath: str,
+        image_format: str = "pdf",
+        data_hash: str | None = None,
+    ) -> None:
+        """Export `fig` to `filepath`. `image_format` is any format kaleido supports, or "html"."""
+        if not self.headless:
+            _export_figure(fig=fig, filepath=filepath, image_format=image_format)
+            return
+
+        if data_hash is not None and self.is_up_to_date(
+            filepath=filepath, data_hash=data_hash
+        ):
+            logger.debug("Skipping unchanged %s", filepath)
+            return
+        self._queue.append((fig.to_json(), filepath, image_format, data_hash))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Export all queued figures and record their data hashes"""
+        if not self._queue:
+            return
+
+        queued: Final[list[tuple[str, str, str, str | None]]] = self._queue
+        self._queue = []
+        figures: Final[list[tuple[str, str, str]]] = [
+            (figure_json, filepath, image_format)
+            for figure_json, filepath, image_format, _ in queued
+        ]
+        if self.processes > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            processes: int = self.processes
+            list(
+                self._executor.map(
+                    _export_figures,
+                    [figures[offset::processes] for offset in range(processes)],
+                )
+            )
+        else:
+            _export_figures(figures=figures)
+        logger.info("Exported %d figures", len(figures))
+
+        manifest: Final[dict[str, str]] = self._get_manifest()
+        for _, filepath, _, data_hash in queued:
+            if data_hash is not None:
+                manifest[os.path.abspath(filepath)] = data_hash
+        self._save_manifest()
+
+    def record_export(self, filepath: str, data_hash: str) -> None:
+        """Record that a file other than a figure, e.g. a data export, was written to `filepath` from data with this
+        hash, so that is_up_to_date can skip rewriting it"""
+        self._get_manifest()[os.path.abspath(filepath)] = data_hash
+        self._save_manifest()
+
+    def close(self) -> None:
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _save_manifest(self) -> None:
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.manifest_filepath)), exist_ok=True
+        )
+        with open(self.manifest_filepath, "w") as outfile:
+            json.dump(self._get_manifest(), outfile, indent=2)
+
+    def _get_manifest(self) -> dict[str, str]:
+        if self._manifest is None:
+            self._manifest = dict()
+            if os.path.isfile(self.manifest_filepath):
+                with open(self.manifest_filepath, "r") as infile:
+                    self._manifest = json.load(infile)
+        return self._manifest
+
+
+renderer: Final[FigureRenderer] = FigureRenderer()
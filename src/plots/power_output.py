@@ -1,6 +1,8 @@
 import pandas as pd
 import plotly.express as px
 
+from src.plots.figure_renderer import renderer
+
 
 class PowerOutputPlot:
     def __init__(self):
@@ -16,4 +18,4 @@ class PowerOutputPlot:
             labels={"x": "Datetime", "y": "Average Power Output (W)"},
             color_discrete_sequence=["black"],
         )
-        fig.show()
+        renderer.show(fig)
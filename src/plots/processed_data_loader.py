@@ -1,48 +1,328 @@
+import hashlib
 import json
+import logging
 import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from glob import glob
-from typing import Final, Literal
+from typing import Final, Iterator, Literal
 
+import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.processing.save_output_between_dates import PERIOD_DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+RESULTS_INDEX_FILEPATH: Final[str] = "data/out/results_index.csv"
+HOURLY_DATA_FILENAME: Final[str] = "data_per_dt.csv"
+SPATIAL_INDEX_DIR: Final[str] = "data/out/results_spatial_index/"
+EARTH_RADIUS_KM: Final[float] = 6371.0
+RESULTS_INDEX_COLUMNS: Final[list[str]] = [
+    "method",
+    "start_date",
+    "end_date",
+    "lat",
+    "lon",
+    "total_kwh_per_square_m",
+    "path",
+    "modified_time",
+]
+
+
+class ResultsIndex:
+    """One row per completed output directory, so that totals can be read and locations selected without globbing
+    and parsing every hourly CSV.
+
+    The index is saved as a CSV and updated incrementally: only output directories whose json_data.json is new or
+    has been modified since the last update are read.
+    """
+
+    def __init__(self, filepath: str = RESULTS_INDEX_FILEPATH):
+        self.filepath: Final[str] = os.path.abspath(filepath)
+        self.entries: pd.DataFrame = (
+            pd.read_csv(self.filepath, float_precision="round_trip")
+            if os.path.isfile(self.filepath)
+            else pd.DataFrame(columns=RESULTS_INDEX_COLUMNS)
+        )
+
+    def update(self, output_root: str = "data/out") -> pd.DataFrame:
+        json_filepaths: Final[list[str]] = glob(
+            os.path.join(
+                os.path.abspath(output_root), "*", "*_*", "*_*", "json_data.json"
+            )
+        )
+        known_modified_times: Final[dict[str, float]] = dict(
+            zip(self.entries["path"], self.entries["modified_time"])
+        )
+
+        rows: list[dict] = []
+        read_count: int = 0
+        for json_filepath in json_filepaths:
+            output_dir: str = os.path.dirname(json_filepath)
+            modified_time: float = os.path.getmtime(json_filepath)
+            if known_modified_times.get(output_dir) == modified_time:
+                continue
+
+            try:
+                with open(json_filepath, "r") as infile:
+                    total_kwh: float = json.load(infile)["total_kwh_per_square_m"]
+                period_dir: str = os.path.dirname(output_dir)
+                start_str, end_str = os.path.basename(period_dir).split("_", 1)
+                lat_str, lon_str = os.path.basename(output_dir).split("_", 1)
+                rows.append(
+                    {
+                        "method": os.path.basename(os.path.dirname(period_dir)),
+                        "start_date": datetime.strptime(start_str, PERIOD_DATE_FORMAT),
+                        "end_date": datetime.strptime(end_str, PERIOD_DATE_FORMAT),
+                        "lat": float(lat_str),
+                        "lon": float(lon_str),
+                        "total_kwh_per_square_m": total_kwh,
+                        "path": output_dir,
+                        "modified_time": modified_time,
+                    }
+                )
+                read_count += 1
+            except (ValueError, KeyError, json.JSONDecodeError):
+                logger.warning("Couldn't index %s", json_filepath)
+
+        existing_paths: Final[set[str]] = {
+            os.path.dirname(json_filepath) for json_filepath in json_filepaths
+        }
+        updated_paths: Final[set[str]] = {row["path"] for row in rows}
+        retained_entries: Final[pd.DataFrame] = self.entries[
+            self.entries["path"].isin(existing_paths - updated_paths)
+        ]
+        self.entries = pd.concat(
+            [retained_entries, pd.DataFrame(rows, columns=RESULTS_INDEX_COLUMNS)],
+            ignore_index=True,
+        )
+        logger.info(
+            "Results index has %d entries, %d read", len(self.entries), read_count
+        )
+
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.entries.to_csv(self.filepath, index=False)
+        return self.entries
+
+    def get_entries(
+        self,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        start_date: datetime,
+        end_date: datetime,
+        locations: list[tuple[float, float]] | None = None,
+    ) -> pd.DataFrame:
+        """Entries for one method and period, optionally only those at the (lat, lon) locations"""
+        entries: pd.DataFrame = self.entries[
+            (self.entries["method"] == emissivity_method)
+            & (pd.to_datetime(self.entries["start_date"]) == start_date)
+            & (pd.to_datetime(self.entries["end_date"]) == end_date)
+        ]
+        if locations is not None:
+            entries = entries[
+                pd.MultiIndex.from_frame(entries[["lat", "lon"]]).isin(locations)
+            ]
+        return entries.sort_values(["lat", "lon"]).reset_index(drop=True)
+
+
+def get_unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere, (n, 3), so that straight-line distance increases with great-circle distance"""
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    return np.column_stack(
+        (
+            np.cos(lat_rad) * np.cos(lon_rad),
+            np.cos(lat_rad) * np.sin(lon_rad),
+            np.sin(lat_rad),
+        )
+    )
+
+
+class SpatialResultsIndex:
+    """Nearest-N, radius and bounding-box queries over the results of one method and period.
+
+    A KD-tree is built over the unit vectors of every indexed location, on which chord distance is monotonic in
+    great-circle distance. The unit vectors are saved in `index_dir` as .npz, with a hash of the entries they were
+    computed from, and the tree is rebuilt from them when they are still current. Queries return ResultsIndex
+    entries, with a `distance_km` column where relevant, ready for iter_processed_data to load only the matching
+    series.
+    """
+
+    def __init__(
+        self,
+        results_index: ResultsIndex,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        start_date: datetime,
+        end_date: datetime,
+        index_dir: str = SPATIAL_INDEX_DIR,
+    ):
+        self.entries: Final[pd.DataFrame] = results_index.get_entries(
+            emissivity_method=emissivity_method,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        self.filepath: Final[str] = os.path.join(
+            index_dir,
+            f"{emissivity_method}_{start_date:{PERIOD_DATE_FORMAT}}_{end_date:{PERIOD_DATE_FORMAT}}.npz",
+        )
+        self.tree: Final[cKDTree] = self._get_tree()
+
+    def get_nearest(self, lat: float, lon: float, n: int = 1) -> pd.DataFrame:
+        """The `n` locations nearest to (lat, lon), nearest first"""
+        if self.entries.empty:
+            return self._with_distances(self.entries, np.empty(0))
+        chord_distances, indices = self.tree.query(
+            get_unit_vectors(np.array([lat]), np.array([lon]))[0],
+            k=min(n, len(self.entries)),
+        )
+        return self._with_distances(
+            self.entries.iloc[np.atleast_1d(indices)],
+            np.atleast_1d(chord_distances),
+        )
+
+    def get_within_radius(
+        self, lat: float, lon: float, radius_km: float
+    ) -> pd.DataFrame:
+        """Locations within `radius_km` great-circle distance of (lat, lon), nearest first"""
+        query_vector: Final[np.ndarray] = get_unit_vectors(
+            np.array([lat]), np.array([lon])
+        )[0]
+        indices: Final[list[int]] = self.tree.query_ball_point(
+            query_vector, r=2 * np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2)
+        )
+        entries: Final[pd.DataFrame] = self.entries.iloc[indices]
+        chord_distances: Final[np.ndarray] = np.linalg.norm(
+            self.tree.data[indices] - query_vector, axis=1
+        )
+        order: Final[np.ndarray] = np.argsort(chord_distances, kind="stable")
+        return self._with_distances(entries.iloc[order], chord_distances[order])
+
+    def get_within_bounds(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> pd.DataFrame:
+        """Locations in the box, inclusive. If min_lon > max_lon the box crosses the antimeridian."""
+        lats: Final[np.ndarray] = self.entries["lat"].to_numpy()
+        lons: Final[np.ndarray] = self.entries["lon"].to_numpy()
+        if_in_lons: Final[np.ndarray] = (
+            (lons >= min_lon) & (lons <= max_lon)
+            if min_lon <= max_lon
+            else (lons >= min_lon) | (lons <= max_lon)
+        )
+        return self.entries[(lats >= min_lat) & (lats <= max_lat) & if_in_lons]
+
+    def _get_tree(self) -> cKDTree:
+        entries_key: Final[str] = hashlib.sha256(
+            pd.util.hash_pandas_object(
+                self.entries[["path", "modified_time"]], index=False
+            ).values.tobytes()
+        ).hexdigest()
+        if os.path.isfile(self.filepath):
+            with np.load(self.filepath, allow_pickle=False) as cached:
+                if str(cached["entries_key"]) == entries_key:
+                    return cKDTree(cached["unit_vectors"])
+
+        logger.info("Building spatial index over %d locations", len(self.entries))
+        unit_vectors: Final[np.ndarray] = get_unit_vectors(
+            self.entries["lat"].to_numpy(dtype=float),
+            self.entries["lon"].to_numpy(dtype=float),
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.filepath)), exist_ok=True)
+        # Written to a temporary file first, so that concurrent readers never see a partial index
+        temporary_filepath: Final[str] = f"{self.filepath}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary_filepath,
+            unit_vectors=unit_vectors,
+            entries_key=np.array(entries_key),
+        )
+        os.replace(temporary_filepath, self.filepath)
+        return cKDTree(unit_vectors)
+
+    @staticmethod
+    def _with_distances(
+        entries: pd.DataFrame, chord_distances: np.ndarray
+    ) -> pd.DataFrame:
+        return entries.assign(
+            distance_km=2
+            * EARTH_RADIUS_KM
+            * np.arcsin(np.clip(chord_distances / 2, 0, 1))
+        ).reset_index(drop=True)
+
+
+def get_entries_with_hourly_data(entries: pd.DataFrame) -> pd.DataFrame:
+    """Entries of a ResultsIndex whose hourly data was saved, i.e. that weren't predicted with if_save_hourly False"""
+    if_hourly: Final[np.ndarray] = np.array(
+        [
+            os.path.isfile(os.path.join(path, HOURLY_DATA_FILENAME))
+            for path in entries["path"]
+        ],
+        dtype=bool,
+    )
+    if not np.all(if_hourly):
+        logger.warning(
+            "Skipping %d of %d locations saved without hourly data",
+            np.count_nonzero(~if_hourly),
+            len(entries),
+        )
+    return entries[if_hourly]
+
+
+def _read_hourly_data(output_dir: str, columns: list[str] | None) -> pd.DataFrame:
+    return pd.read_csv(
+        filepath_or_buffer=os.path.join(output_dir, HOURLY_DATA_FILENAME),
+        usecols=None
+        if columns is None
+        else (lambda column: column == "Unnamed: 0" or column in columns),
+        index_col=0,
+        parse_dates=True,
+    )
+
+
+def iter_processed_data(
+    entries: pd.DataFrame, columns: list[str] | None = None, max_workers: int = 8
+) -> Iterator[tuple[float, float, float, pd.DataFrame]]:
+    """Lazily yield (lat, lon, total kWh, hourly data) for each entry of a ResultsIndex, in order. Entries without
+    hourly data are skipped, with a warning.
+
+    Only the requested columns of data_per_dt.csv are read. Files are read in parallel, at most `max_workers` * 2
+    ahead of the consumer, so memory stays bounded however many locations are selected.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: deque[tuple[float, float, float, Future[pd.DataFrame]]] = deque()
+        for entry in get_entries_with_hourly_data(entries).itertuples(index=False):
+            pending.append(
+                (
+                    entry.lat,
+                    entry.lon,
+                    entry.total_kwh_per_square_m,
+                    executor.submit(_read_hourly_data, entry.path, columns),
+                )
+            )
+            if len(pending) >= max_workers * 2:
+                lat, lon, total_kwh, future = pending.popleft()
+                yield lat, lon, total_kwh, future.result()
+        while pending:
+            lat, lon, total_kwh, future = pending.popleft()
+            yield lat, lon, total_kwh, future.result()
 
 
 def get_dict_of_processed_data(
     emissivity_method: Literal["swinbank", "martin-berdahl"],
     start_date: datetime,
     end_date: datetime,
+    columns: list[str] | None = None,
 ) -> dict[int, tuple[float, float, float, pd.DataFrame]]:
-    input_dir: Final[str] = os.path.abspath(
-        f"data/out/{emissivity_method}/{start_date.strftime('%Y%m%d-%H%M%S')}_{end_date.strftime('%Y%m%d-%H%M%S')}/"
-    )
-    folderpaths = glob(os.path.join(input_dir, "*"))
-
-    index: int = 0
-    data_dict: dict[int, tuple[float, float, float, pd.DataFrame]] = dict()
-    for folderpath in folderpaths:
-        long_lat_folder_name = os.path.basename(folderpath)
-        lat_str, lon_str = long_lat_folder_name.split("_", 1)
-        lat: float = float(lat_str)
-        lon: float = float(lon_str)
-
-        output_dir: str = os.path.abspath(
-            f"data/out/{emissivity_method}/{start_date.strftime('%Y%m%d-%H%M%S')}_{end_date.strftime('%Y%m%d-%H%M%S')}/"
-            f"{lat}_{lon}/"
-        )
-        json_filepath: str = os.path.join(output_dir, "json_data.json")
-        df_filepath: str = os.path.join(output_dir, "data_per_dt.csv")
-        try:
-            df: pd.DataFrame = pd.read_csv(
-                filepath_or_buffer=df_filepath, index_col=0, parse_dates=True
+    results_index: Final[ResultsIndex] = ResultsIndex()
+    results_index.update()
+    return dict(
+        enumerate(
+            iter_processed_data(
+                entries=results_index.get_entries(
+                    emissivity_method=emissivity_method,
+                    start_date=start_date,
+                    end_date=end_date,
+                ),
+                columns=columns,
             )
-            with open(json_filepath, "r") as infile:
-                data = json.load(infile)
-                total_kwh: float = data["total_kwh_per_square_m"]
-                data_dict[index] = (lat, lon, total_kwh, df)
-
-        except FileNotFoundError:
-            print(f"Couldn't find file {json_filepath}")
-            pass
-        index += 1
-
-    return data_dict
+        )
+    )
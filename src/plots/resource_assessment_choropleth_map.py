@@ -2,34 +2,105 @@ import os
 from datetime import datetime
 from typing import Final, Literal
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
+import xarray as xr
 
-from src.plots.processed_data_loader import get_dict_of_processed_data
+from src.plots.figure_renderer import get_data_hash, renderer
+from src.plots.processed_data_loader import ResultsIndex
 
 pio.kaleido.scope.mathjax = None
 
 
+def get_raster(df: pd.DataFrame, resolution: float) -> xr.DataArray:
+    """Mean of `value` within each cell of a regular global lat/lon grid with cells `resolution` degrees wide.
+    Cells without locations are NaN."""
+    lats: Final[np.ndarray] = -90 + resolution * (
+        np.arange(round(180 / resolution)) + 0.5
+    )
+    lons: Final[np.ndarray] = -180 + resolution * (
+        np.arange(round(360 / resolution)) + 0.5
+    )
+    lat_indices: Final[np.ndarray] = np.clip(
+        np.floor((df["lat"].to_numpy() + 90) / resolution).astype(int),
+        0,
+        len(lats) - 1,
+    )
+    lon_indices: Final[np.ndarray] = np.clip(
+        np.floor((df["lon"].to_numpy() + 180) / resolution).astype(int),
+        0,
+        len(lons) - 1,
+    )
+    cell_indices: Final[np.ndarray] = lat_indices * len(lons) + lon_indices
+
+    sums: Final[np.ndarray] = np.bincount(
+        cell_indices, weights=df["value"].to_numpy(), minlength=len(lats) * len(lons)
+    )
+    counts: Final[np.ndarray] = np.bincount(
+        cell_indices, minlength=len(lats) * len(lons)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means: Final[np.ndarray] = np.where(counts > 0, sums / counts, np.nan)
+    return xr.DataArray(
+        means.reshape((len(lats), len(lons))),
+        coords={"lat": lats, "lon": lons},
+        dims=("lat", "lon"),
+        name="total_kwh_per_square_m",
+        attrs={"resolution_degrees": resolution, "crs": "EPSG:4326"},
+    )
+
+
+def get_raster_levels(
+    df: pd.DataFrame, resolution: float, zoom_factors: tuple[int, ...] = (1, 2, 4, 8)
+) -> dict[int, xr.DataArray]:
+    """Rasters pre-aggregated at `resolution` multiplied by each zoom factor, binned directly from the locations"""
+    return {
+        zoom_factor: get_raster(df=df, resolution=resolution * zoom_factor)
+        for zoom_factor in zoom_factors
+    }
+
+
 class CreateChoroplethMap:
     def create_map(
-        self, emissivity_method: Literal["swinbank", "martin-berdahl"]
+        self,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        raster_resolution: float | None = None,
+        if_export_geotiff: bool = False,
+        start_date: datetime = datetime(2023, 1, 1),
+        end_date: datetime = datetime(2023, 1, 31),
     ) -> None:
-        start_date: Final[datetime] = datetime(2023, 1, 1)
-        end_date: Final[datetime] = datetime(2023, 1, 31)
-        data_dict: Final[
-            dict[int, tuple[float, float, float, pd.DataFrame]]
-        ] = get_dict_of_processed_data(
+        """Scatter map of the total power output at each location processed between `start_date` and `end_date`, or,
+        if `raster_resolution` (degrees) is passed, a raster map whose rendering cost does not grow with the number of
+        locations. If `if_export_geotiff`, the raster is also exported as GeoTIFF, which requires rioxarray.
+        """
+        if if_export_geotiff and raster_resolution is None:
+            raise ValueError("GeoTIFF export requires a raster_resolution")
+        results_index: Final[ResultsIndex] = ResultsIndex()
+        results_index.update()
+        df: Final[pd.DataFrame] = results_index.get_entries(
             emissivity_method=emissivity_method,
             start_date=start_date,
             end_date=end_date,
-        )
+        ).rename(columns={"total_kwh_per_square_m": "value"})
 
-        df: Final[pd.DataFrame] = pd.DataFrame.from_dict(
-            data=data_dict,
-            columns=["lat", "lon", "value", "average_power_watts_per_sqm"],
-            orient="index",
+        base_path: Final[str] = f"data/out/plots/{emissivity_method}/"
+        filepath: Final[str] = os.path.join(
+            base_path, f"assessment_map_{emissivity_method}.pdf"
         )
+        data_hash: Final[str] = get_data_hash(df[["lat", "lon", "value"]])
+        if raster_resolution is not None:
+            self.create_raster_map(
+                df=df,
+                emissivity_method=emissivity_method,
+                resolution=raster_resolution,
+                base_path=base_path,
+                if_export_geotiff=if_export_geotiff,
+            )
+            return
+        if renderer.is_up_to_date(filepath=filepath, data_hash=data_hash):
+            return
 
         fig = go.Figure(
             data=go.Scattergeo(
@@ -74,15 +145,108 @@ class CreateChoroplethMap:
             ),
         )
 
-        fig.show()
+        renderer.show(fig)
         fig.update_layout(
             width=1000,
         )
 
-        base_path: Final[str] = f"data/out/plots/{emissivity_method}/"
         os.makedirs(base_path, exist_ok=True)
-        pio.write_image(
-            fig,
-            os.path.join(base_path, f"assessment_map_{emissivity_method}.pdf"),
-            format="pdf",
+        renderer.write_image(fig, filepath=filepath, data_hash=data_hash)
+
+    @staticmethod
+    def create_raster_map(
+        df: pd.DataFrame,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        resolution: float,
+        base_path: str,
+        max_render_columns: int = 1440,
+        if_export_geotiff: bool = False,
+    ) -> None:
+        """Export the rasters at every zoom level as NetCDF, the finest also as GeoTIFF if `if_export_geotiff`, and
+        render the finest level at most `max_render_columns` wide as a single heatmap image. Exports already written
+        from the same locations are skipped, as figures are (see FigureRenderer.is_up_to_date).
+        """
+        if if_export_geotiff:
+            # Fail before any raster is computed rather than after
+            CreateChoroplethMap._import_rioxarray()
+        os.makedirs(base_path, exist_ok=True)
+        raster_levels: Final[dict[int, xr.DataArray]] = get_raster_levels(
+            df=df, resolution=resolution
         )
+        grid_data_hash: Final[str] = get_data_hash(df[["lat", "lon", "value"]])
+        for zoom_factor, raster in raster_levels.items():
+            grid_filepath: str = os.path.join(
+                base_path,
+                f"assessment_grid_{emissivity_method}_{resolution * zoom_factor:g}deg.nc",
+            )
+            if renderer.is_up_to_date(filepath=grid_filepath, data_hash=grid_data_hash):
+                continue
+            raster.to_netcdf(grid_filepath)
+            renderer.record_export(filepath=grid_filepath, data_hash=grid_data_hash)
+        geotiff_filepath: Final[str] = os.path.join(
+            base_path, f"assessment_grid_{emissivity_method}_{resolution:g}deg.tif"
+        )
+        if if_export_geotiff and not renderer.is_up_to_date(
+            filepath=geotiff_filepath, data_hash=grid_data_hash
+        ):
+            CreateChoroplethMap._write_geotiff(
+                raster=raster_levels[1], filepath=geotiff_filepath
+            )
+            renderer.record_export(filepath=geotiff_filepath, data_hash=grid_data_hash)
+
+        filepath: Final[str] = os.path.join(
+            base_path, f"assessment_raster_map_{emissivity_method}.pdf"
+        )
+        rendered_raster: Final[xr.DataArray] = next(
+            (
+                raster
+                for _, raster in sorted(raster_levels.items())
+                if raster.sizes["lon"] <= max_render_columns
+            ),
+            raster_levels[max(raster_levels)],
+        )
+        data_hash: Final[str] = get_data_hash(rendered_raster.to_series().dropna())
+        if renderer.is_up_to_date(filepath=filepath, data_hash=data_hash):
+            return
+
+        fig = go.Figure(
+            data=go.Heatmap(
+                z=rendered_raster.values,
+                x=rendered_raster["lon"].values,
+                y=rendered_raster["lat"].values,
+                zmin=0,
+                zmax=float(np.nanmax(rendered_raster.values))
+                if np.any(np.isfinite(rendered_raster.values))
+                else None,
+                colorbar=dict(
+                    title="Total Power Output (kWh/m<sup>2</sup>)", titleside="right"
+                ),
+                hoverongaps=False,
+            )
+        )
+        fig.update_layout(
+            width=1000,
+            height=520,
+            xaxis=dict(title="Longitude", range=[-180, 180]),
+            yaxis=dict(title="Latitude", range=[-90, 90], scaleanchor="x"),
+            plot_bgcolor="rgb(250, 250, 250)",
+        )
+        renderer.show(fig)
+        renderer.write_image(fig, filepath=filepath, data_hash=data_hash)
+
+    @staticmethod
+    def _import_rioxarray() -> None:
+        """rioxarray registers the .rio accessor on import. It is the optional geotiff extra."""
+        try:
+            import rioxarray  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "GeoTIFF export requires rioxarray, installed by `poetry install --extras geotiff`"
+            ) from e
+
+    @staticmethod
+    def _write_geotiff(raster: xr.DataArray, filepath: str) -> None:
+        CreateChoroplethMap._import_rioxarray()
+        raster.sortby("lat", ascending=False).rename(
+            {"lat": "y", "lon": "x"}
+        ).rio.write_crs("EPSG:4326").rio.to_raster(filepath)
@@ -2,23 +2,35 @@ import os
 from datetime import datetime
 from typing import Final, Literal
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
 from plotly.subplots import make_subplots
 
+from src.plots.downsampling import downsample
+from src.plots.figure_renderer import get_data_hash, renderer
 from src.plots.processed_data_loader import get_dict_of_processed_data
 
 pio.kaleido.scope.mathjax = None
 
+PLOTTED_COLUMNS: Final[list[str]] = ["t_sky", "t_surf", "average_power_watts_per_sqm"]
+
 
 class CreateTemperaturePlots:
     def plot_temperatures_and_power_vs_dates(
-        self, emissivity_method: Literal["swinbank", "martin-berdahl"]
+        self,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        max_points: int | None = 2000,
+        downsampling_method: Literal["lttb", "min-max"] = "lttb",
+        if_export_html: bool = False,
+        start_date: datetime = datetime(2022, 1, 1),
+        end_date: datetime = datetime(2022, 12, 31),
     ) -> None:
-        start_date: Final[datetime] = datetime(2022, 1, 1)
-        end_date: Final[datetime] = datetime(2022, 12, 31)
-
+        """Plot the series of each location processed between `start_date` and `end_date`, downsampled to at most
+        about `max_points` points per series for the PDF (None plots every point). If `if_export_html`, an interactive
+        HTML with every point is also written.
+        """
         data_dict: Final[
             dict[int, tuple[float, float, float, pd.DataFrame]]
         ] = get_dict_of_processed_data(
@@ -29,13 +41,80 @@ class CreateTemperaturePlots:
         for key, value in data_dict.items():
             lat, lon, total_kwh, df = value
             self._create_plot(
-                lat=lat, lon=lon, emissivity_method=emissivity_method, df=df
+                lat=lat,
+                lon=lon,
+                emissivity_method=emissivity_method,
+                df=df,
+                max_points=max_points,
+                downsampling_method=downsampling_method,
+                if_export_html=if_export_html,
             )
 
     @staticmethod
     def _create_plot(
-        lat: float, lon: float, emissivity_method: str, df: pd.DataFrame
+        lat: float,
+        lon: float,
+        emissivity_method: str,
+        df: pd.DataFrame,
+        max_points: int | None = None,
+        downsampling_method: Literal["lttb", "min-max"] = "lttb",
+        if_export_html: bool = False,
     ) -> None:
+        filepath: Final[str] = os.path.join(
+            f"data/out/plots/{emissivity_method}/{lat}_{lon}/",
+            f"power_and_temperatures_vs_time_{emissivity_method}.pdf",
+        )
+        data_hash: Final[str] = get_data_hash(
+            df[PLOTTED_COLUMNS], max_points, downsampling_method
+        )
+        html_filepath: Final[str] = filepath.removesuffix(".pdf") + ".html"
+        if renderer.is_up_to_date(filepath=filepath, data_hash=data_hash) and (
+            not if_export_html
+            or renderer.is_up_to_date(filepath=html_filepath, data_hash=data_hash)
+        ):
+            return
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        if if_export_html:
+            html_fig = CreateTemperaturePlots._get_figure(
+                series={column: df[column] for column in PLOTTED_COLUMNS},
+                trace_class=go.Scattergl,
+            )
+            renderer.write_image(
+                html_fig,
+                filepath=html_filepath,
+                image_format="html",
+                data_hash=data_hash,
+            )
+
+        series: dict[str, pd.Series] = {
+            column: df[column] for column in PLOTTED_COLUMNS
+        }
+        if max_points is not None:
+            indices: list[np.ndarray] = downsample(
+                x=df.index.asi8,
+                values=df[PLOTTED_COLUMNS].to_numpy(dtype=float).T,
+                max_points=max_points,
+                method=downsampling_method,
+            )
+            series = {
+                column: df[column].iloc[column_indices]
+                for column, column_indices in zip(PLOTTED_COLUMNS, indices)
+            }
+        fig = CreateTemperaturePlots._get_figure(series=series, trace_class=go.Scatter)
+
+        renderer.show(fig)
+
+        fig.update_layout(
+            width=1000,
+        )
+
+        renderer.write_image(fig, filepath=filepath, data_hash=data_hash)
+
+    @staticmethod
+    def _get_figure(
+        series: dict[str, pd.Series], trace_class: type[go.Scatter] | type[go.Scattergl]
+    ) -> go.Figure:
         fig = make_subplots(
             rows=2,
             cols=1,
@@ -45,10 +124,18 @@ class CreateTemperaturePlots:
         )
 
         fig.add_trace(
-            go.Scatter(x=df.index, y=df.t_sky, name="Sky Temperature"), row=1, col=1
+            trace_class(
+                x=series["t_sky"].index, y=series["t_sky"], name="Sky Temperature"
+            ),
+            row=1,
+            col=1,
         )
         fig.add_trace(
-            go.Scatter(x=df.index, y=df.t_surf, name="Surface Temperature"),
+            trace_class(
+                x=series["t_surf"].index,
+                y=series["t_surf"],
+                name="Surface Temperature",
+            ),
             row=1,
             col=1,
         )
@@ -56,8 +143,10 @@ class CreateTemperaturePlots:
         fig.update_yaxes(title_text="Temperature (K)", row=1, col=1)
 
         fig.add_trace(
-            go.Scatter(
-                x=df.index, y=df.average_power_watts_per_sqm, name="Average Power"
+            trace_class(
+                x=series["average_power_watts_per_sqm"].index,
+                y=series["average_power_watts_per_sqm"],
+                name="Average Power",
             ),
             row=2,
             col=1,
@@ -65,19 +154,4 @@ class CreateTemperaturePlots:
         fig.update_yaxes(
             title_text="Average Power Potential (Wm<sup>-2</sup>)", row=2, col=1
         )
-
-        fig.show()
-
-        fig.update_layout(
-            width=1000,
-        )
-
-        base_path: Final[str] = f"data/out/plots/{emissivity_method}/{lat}_{lon}/"
-        os.makedirs(base_path, exist_ok=True)
-        pio.write_image(
-            fig,
-            os.path.join(
-                base_path, f"power_and_temperatures_vs_time_{emissivity_method}.pdf"
-            ),
-            format="pdf",
-        )
+        return fig
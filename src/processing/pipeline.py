@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import warnings
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Final, Literal
+
+import numpy as np
+import pandas as pd
+
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.device_spec import DeviceSpec
+from src.exceptions import InsufficientClimateDataError
+from src.logs import ProgressReporter
+from src.processing.save_output_between_dates import (
+    PowerOutputWriter,
+    get_power_output_between_dates,
+    get_temperature_stage_inputs,
+)
+from src.processing.stage_cache import StageCache
+from src.processing.uncertainty import UncertaintyModel
+
+logger = logging.getLogger(__name__)
+
+
+class _LoadedWindow:
+    __slots__ = ("writer", "start_date", "end_date", "climate_data_obj", "if_last")
+
+    def __init__(
+        self,
+        writer: PowerOutputWriter,
+        start_date: datetime,
+        end_date: datetime,
+        climate_data_obj: CopernicusClimateData | None,
+        if_last: bool,
+    ):
+        self.writer: Final[PowerOutputWriter] = writer
+        self.start_date: Final[datetime] = start_date
+        self.end_date: Final[datetime] = end_date
+        self.climate_data_obj: Final[CopernicusClimateData | None] = climate_data_obj
+        self.if_last: Final[bool] = if_last
+
+
+class _ComputedWindow:
+    __slots__ = (
+        "writer",
+        "dt_power_df",
+        "total_kwh",
+        "power_output_samples",
+        "if_last",
+    )
+
+    def __init__(
+        self,
+        writer: PowerOutputWriter,
+        dt_power_df: pd.DataFrame,
+        total_kwh: float,
+        power_output_samples: np.ndarray | None,
+        if_last: bool,
+    ):
+        self.writer: Final[PowerOutputWriter] = writer
+        self.dt_power_df: Final[pd.DataFrame] = dt_power_df
+        self.total_kwh: Final[float] = total_kwh
+        self.power_output_samples: Final[np.ndarray | None] = power_output_samples
+        self.if_last: Final[bool] = if_last
+
+
+class PowerOutputPipeline:
+    """Overlaps downloading/opening climate data, computing power output and writing results.
+
+    Each stage runs as an asyncio task connected by bounded queues, with blocking work offloaded to executors.
+    While one month window of one coordinate is being computed, the windows that follow are downloaded and
+    opened, up to `prefetch` windows ahead, which also bounds how many windows are held in memory at once.
+    Windows are computed and written in order, so each coordinate's output is identical to that of
+    save_power_output_between_dates.
+    """
+
+    def __init__(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        progress: ProgressReporter | None = None,
+        incremental: bool = False,
+        prefetch: int = 2,
+        compute_executor: Executor | None = None,
+        masked: bool = False,
+        max_gap_fill_hours: int = 0,
+        stage_cache: StageCache | None = None,
+        devices: list[DeviceSpec] | None = None,
+        interpolation: Literal["nearest", "bilinear"] = "nearest",
+        sensitivities: bool = False,
+        if_save_hourly: bool = True,
+        uncertainty_model: UncertaintyModel | None = None,
+    ):
+        self.start_date: Final[datetime] = start_date
+        self.end_date: Final[datetime] = end_date
+        self.emissivity_method: Final[
+            Literal["swinbank", "martin-berdahl"]
+        ] = emissivity_method
+        self.progress: Final[ProgressReporter | None] = progress
+        self.incremental: Final[bool] = incremental
+        self.prefetch: Final[int] = prefetch
+        self.compute_executor: Final[Executor | None] = compute_executor
+        self.masked: Final[bool] = masked
+        self.max_gap_fill_hours: Final[int] = max_gap_fill_hours
+        self.stage_cache: Final[StageCache | None] = stage_cache
+        self.devices: Final[list[DeviceSpec] | None] = devices
+        self.interpolation: Final[Literal["nearest", "bilinear"]] = interpolation
+        self.sensitivities: Final[bool] = sensitivities
+        self.if_save_hourly: Final[bool] = if_save_hourly
+        self.uncertainty_model: Final[UncertaintyModel | None] = uncertainty_model
+
+    def run(self, coordinates: list[tuple[float, float]]) -> None:
+        """Process (lon, lat) coordinates"""
+        asyncio.run(self._run(coordinates=coordinates))
+
+    async def _run(self, coordinates: list[tuple[float, float]]) -> None:
+        loaded_queue: asyncio.Queue[_LoadedWindow | None] = asyncio.Queue(
+            maxsize=self.prefetch
+        )
+        computed_queue: asyncio.Queue[_ComputedWindow | None] = asyncio.Queue(
+            maxsize=self.prefetch
+        )
+        with ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="load"
+        ) as load_executor, ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="write"
+        ) as write_executor:
+            tasks: Final[list[asyncio.Task]] = [
+                asyncio.create_task(
+                    self._load(
+                        coordinates=coordinates,
+                        loaded_queue=loaded_queue,
+                        executor=load_executor,
+                    )
+                ),
+                asyncio.create_task(
+                    self._compute(
+                        loaded_queue=loaded_queue, computed_queue=computed_queue
+                    )
+                ),
+                asyncio.create_task(
+                    self._write(computed_queue=computed_queue, executor=write_executor)
+                ),
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+    async def _load(
+        self,
+        coordinates: list[tuple[float, float]],
+        loaded_queue: asyncio.Queue[_LoadedWindow | None],
+        executor: Executor,
+    ) -> None:
+        loop: Final[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        for lon, lat in coordinates:
+            writer: PowerOutputWriter = await loop.run_in_executor(
+                executor,
+                partial(
+                    PowerOutputWriter,
+                    emissivity_method=self.emissivity_method,
+                    start_date=self.start_date,
+                    end_date=self.end_date,
+                    lat=lat,
+                    lon=lon,
+                    incremental=self.incremental,
+                    masked=self.masked,
+                    devices=self.devices,
+                    sensitivities=self.sensitivities,
+                    if_save_hourly=self.if_save_hourly,
+                    max_gap_fill_hours=self.max_gap_fill_hours,
+                    interpolation=self.interpolation,
+                    uncertainty_model=self.uncertainty_model,
+                ),
+            )
+            if writer.if_complete:
+                if self.progress is not None:
+                    self.progress.coordinate_completed()
+                continue
+
+            month_windows: list[tuple[datetime, datetime]] = writer.get_month_windows()
+            for window_index, (window_start_date, window_end_date) in enumerate(
+                month_windows
+            ):
+                if writer.if_failed:  # the remaining windows would be discarded
+                    break
+                climate_data_obj: CopernicusClimateData | None = (
+                    None
+                    if self.stage_cache is not None
+                    and self.uncertainty_model is None
+                    and self.stage_cache.contains(
+                        "temperatures",
+                        **get_temperature_stage_inputs(
+                            lon=lon,
+                            lat=lat,
+                            start_date=window_start_date,
+                            end_date=window_end_date,
+                            emissivity_method=self.emissivity_method,
+                            interpolation=self.interpolation,
+                        ),
+                    )
+                    else await loop.run_in_executor(
+                        executor,
+                        partial(
+                            CopernicusClimateData,
+                            if_load_entire_earth=False,
+                            lon=lon,
+                            lat=lat,
+                            year=window_start_date.year,
+                            months=[window_start_date.month],
+                            interpolation=self.interpolation,
+                        ),
+                    )
+                )
+                await loaded_queue.put(
+                    _LoadedWindow(
+                        writer=writer,
+                        start_date=window_start_date,
+                        end_date=window_end_date,
+                        climate_data_obj=climate_data_obj,
+                        if_last=window_index == len(month_windows) - 1,
+                    )
+                )
+        await loaded_queue.put(None)
+
+    async def _compute(
+        self,
+        loaded_queue: asyncio.Queue[_LoadedWindow | None],
+        computed_queue: asyncio.Queue[_ComputedWindow | None],
+    ) -> None:
+        loop: Final[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        while (loaded_window := await loaded_queue.get()) is not None:
+            if loaded_window.writer.if_failed:
+                if loaded_window.climate_data_obj is not None:
+                    loaded_window.climate_data_obj.close()
+                continue
+
+            try:
+                dt_power_df, total_kwh = await loop.run_in_executor(
+                    self.compute_executor,
+                    partial(
+                        get_power_output_between_dates,
+                        climate_data_obj=loaded_window.climate_data_obj,
+                        lon=loaded_window.writer.lon,
+                        lat=loaded_window.writer.lat,
+                        start_date=loaded_window.start_date,
+                        end_date=loaded_window.end_date,
+                        emissivity_method=self.emissivity_method,
+                        progress=self.progress,
+                        masked=self.masked,
+                        max_gap_fill_hours=self.max_gap_fill_hours,
+                        stage_cache=self.stage_cache,
+                        devices=self.devices,
+                        interpolation=self.interpolation,
+                        sensitivities=self.sensitivities,
+                    ),
+                )
+                power_output_samples: np.ndarray | None = (
+                    await loop.run_in_executor(
+                        self.compute_executor,
+                        partial(
+                            self.uncertainty_model.get_power_output_samples,
+                            climate_data_obj=loaded_window.climate_data_obj,
+                            lat=loaded_window.writer.lat,
+                            lon=loaded_window.writer.lon,
+                            dates=dt_power_df.index,
+                            emissivity_method=self.emissivity_method,
+                            device=loaded_window.writer.devices[0],
+                            masked=self.masked,
+                        ),
+                    )
+                    if self.uncertainty_model is not None
+                    else None
+                )
+            except InsufficientClimateDataError as e:
+                warnings.warn(
+                    f"{e}. Skipping lat: {loaded_window.writer.lat}, lon: {loaded_window.writer.lon}."
+                )
+                loaded_window.writer.if_failed = True
+                if self.progress is not None:
+                    self.progress.coordinate_completed(skipped=True)
+                continue
+            finally:
+                if loaded_window.climate_data_obj is not None:
+                    loaded_window.climate_data_obj.close()
+
+            await computed_queue.put(
+                _ComputedWindow(
+                    writer=loaded_window.writer,
+                    dt_power_df=dt_power_df,
+                    total_kwh=total_kwh,
+                    power_output_samples=power_output_samples,
+                    if_last=loaded_window.if_last,
+                )
+            )
+        await computed_queue.put(None)
+
+    async def _write(
+        self,
+        computed_queue: asyncio.Queue[_ComputedWindow | None],
+        executor: Executor,
+    ) -> None:
+        loop: Final[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        while (computed_window := await computed_queue.get()) is not None:
+            await loop.run_in_executor(
+                executor,
+                partial(
+                    computed_window.writer.append,
+                    dt_power_df=computed_window.dt_power_df,
+                    total_kwh=computed_window.total_kwh,
+                    power_output_samples=computed_window.power_output_samples,
+                ),
+            )
+            if computed_window.if_last:
+                await loop.run_in_executor(executor, computed_window.writer.close)
+                if self.progress is not None:
+                    self.progress.coordinate_completed()
@@ -1,14 +1,23 @@
+import logging
 import warnings
 from datetime import datetime
 from typing import Final, Literal
 
+import numpy as np
 from astropy import units as u
 
-from src.api.copernicus_climate_data import CopernicusClimateData
 from src.calculators.coordinates_for_assessment import get_coordinates_for_assessment
+from src.calculators.device_spec import DeviceSpec
 from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.dates import get_hourly_dates_between_period
 from src.exceptions import InsufficientClimateDataError
+from src.logs import ProgressReporter
+from src.processing.pipeline import PowerOutputPipeline
 from src.processing.save_output_between_dates import save_power_output_between_dates
+from src.processing.stage_cache import StageCache
+from src.processing.uncertainty import UncertaintyModel
+
+logger = logging.getLogger(__name__)
 
 
 def get_test_power_output_for_set_temperatures() -> u.Quantity:
@@ -19,29 +28,25 @@ def get_test_power_output_for_set_temperatures() -> u.Quantity:
     power_output = MaximumPowerPointTracker(
         t_cell=t_surf, t_sky=t_sky, E_g=semiconductor_bandgap
     ).max_power
-    print(
-        f"Surface temperature = {t_surf} and sky temperature = {t_sky}.\nPower output = {power_output.value}W"
+    logger.info(
+        "Surface temperature = %s and sky temperature = %s. Power output = %sW",
+        t_surf,
+        t_sky,
+        power_output.value,
     )
     return power_output
 
 
 def save_test_power_output_for_set_lon_lat(
-    emissivity_method: Literal["swinbank", "martin-berdahl"]
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    start_date: datetime = datetime(2022, 1, 1),
+    end_date: datetime = datetime(2022, 12, 31),
 ) -> None:
-    start_date: Final[datetime] = datetime(2022, 1, 1)
-    end_date: Final[datetime] = datetime(2022, 12, 31)
     lat: Final[float] = 53.4
     lon: Final[float] = -6.3
 
-    climate_data_obj: Final[CopernicusClimateData] = CopernicusClimateData(
-        if_load_entire_earth=False,
-        lat=lat,
-        lon=lon,
-        year=start_date.year,
-        months=[*range(start_date.month, end_date.month + 1)],
-    )
     save_power_output_between_dates(
-        climate_data_obj=climate_data_obj,
+        climate_data_obj=None,
         lon=lon,
         lat=lat,
         start_date=start_date,
@@ -56,10 +61,34 @@ def process_batch(
     batch_start: int,
     batch_quantity: int | None,
     emissivity_method: Literal["swinbank", "martin-berdahl"],
+    progress_json_path: str | None = None,
+    incremental: bool = False,
+    resolution: float = 5.0,
+    pipelined: bool = False,
+    prefetch: int = 2,
+    uncertainty_samples: int | None = None,
+    masked: bool = False,
+    max_gap_fill_hours: int = 0,
+    stage_cache: StageCache | None = None,
+    devices: list[DeviceSpec] | None = None,
+    interpolation: Literal["nearest", "bilinear"] = "nearest",
+    sensitivities: bool = False,
+    if_save_hourly: bool = True,
 ) -> None:
-    coordinates_for_assessment: Final[
-        list[tuple[float, float]]
-    ] = get_coordinates_for_assessment()
+    """If `uncertainty_samples` is given, Monte Carlo percentile bands are also saved for each coordinate. If
+    `masked`, coordinates with missing hours are saved with those hours as NaN instead of being skipped.
+    `interpolation` is how climate data is interpolated to each coordinate (see CopernicusClimateData). If
+    `sensitivities`, the derivatives of power output and its total are saved too (see PowerOutputWriter). Unless
+    `if_save_hourly`, only totals and hour of day and month aggregates are saved.
+    """
+    coordinates_for_assessment: Final[np.ndarray] = get_coordinates_for_assessment(
+        resolution=resolution
+    )
+    uncertainty_model: Final[UncertaintyModel | None] = (
+        UncertaintyModel(samples=uncertainty_samples)
+        if uncertainty_samples is not None
+        else None
+    )
 
     if batch_quantity is None:
         batch_end = len(coordinates_for_assessment)
@@ -71,24 +100,58 @@ def process_batch(
             if batch_start_plus_quantity <= len(coordinates_for_assessment)
             else len(coordinates_for_assessment)
         )
-    for lon, lat in coordinates_for_assessment[batch_start:batch_end]:
-        print(f"Processing co-ordinate lon:{lon}, lat:{lat}")
-        climate_data_obj: CopernicusClimateData = CopernicusClimateData(
-            if_load_entire_earth=False,
-            lon=lon,
-            lat=lat,
-            year=start_date.year,
-            months=[*range(start_date.month, end_date.month + 1)],
-        )
 
+    progress: Final[ProgressReporter] = ProgressReporter(
+        total_coordinates=batch_end - batch_start,
+        hours_per_coordinate=len(
+            get_hourly_dates_between_period(start_date=start_date, end_date=end_date)
+        ),
+        json_stream_path=progress_json_path,
+    )
+    if pipelined:
+        PowerOutputPipeline(
+            start_date=start_date,
+            end_date=end_date,
+            emissivity_method=emissivity_method,
+            progress=progress,
+            incremental=incremental,
+            prefetch=prefetch,
+            masked=masked,
+            max_gap_fill_hours=max_gap_fill_hours,
+            stage_cache=stage_cache,
+            devices=devices,
+            interpolation=interpolation,
+            sensitivities=sensitivities,
+            if_save_hourly=if_save_hourly,
+            uncertainty_model=uncertainty_model,
+        ).run(coordinates=coordinates_for_assessment[batch_start:batch_end].tolist())
+        progress.close()
+        return
+
+    for lon, lat in coordinates_for_assessment[batch_start:batch_end].tolist():
+        logger.debug("Processing co-ordinate lon:%s, lat:%s", lon, lat)
         try:
             save_power_output_between_dates(
-                climate_data_obj=climate_data_obj,
+                climate_data_obj=None,
                 lon=lon,
                 lat=lat,
                 start_date=start_date,
                 end_date=end_date,
                 emissivity_method=emissivity_method,
+                progress=progress,
+                incremental=incremental,
+                masked=masked,
+                max_gap_fill_hours=max_gap_fill_hours,
+                stage_cache=stage_cache,
+                devices=devices,
+                interpolation=interpolation,
+                sensitivities=sensitivities,
+                if_save_hourly=if_save_hourly,
+                uncertainty_model=uncertainty_model,
             )
         except InsufficientClimateDataError as e:
             warnings.warn(f"{e}. Skipping lat: {lat}, lon: {lon}.")
+            progress.coordinate_completed(skipped=True)
+        else:
+            progress.coordinate_completed()
+    progress.close()
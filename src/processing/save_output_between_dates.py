@@ -1,91 +1,921 @@
 import json
+import logging
 import os
+import shutil
 from datetime import datetime, timedelta
+from glob import glob
 from typing import Final, Literal
 
 import numpy as np
 import pandas as pd
-from astropy import units as u
 
 from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.device_spec import DEFAULT_DEVICE, DeviceSpec
 from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
 from src.calculators.sky_temperature import SkyTemperature
-from src.dates import get_hourly_datetimes_between_period
+from src.dates import get_hourly_dates_between_period, get_month_windows_between_period
 from src.exceptions import InsufficientClimateDataError
+from src.logs import ProgressReporter
+from src.processing.stage_cache import StageCache
+from src.processing.uncertainty import UncertaintyModel, UncertaintyWriter
+from src.profiling import profiler
+from src.stats.power_output_aggregates import AGGREGATES_FILENAME, PowerOutputAggregates
+
+logger = logging.getLogger(__name__)
+
+
+PERIOD_DATE_FORMAT: Final[str] = "%Y%m%d-%H%M%S"
+COMPLETENESS_KEYS: Final[tuple[str, ...]] = (
+    "total_hours",
+    "valid_hours",
+    "gap_filled_hours",
+)
+HOURLY_COLUMNS: Final[list[str]] = [
+    "average_power_watts_per_sqm",
+    "optimal_voltage",
+    "t_sky",
+    "t_surf",
+]
+# Columns holding the derivatives of the first device's power output, by the names solve_batch returns them under
+SENSITIVITY_COLUMNS: Final[dict[str, str]] = {
+    "t_sky": "sensitivity_t_sky",
+    "t_cell": "sensitivity_t_surf",
+    "E_g": "sensitivity_E_g",
+}
+
+
+def get_output_dir(
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    start_date: datetime,
+    end_date: datetime,
+    lat: float,
+    lon: float,
+) -> str:
+    start_str: Final[str] = start_date.strftime(PERIOD_DATE_FORMAT)
+    end_str: Final[str] = end_date.strftime(PERIOD_DATE_FORMAT)
+    return os.path.join(
+        os.path.abspath(f"data/out/{emissivity_method}"),
+        f"{start_str}_{end_str}",
+        f"{lat}_{lon}",
+        "",
+    )
+
+
+def find_latest_output(
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    start_date: datetime,
+    end_date: datetime,
+    lat: float,
+    lon: float,
+) -> tuple[str, datetime] | None:
+    """The completed output for this coordinate and method that starts at `start_date` and extends furthest without
+    passing `end_date`, as (output_dir, end date of that output)"""
+    latest_output: tuple[str, datetime] | None = None
+    for json_filepath in glob(
+        os.path.join(
+            os.path.abspath(f"data/out/{emissivity_method}"),
+            f"{start_date.strftime(PERIOD_DATE_FORMAT)}_*",
+            f"{lat}_{lon}",
+            "json_data.json",
+        )
+    ):
+        output_dir: str = os.path.dirname(json_filepath)
+        output_end_date: datetime = datetime.strptime(
+            os.path.basename(os.path.dirname(output_dir)).split("_", 1)[1],
+            PERIOD_DATE_FORMAT,
+        )
+        if output_end_date <= end_date and (
+            latest_output is None or output_end_date > latest_output[1]
+        ):
+            latest_output = (output_dir, output_end_date)
+    return latest_output
+
+
+def get_last_hourly_date(hourly_filepath: str) -> datetime | None:
+    """Date of the last row of a data_per_dt.csv, read from the end of the file. None if it has no rows."""
+    with open(hourly_filepath, "rb") as infile:
+        infile.seek(0, os.SEEK_END)
+        infile.seek(max(infile.tell() - 4096, 0))
+        lines: Final[list[bytes]] = infile.read().splitlines()
+    try:
+        return datetime.fromisoformat(lines[-1].split(b",", 1)[0].decode())
+    except (IndexError, ValueError):
+        return None
+
+
+class PowerOutputWriter:
+    """Writes the hourly data and total for one coordinate as month windows complete.
+
+    If `incremental`, the latest existing output for this coordinate and method with the same start date is
+    extended: its hourly data is copied and its total carried forward, and only the windows after its end date
+    are returned by `get_month_windows`. Outputs whose hourly data doesn't end on their end date, e.g. after an
+    interrupted copy, or that were computed with other settings (see get_output_settings), are recomputed instead.
+
+    If `masked`, hours without valid climate data are kept as NaN rather than aborting the coordinate, and the
+    number of valid and gap-filled hours is recorded in json_data.json alongside the total.
+
+    If more than one of `devices` is evaluated, the total of each is also recorded, by device name.
+
+    If `sensitivities`, the derivatives of the total with respect to sky and surface temperatures (kWh m^-2 K^-1)
+    and the bandgap (kWh m^-2 eV^-1) are recorded, summed from the hourly sensitivity columns.
+
+    Hour of day and month aggregates of the first device's power output are accumulated as windows are appended
+    and saved to aggregates.csv (see PowerOutputAggregates). Unless `if_save_hourly`, they replace the hourly data,
+    which is then not written at all.
+
+    With an `uncertainty_model`, the power output samples of the first device appended with each window are written
+    as percentile bands (see UncertaintyWriter).
+    """
+
+    def __init__(
+        self,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        start_date: datetime,
+        end_date: datetime,
+        lat: float,
+        lon: float,
+        incremental: bool = False,
+        masked: bool = False,
+        devices: list[DeviceSpec] | None = None,
+        sensitivities: bool = False,
+        if_save_hourly: bool = True,
+        max_gap_fill_hours: int = 0,
+        interpolation: Literal["nearest", "bilinear"] = "nearest",
+        uncertainty_model: UncertaintyModel | None = None,
+    ):
+        self.start_date: Final[datetime] = start_date
+        self.end_date: Final[datetime] = end_date
+        self.lat: Final[float] = lat
+        self.lon: Final[float] = lon
+        self.masked: Final[bool] = masked
+        self.max_gap_fill_hours: Final[int] = max_gap_fill_hours if masked else 0
+        self.interpolation: Final[Literal["nearest", "bilinear"]] = interpolation
+        self.uncertainty_model: Final[UncertaintyModel | None] = uncertainty_model
+        self.uncertainty_writer: UncertaintyWriter | None = None
+        self.devices: Final[list[DeviceSpec]] = devices or [DEFAULT_DEVICE]
+        self.sensitivities: Final[bool] = sensitivities
+        self.if_save_hourly: Final[bool] = if_save_hourly
+        self.output_dir: Final[str] = get_output_dir(
+            emissivity_method=emissivity_method,
+            start_date=start_date,
+            end_date=end_date,
+            lat=lat,
+            lon=lon,
+        )
+        self.hourly_filepath: Final[str] = os.path.join(
+            self.output_dir, "data_per_dt.csv"
+        )
+        self.json_filepath: Final[str] = os.path.join(self.output_dir, "json_data.json")
+        self.aggregates_filepath: Final[str] = os.path.join(
+            self.output_dir, AGGREGATES_FILENAME
+        )
+
+        latest_output: tuple[str, datetime] | None = (
+            find_latest_output(
+                emissivity_method=emissivity_method,
+                start_date=start_date,
+                end_date=end_date,
+                lat=lat,
+                lon=lon,
+            )
+            if incremental
+            else None
+        )
+        if latest_output is not None:
+            previous_hourly_filepath: Final[str] = os.path.join(
+                latest_output[0], "data_per_dt.csv"
+            )
+            expected_last_date: Final[datetime] = get_hourly_dates_between_period(
+                start_date=start_date, end_date=latest_output[1]
+            )[-1].to_pydatetime()
+            if (
+                os.path.isfile(previous_hourly_filepath)
+                and get_last_hourly_date(previous_hourly_filepath) != expected_last_date
+            ):
+                logger.warning(
+                    "%s doesn't end at %s, so it is recomputed rather than extended",
+                    previous_hourly_filepath,
+                    expected_last_date,
+                )
+                latest_output = None
+        previous_json_data: dict = dict()
+        if latest_output is not None:
+            with open(os.path.join(latest_output[0], "json_data.json"), "r") as infile:
+                previous_json_data = json.load(infile)
+            previous_output_settings: Final[dict] = self._get_previous_output_settings(
+                previous_output_dir=latest_output[0],
+                previous_json_data=previous_json_data,
+            )
+            if previous_output_settings != self.get_output_settings():
+                logger.warning(
+                    "%s was computed with %s rather than %s, so it is recomputed rather than extended",
+                    latest_output[0],
+                    previous_output_settings,
+                    self.get_output_settings(),
+                )
+                latest_output = None
+        self.compute_start_date: datetime = start_date
+        self.total_kwh: float = 0.0
+        self.total_kwh_by_device: Final[dict[str, float]] = {
+            device.name: 0.0 for device in self.devices
+        }
+        self.completeness: Final[dict[str, int]] = {key: 0 for key in COMPLETENESS_KEYS}
+        self.total_kwh_sensitivities: Final[dict[str, float]] = {
+            column: 0.0 for column in SENSITIVITY_COLUMNS.values()
+        }
+        self.aggregates: PowerOutputAggregates = PowerOutputAggregates()
+        self.if_complete: bool = False
+        # Set by callers that abandon the coordinate, e.g. on InsufficientClimateDataError
+        self.if_failed: bool = False
+        self._if_new_file: bool = True
+        if latest_output is not None:
+            previous_output_dir, previous_end_date = latest_output
+            if previous_end_date == end_date:
+                logger.info(
+                    "Output already exists at %s. Nothing to compute.",
+                    previous_output_dir,
+                )
+                self.if_complete = True
+                return
+            self.total_kwh = previous_json_data["total_kwh_per_square_m"]
+            self.total_kwh_by_device.update(
+                previous_json_data.get(
+                    "total_kwh_per_square_m_by_device",
+                    {self.devices[0].name: self.total_kwh},
+                )
+            )
+            previous_hours: int = len(
+                get_hourly_dates_between_period(
+                    start_date=start_date, end_date=previous_end_date
+                )
+            )
+            self.completeness.update(
+                {  # outputs from unmasked runs are complete
+                    "total_hours": previous_hours,
+                    "valid_hours": previous_hours,
+                    **{
+                        key: previous_json_data[key]
+                        for key in COMPLETENESS_KEYS
+                        if key in previous_json_data
+                    },
+                }
+            )
+            if sensitivities:
+                self.total_kwh_sensitivities.update(
+                    previous_json_data["total_kwh_per_square_m_sensitivities"]
+                )
+            self.aggregates = self._get_previous_aggregates(previous_output_dir)
+            self.compute_start_date = previous_end_date + timedelta(days=1)
+            logger.debug(
+                "Extending %s from %s", previous_output_dir, self.compute_start_date
+            )
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        # only complete outputs may have a total or aggregates
+        for filepath in [self.json_filepath, self.aggregates_filepath]:
+            if os.path.isfile(filepath):
+                os.remove(filepath)
+        if (
+            latest_output is not None
+            and if_save_hourly
+            and os.path.isfile(os.path.join(latest_output[0], "data_per_dt.csv"))
+        ):
+            with profiler.stage("output.write"):
+                shutil.copyfile(
+                    os.path.join(latest_output[0], "data_per_dt.csv"),
+                    self.hourly_filepath,
+                )
+            self._if_new_file = False
+        if uncertainty_model is not None:
+            self.uncertainty_writer = UncertaintyWriter(
+                uncertainty_model=uncertainty_model,
+                output_dir=self.output_dir,
+                previous_output_dir=latest_output[0]
+                if latest_output is not None
+                else None,
+                if_save_hourly=if_save_hourly,
+            )
+
+    def get_output_settings(self) -> dict:
+        """What the hourly columns and the totals depend on besides the method, period and location. Saved in
+        json_data.json, as an output is only extended by a run with the same settings.
+        """
+        return {
+            "devices": [device.to_dict() for device in self.devices],
+            "sensitivities": self.sensitivities,
+            "max_gap_fill_hours": self.max_gap_fill_hours,
+            "interpolation": self.interpolation,
+            "uncertainty_samples": self.uncertainty_model.samples
+            if self.uncertainty_model is not None
+            else None,
+        }
+
+    @staticmethod
+    def _get_previous_output_settings(
+        previous_output_dir: str, previous_json_data: dict
+    ) -> dict:
+        """The settings of an output being extended, inferred from its totals and hourly columns if it predates them.
+        Such outputs of several devices or with gaps filled can't be matched, as their specs weren't recorded.
+        """
+        previous_hourly_filepath: Final[str] = os.path.join(
+            previous_output_dir, "data_per_dt.csv"
+        )
+        if_gap_filled: Final[bool] = (
+            os.path.isfile(previous_hourly_filepath)
+            and "gap_filled" in pd.read_csv(previous_hourly_filepath, nrows=0).columns
+        )
+        return {
+            "devices": [DEFAULT_DEVICE.to_dict()]
+            if "total_kwh_per_square_m_by_device" not in previous_json_data
+            else None,
+            "max_gap_fill_hours": None if if_gap_filled else 0,
+            "interpolation": "nearest",
+            "uncertainty_samples": None,
+            "sensitivities": "total_kwh_per_square_m_sensitivities"
+            in previous_json_data,
+            **previous_json_data.get("output_settings", dict()),
+        }
+
+    @staticmethod
+    def _get_previous_aggregates(previous_output_dir: str) -> PowerOutputAggregates:
+        """The aggregates of an output being extended, accumulated from its hourly data if it predates them"""
+        aggregates_filepath: Final[str] = os.path.join(
+            previous_output_dir, AGGREGATES_FILENAME
+        )
+        if os.path.isfile(aggregates_filepath):
+            return PowerOutputAggregates.load(aggregates_filepath)
+        aggregates: Final[PowerOutputAggregates] = PowerOutputAggregates()
+        hourly_filepath: Final[str] = os.path.join(
+            previous_output_dir, "data_per_dt.csv"
+        )
+        if os.path.isfile(hourly_filepath):
+            previous_df: pd.DataFrame = pd.read_csv(
+                hourly_filepath,
+                usecols=[0, 1],
+                index_col=0,
+                parse_dates=True,
+            )
+            aggregates.update(
+                dates=previous_df.index,
+                power=previous_df["average_power_watts_per_sqm"].to_numpy(),
+            )
+        return aggregates
+
+    def get_month_windows(self) -> list[tuple[datetime, datetime]]:
+        return get_month_windows_between_period(
+            start_date=self.compute_start_date, end_date=self.end_date
+        )
+
+    def append(
+        self,
+        dt_power_df: pd.DataFrame,
+        total_kwh: float,
+        power_output_samples: np.ndarray | None = None,
+    ) -> None:
+        """`power_output_samples` are required with an uncertainty model (see UncertaintyModel)"""
+        logger.debug("Saving %s to %s", dt_power_df.index.min(), self.output_dir)
+        if self.if_save_hourly:
+            with profiler.stage("output.write"):
+                dt_power_df.to_csv(
+                    self.hourly_filepath,
+                    mode="w" if self._if_new_file else "a",
+                    header=self._if_new_file,
+                )
+            self._if_new_file = False
+        self.aggregates.update(
+            dates=dt_power_df.index,
+            power=dt_power_df["average_power_watts_per_sqm"].to_numpy(),
+        )
+        self.total_kwh += total_kwh
+        for device, (power_column, _) in zip(
+            self.devices, get_device_columns(self.devices)
+        ):
+            power_outputs: np.ndarray = dt_power_df[power_column].to_numpy()
+            self.total_kwh_by_device[device.name] += float(
+                np.sum(power_outputs[power_outputs > 0]) / 1000
+            )
+        self.completeness["total_hours"] += len(dt_power_df)
+        self.completeness["valid_hours"] += int(
+            dt_power_df["average_power_watts_per_sqm"].notna().sum()
+        )
+        if "gap_filled" in dt_power_df.columns:
+            self.completeness["gap_filled_hours"] += int(
+                dt_power_df["gap_filled"].sum()
+            )
+        if self.sensitivities:
+            # The total only counts positive power output, so only those hours contribute to its derivatives
+            if_positive: np.ndarray = (
+                dt_power_df["average_power_watts_per_sqm"].to_numpy() > 0
+            )
+            for column in SENSITIVITY_COLUMNS.values():
+                self.total_kwh_sensitivities[column] += float(
+                    np.sum(dt_power_df[column].to_numpy()[if_positive]) / 1000
+                )
+        if self.uncertainty_writer is not None:
+            if power_output_samples is None:
+                raise ValueError("Power output samples are required for uncertainty")
+            self.uncertainty_writer.append(
+                power_output_samples=power_output_samples, dates=dt_power_df.index
+            )
+
+    def close(self) -> None:
+        with profiler.stage("output.write"):
+            self.aggregates.save(self.aggregates_filepath)
+            with open(self.json_filepath, "w") as outfile:
+                json.dump(
+                    {
+                        "total_kwh_per_square_m": self.total_kwh,
+                        **(self.completeness if self.masked else {}),
+                        **(
+                            {
+                                "total_kwh_per_square_m_by_device": self.total_kwh_by_device
+                            }
+                            if len(self.devices) > 1
+                            else {}
+                        ),
+                        **(
+                            {
+                                "total_kwh_per_square_m_sensitivities": self.total_kwh_sensitivities
+                            }
+                            if self.sensitivities
+                            else {}
+                        ),
+                        "output_settings": self.get_output_settings(),
+                    },
+                    outfile,
+                )
+            if self.uncertainty_writer is not None:
+                self.uncertainty_writer.close()
+        self.if_complete = True
+
+        logger.info(
+            "Total kWh at lat: %s, lon: %s between %s and %s: %s kWh",
+            self.lat,
+            self.lon,
+            self.start_date,
+            self.end_date + timedelta(hours=23),
+            self.total_kwh,
+        )
+        if len(self.devices) > 1:
+            logger.info("Total kWh by device: %s", self.total_kwh_by_device)
+        if self.masked and self.completeness["total_hours"] > 0:
+            logger.info(
+                "Data completeness at lat: %s, lon: %s: %.1f%% (%d hours gap-filled)",
+                self.lat,
+                self.lon,
+                100
+                * self.completeness["valid_hours"]
+                / self.completeness["total_hours"],
+                self.completeness["gap_filled_hours"],
+            )
 
 
 def save_power_output_between_dates(
-    climate_data_obj: CopernicusClimateData,
+    climate_data_obj: CopernicusClimateData | None,
     lon: float,
     lat: float,
     start_date: datetime,
     end_date: datetime,
     emissivity_method: Literal["swinbank", "martin-berdahl"],
+    progress: ProgressReporter | None = None,
+    incremental: bool = False,
+    masked: bool = False,
+    max_gap_fill_hours: int = 0,
+    stage_cache: StageCache | None = None,
+    devices: list[DeviceSpec] | None = None,
+    interpolation: Literal["nearest", "bilinear"] = "nearest",
+    sensitivities: bool = False,
+    if_save_hourly: bool = True,
+    uncertainty_model: UncertaintyModel | None = None,
 ):
-    output_dir: Final[str] = os.path.abspath(
-        f"data/out/{emissivity_method}/{start_date.strftime('%Y%m%d-%H%M%S')}_{end_date.strftime('%Y%m%d-%H%M%S')}/"
-        f"{lat}_{lon}/"
-    )
-    os.makedirs(output_dir, exist_ok=True)
+    """Hours are processed one calendar month at a time and appended to the output as each month completes. If
+    `climate_data_obj` is None, each month's climate data is loaded for that month only and released before the
+    next, so peak memory is bounded by one month however many years are requested.
 
-    dt_data_dict: dict[
-        datetime, tuple[u.Quantity, u.Quantity, u.Quantity, u.Quantity]
-    ] = dict()
-    semiconductor_bandgap: Final[u.Quantity] = 0.17 * u.electronvolt
+    If `incremental`, only hours missing from the latest existing output with the same start date are computed
+    (see PowerOutputWriter). If `masked`, hours with missing climate data are written as NaN, and gaps of up to
+    `max_gap_fill_hours` are filled (see get_power_output_between_dates). With a `stage_cache`, climate data is only
+    loaded for windows whose temperatures aren't cached. Each of `devices` is evaluated on the same temperatures.
+    Climate data loaded here is interpolated to the location with `interpolation` (see CopernicusClimateData).
+    If `sensitivities`, the derivatives of power output are saved too (see get_power_output_between_dates).
+    Unless `if_save_hourly`, only the total and the aggregates are saved (see PowerOutputWriter). With an
+    `uncertainty_model`, percentile bands of the first device's power output are sampled from each window's climate
+    data, which is then always loaded, and saved too.
+    """
+    writer: Final[PowerOutputWriter] = PowerOutputWriter(
+        emissivity_method=emissivity_method,
+        start_date=start_date,
+        end_date=end_date,
+        lat=lat,
+        lon=lon,
+        incremental=incremental,
+        masked=masked,
+        devices=devices,
+        sensitivities=sensitivities,
+        if_save_hourly=if_save_hourly,
+        max_gap_fill_hours=max_gap_fill_hours,
+        interpolation=interpolation,
+        uncertainty_model=uncertainty_model,
+    )
+    if writer.if_complete:
+        return
 
-    total_kwh: float = 0.0
-    for dt in get_hourly_datetimes_between_period(
-        start_date=start_date, end_date=end_date
-    ):
-        t_surf: u.Quantity = climate_data_obj.get_surface_temperature(
-            date=dt, lat=lat, lon=lon
+    for window_start_date, window_end_date in writer.get_month_windows():
+        if_load_climate_data: bool = climate_data_obj is None and (
+            stage_cache is None
+            or uncertainty_model is not None
+            or not stage_cache.contains(
+                "temperatures",
+                **get_temperature_stage_inputs(
+                    lon=lon,
+                    lat=lat,
+                    start_date=window_start_date,
+                    end_date=window_end_date,
+                    emissivity_method=emissivity_method,
+                    interpolation=interpolation,
+                ),
+            )
+        )
+        window_climate_data_obj: CopernicusClimateData | None = (
+            CopernicusClimateData(
+                if_load_entire_earth=False,
+                lon=lon,
+                lat=lat,
+                year=window_start_date.year,
+                months=[window_start_date.month],
+                interpolation=interpolation,
+            )
+            if if_load_climate_data
+            else climate_data_obj
+        )
+        try:
+            dt_power_df, window_total_kwh = get_power_output_between_dates(
+                climate_data_obj=window_climate_data_obj,
+                lon=lon,
+                lat=lat,
+                start_date=window_start_date,
+                end_date=window_end_date,
+                emissivity_method=emissivity_method,
+                progress=progress,
+                masked=masked,
+                max_gap_fill_hours=max_gap_fill_hours,
+                stage_cache=stage_cache,
+                devices=devices,
+                interpolation=interpolation,
+                sensitivities=sensitivities,
+            )
+            power_output_samples: np.ndarray | None = (
+                uncertainty_model.get_power_output_samples(
+                    climate_data_obj=window_climate_data_obj,
+                    lat=lat,
+                    lon=lon,
+                    dates=dt_power_df.index,
+                    emissivity_method=emissivity_method,
+                    device=writer.devices[0],
+                    masked=masked,
+                )
+                if uncertainty_model is not None
+                else None
+            )
+        finally:
+            if if_load_climate_data:
+                window_climate_data_obj.close()
+        writer.append(
+            dt_power_df=dt_power_df,
+            total_kwh=window_total_kwh,
+            power_output_samples=power_output_samples,
         )
-        t_sky: u.Quantity = SkyTemperature(
-            surface_temperature_obj=climate_data_obj, lat=lat, lon=lon
-        ).get_sky_temperature(date=dt, formula=emissivity_method)
 
-        if np.isnan(t_surf) or np.isnan(t_sky):
+    writer.close()
+
+
+def get_temperature_stage_inputs(
+    lon: float,
+    lat: float,
+    start_date: datetime,
+    end_date: datetime,
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    interpolation: Literal["nearest", "bilinear"] = "nearest",
+) -> dict:
+    """What the hourly temperatures are computed from, for the StageCache. ERA5 reanalysis for a location and hour
+    does not change, so the climate data is identified by those and how it is interpolated to the location alone.
+    """
+    return {
+        "lon": lon,
+        "lat": lat,
+        "start_date": start_date,
+        "end_date": end_date,
+        "emissivity_method": emissivity_method,
+        "interpolation": interpolation,
+    }
+
+
+def get_temperatures_between_dates(
+    climate_data_obj: CopernicusClimateData,
+    lon: float,
+    lat: float,
+    dates: pd.DatetimeIndex,
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    masked: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Hourly sky and surface temperatures in kelvin. Hours without valid temperatures raise
+    InsufficientClimateDataError unless `masked`, in which case the missing temperatures are NaN.
+    """
+    t_skies: Final[np.ndarray] = SkyTemperature(
+        surface_temperature_obj=climate_data_obj, lat=lat, lon=lon
+    ).get_sky_temperatures(dates=dates, formula=emissivity_method, masked=masked)
+    t_surfs: Final[np.ndarray] = climate_data_obj.get_values_from_dataset(
+        lat=lat, lon=lon, dataset_shortname="skt", dates=dates
+    )
+
+    if_missing: Final[np.ndarray] = np.isnan(t_skies) | np.isnan(t_surfs)
+    if np.any(if_missing):
+        if not masked:
             raise InsufficientClimateDataError(
-                "Neither t_surf or t_sky may be NaN", t_surf, t_sky
+                "Neither t_surf or t_sky may be NaN",
+                dates[if_missing][0],
             )
+        logger.debug(
+            "Masking %d of %d hours without valid climate data",
+            if_missing.sum(),
+            len(dates),
+        )
+    return t_skies, t_surfs
+
 
-        mpp_object = MaximumPowerPointTracker(
-            E_g=semiconductor_bandgap,
-            t_sky=t_sky,
-            t_cell=t_surf,
+def get_device_columns(devices: list[DeviceSpec]) -> list[tuple[str, str]]:
+    """(power output column, optimal voltage column) for each device. The first device's columns are the usual
+    unsuffixed ones, so that single-device outputs are unchanged; the others are suffixed with the device name.
+    """
+    if len({device.name for device in devices}) < len(devices):
+        raise ValueError("Device names must be unique", devices)
+    return [
+        (
+            f"average_power_watts_per_sqm{suffix}",
+            f"optimal_voltage{suffix}",
         )
-        power_output = mpp_object.max_power
-        optimal_voltage = mpp_object.optimal_voltage
-        print(
-            f"Produced {power_output} at optimal voltage of {mpp_object.optimal_voltage}"
+        for suffix in [""] + [f"_{device.name}" for device in devices[1:]]
+    ]
+
+
+def get_maximum_power_points(
+    t_skies: np.ndarray,
+    t_surfs: np.ndarray,
+    device: DeviceSpec = DEFAULT_DEVICE,
+    progress: ProgressReporter | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Power output (W m^-2) and optimal voltage (V) for each hour, NaN where either temperature is NaN.
+
+    All hours are solved at once by MaximumPowerPointTracker.solve_batch, at the temperatures rounded to 0.1 K as
+    MaximumPowerPointTracker rounds them.
+    """
+    power_outputs: Final[np.ndarray] = np.full(len(t_skies), np.nan)
+    optimal_voltages: Final[np.ndarray] = np.full(len(t_skies), np.nan)
+    if_valid: Final[np.ndarray] = ~(np.isnan(t_skies) | np.isnan(t_surfs))
+    if np.any(if_valid):
+        (
+            optimal_voltages[if_valid],
+            power_outputs[if_valid],
+        ) = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.round(t_skies[if_valid], 1),
+            t_cell=np.round(t_surfs[if_valid], 1),
+            E_g=device.E_g,
+            eta=device.eta,
+            voltage_bounds=device.voltage_bounds,
+            emissivity=device.emissivity,
         )
+    logger.debug(
+        "Solved %d hours for %s, with a mean power output of %sW m^-2",
+        if_valid.sum(),
+        device.name,
+        np.nanmean(power_outputs) if np.any(if_valid) else np.nan,
+    )
+    if progress is not None:
+        progress.add_hours(len(t_skies))
+    return power_outputs, optimal_voltages
 
-        power_output = power_output.value
-        if power_output > 0:
-            total_kwh += power_output / 1000
 
-        dt_data_dict[dt] = (
-            power_output,
-            optimal_voltage.value,
-            t_sky.value,
-            t_surf.value,
+def get_power_output_between_dates(
+    climate_data_obj: CopernicusClimateData | None,
+    lon: float,
+    lat: float,
+    start_date: datetime,
+    end_date: datetime,
+    emissivity_method: Literal["swinbank", "martin-berdahl"],
+    progress: ProgressReporter | None,
+    masked: bool = False,
+    max_gap_fill_hours: int = 0,
+    stage_cache: StageCache | None = None,
+    devices: list[DeviceSpec] | None = None,
+    interpolation: Literal["nearest", "bilinear"] = "nearest",
+    sensitivities: bool = False,
+) -> tuple[pd.DataFrame, float]:
+    """Hourly power output, optimal voltage and temperatures, and the total kWh of positive power output.
+
+    Results are written into columns preallocated for every hour of the period, so memory per hour is four floats
+    and the DataFrame wraps the columns without conversion.
+
+    InsufficientClimateDataError is raised on the first hour without valid temperatures unless `masked`, in which
+    case power output and optimal voltage are NaN for those hours and excluded from the total. With
+    `max_gap_fill_hours`, runs of up to that many missing hours are then filled, and marked in a gap_filled column.
+
+    With a `stage_cache`, the temperatures and the maximum power points are each reused if they were computed before
+    from the same inputs, so changing only the bandgap reuses the temperatures. `climate_data_obj` may then be None
+    if the temperatures are cached.
+
+    Each of `devices` (by default DEFAULT_DEVICE alone) is evaluated on the same temperatures, with columns named by
+    get_device_columns. The total is that of the first device.
+
+    `interpolation` must be that of `climate_data_obj`, and identifies its temperatures in the `stage_cache`.
+
+    If `sensitivities`, the derivatives of the first device's power output with respect to the sky and surface
+    temperatures and its bandgap are added as SENSITIVITY_COLUMNS (see get_power_output_sensitivities).
+    """
+    if climate_data_obj is not None and climate_data_obj.interpolation != interpolation:
+        raise ValueError(
+            "Climate data is interpolated differently",
+            climate_data_obj.interpolation,
+            interpolation,
+        )
+    dates: Final[pd.DatetimeIndex] = get_hourly_dates_between_period(
+        start_date=start_date, end_date=end_date
+    )
+    evaluated_devices: Final[list[DeviceSpec]] = devices or [DEFAULT_DEVICE]
+
+    def compute_temperatures() -> dict[str, np.ndarray]:
+        if climate_data_obj is None:
+            raise ValueError("Climate data is required when temperatures aren't cached")
+        t_skies, t_surfs = get_temperatures_between_dates(
+            climate_data_obj=climate_data_obj,
+            lon=lon,
+            lat=lat,
+            dates=dates,
+            emissivity_method=emissivity_method,
+            masked=masked,
+        )
+        return {"t_sky": t_skies, "t_surf": t_surfs}
+
+    temperatures: Final[dict[str, np.ndarray]] = (
+        compute_temperatures()
+        if stage_cache is None
+        else stage_cache.get_or_compute(
+            "temperatures",
+            compute=compute_temperatures,
+            **get_temperature_stage_inputs(
+                lon=lon,
+                lat=lat,
+                start_date=start_date,
+                end_date=end_date,
+                emissivity_method=emissivity_method,
+                interpolation=interpolation,
+            ),
+        )
+    )
+    if not masked and (
+        np.any(np.isnan(temperatures["t_sky"]))
+        or np.any(np.isnan(temperatures["t_surf"]))
+    ):
+        raise InsufficientClimateDataError("Neither t_surf or t_sky may be NaN")
+
+    device_columns: Final[list[tuple[str, str]]] = get_device_columns(evaluated_devices)
+    hourly_data: Final[np.ndarray] = np.empty(
+        (len(dates), len(HOURLY_COLUMNS) + 2 * (len(evaluated_devices) - 1))
+    )
+    hourly_data[:, 2] = temperatures["t_sky"]
+    hourly_data[:, 3] = temperatures["t_surf"]
+    if_solved: bool = False
+    for device_index, device in enumerate(evaluated_devices):
+        # Progress is reported for the hours of the first device only
+        device_progress: ProgressReporter | None = (
+            progress if device_index == 0 else None
         )
 
-        print(
-            f"For {dt}, surface temperature = {t_surf} and sky temperature = {t_sky}.\nPower output = {power_output}W"
+        def compute_maximum_power_points() -> dict[str, np.ndarray]:
+            nonlocal if_solved
+            if_solved = if_solved or device_progress is not None
+            power_outputs, optimal_voltages = get_maximum_power_points(
+                t_skies=temperatures["t_sky"],
+                t_surfs=temperatures["t_surf"],
+                device=device,
+                progress=device_progress,
+            )
+            return {
+                "power_output": power_outputs,
+                "optimal_voltage": optimal_voltages,
+            }
+
+        maximum_power_points: dict[str, np.ndarray] = (
+            compute_maximum_power_points()
+            if stage_cache is None
+            else stage_cache.get_or_compute(
+                "maximum_power_points",
+                compute=compute_maximum_power_points,
+                t_sky=temperatures["t_sky"],
+                t_surf=temperatures["t_surf"],
+                E_g=device.E_g,
+                eta=device.eta,
+                emissivity=device.emissivity,
+                voltage_bounds=device.voltage_bounds,
+            )
+        )
+        power_column_index, voltage_column_index = (
+            (0, 1)
+            if device_index == 0
+            else (2 + 2 * device_index, 3 + 2 * device_index)
         )
+        hourly_data[:, power_column_index] = maximum_power_points["power_output"]
+        hourly_data[:, voltage_column_index] = maximum_power_points["optimal_voltage"]
+    if not if_solved and progress is not None:
+        progress.add_hours(len(dates))
 
-    dt_power_df: Final[pd.DataFrame] = pd.DataFrame.from_dict(
-        data=dt_data_dict,
-        orient="index",
-        columns=["average_power_watts_per_sqm", "optimal_voltage", "t_sky", "t_surf"],
+    dt_power_df: pd.DataFrame = pd.DataFrame(
+        hourly_data,
+        index=dates,
+        columns=HOURLY_COLUMNS
+        + [column for columns in device_columns[1:] for column in columns],
     )
+    if masked and max_gap_fill_hours > 0:
+        dt_power_df = fill_short_gaps(
+            dt_power_df=dt_power_df,
+            max_gap_fill_hours=max_gap_fill_hours,
+            devices=evaluated_devices,
+        )
+    if sensitivities:
+        dt_power_df = dt_power_df.assign(
+            **get_power_output_sensitivities(
+                t_skies=dt_power_df["t_sky"].to_numpy(),
+                t_surfs=dt_power_df["t_surf"].to_numpy(),
+                device=evaluated_devices[0],
+            )
+        )
+
+    power_outputs: Final[np.ndarray] = dt_power_df[
+        "average_power_watts_per_sqm"
+    ].to_numpy()
+    total_kwh: Final[float] = float(np.sum(power_outputs[power_outputs > 0]) / 1000)
+    return dt_power_df, total_kwh
 
-    print(f"Saving to {output_dir}")
-    dt_power_df.to_csv(os.path.join(output_dir, "data_per_dt.csv"))
-    with open(os.path.join(output_dir, "json_data.json"), "w") as outfile:
-        json.dump({"total_kwh_per_square_m": total_kwh}, outfile)
 
-    print(
-        f"total kwh between {start_date} and {end_date + timedelta(hours=23)}: {total_kwh} kWh"
+def get_power_output_sensitivities(
+    t_skies: np.ndarray, t_surfs: np.ndarray, device: DeviceSpec = DEFAULT_DEVICE
+) -> dict[str, np.ndarray]:
+    """Derivatives of the device's maximum power output for each hour, by SENSITIVITY_COLUMNS, from a batched solve
+    (see MaximumPowerPointTracker.solve_batch). Hours where either temperature is NaN are NaN.
+
+    The saved power output and optimal voltage come from get_maximum_power_points, which may be reused from the
+    stage cache, so they stay the same whether or not sensitivities are saved. The derivatives are evaluated at the
+    same temperatures, rounded to 0.1 K, so at the same optimum.
+    """
+    if_valid: Final[np.ndarray] = ~(np.isnan(t_skies) | np.isnan(t_surfs))
+    _, _, derivatives = MaximumPowerPointTracker.solve_batch(
+        t_sky=np.round(t_skies[if_valid], 1),
+        t_cell=np.round(t_surfs[if_valid], 1),
+        E_g=device.E_g,
+        eta=device.eta,
+        voltage_bounds=device.voltage_bounds,
+        emissivity=device.emissivity,
+        if_sensitivities=True,
+    )
+    sensitivities: Final[dict[str, np.ndarray]] = dict()
+    for name, column in SENSITIVITY_COLUMNS.items():
+        sensitivities[column] = np.full(len(t_skies), np.nan)
+        sensitivities[column][if_valid] = derivatives[name]
+    return sensitivities
+
+
+def fill_short_gaps(
+    dt_power_df: pd.DataFrame,
+    max_gap_fill_hours: int,
+    devices: list[DeviceSpec] | None = None,
+) -> pd.DataFrame:
+    """Linearly interpolate sky and surface temperatures across runs of at most `max_gap_fill_hours` hours without
+    power output that have valid hours on both sides, and solve for power output at the interpolated temperatures.
+    Longer runs, and runs at either end of the window, are left as NaN."""
+    evaluated_devices: Final[list[DeviceSpec]] = devices or [DEFAULT_DEVICE]
+    if_missing: Final[pd.Series] = dt_power_df["average_power_watts_per_sqm"].isna()
+    run_lengths: Final[pd.Series] = if_missing.groupby(
+        (if_missing != if_missing.shift()).cumsum()
+    ).transform("size")
+    interpolated: Final[pd.DataFrame] = dt_power_df[["t_sky", "t_surf"]].interpolate(
+        limit_area="inside"
     )
+    if_filled: Final[pd.Series] = (
+        if_missing
+        & (run_lengths <= max_gap_fill_hours)
+        & interpolated.notna().all(axis=1)
+    )
+
+    filled_df: Final[pd.DataFrame] = dt_power_df.assign(gap_filled=if_filled)
+    filled_df.loc[if_filled, ["t_sky", "t_surf"]] = interpolated[if_filled]
+    for device, (power_column, voltage_column) in zip(
+        evaluated_devices, get_device_columns(evaluated_devices)
+    ):
+        power_outputs, optimal_voltages = get_maximum_power_points(
+            t_skies=interpolated.loc[if_filled, "t_sky"].to_numpy(),
+            t_surfs=interpolated.loc[if_filled, "t_surf"].to_numpy(),
+            device=device,
+        )
+        filled_df.loc[if_filled, power_column] = power_outputs
+        filled_df.loc[if_filled, voltage_column] = optimal_voltages
+    logger.debug("Filled %d of %d missing hours", if_filled.sum(), if_missing.sum())
+    return filled_df
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import os
+from typing import Any, Callable, Final
+
+import numpy as np
+
+from src.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_DIR: Final[str] = "data/cache/stages/"
+# Bump when the computation of any stage changes so that cached results are recomputed
+STAGE_CACHE_VERSION: Final[int] = 2
+
+
+class StageCache:
+    """Arrays produced by intermediate pipeline stages, stored as .npz files under `cache_dir`/<stage>/ and named by
+    a hash of the stage, its inputs and its parameters, so that a result is reused whenever, and only when,
+    everything it was computed from is unchanged. Arrays among the inputs are hashed by value.
+    """
+
+    def __init__(self, cache_dir: str = STAGE_CACHE_DIR):
+        self.cache_dir: Final[str] = cache_dir
+
+    @staticmethod
+    def get_key(stage: str, **inputs: Any) -> str:
+        key: Final = hashlib.sha256(f"{stage}:{STAGE_CACHE_VERSION}".encode())
+        for name, value in sorted(inputs.items()):
+            key.update(name.encode())
+            if isinstance(value, np.ndarray):
+                key.update(str(value.dtype).encode())
+                key.update(np.ascontiguousarray(value).tobytes())
+            else:
+                key.update(repr(value).encode())
+        return key.hexdigest()
+
+    def contains(self, stage: str, **inputs: Any) -> bool:
+        return os.path.isfile(self._get_filepath(stage, self.get_key(stage, **inputs)))
+
+    def get_or_compute(
+        self, stage: str, compute: Callable[[], dict[str, np.ndarray]], **inputs: Any
+    ) -> dict[str, np.ndarray]:
+        filepath: Final[str] = self._get_filepath(stage, self.get_key(stage, **inputs))
+        if os.path.isfile(filepath):
+            profiler.count(f"stage_cache.{stage}.hits")
+            with np.load(filepath) as cached:
+                return {name: cached[name] for name in cached.files}
+
+        profiler.count(f"stage_cache.{stage}.misses")
+        arrays: Final[dict[str, np.ndarray]] = compute()
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Written under a temporary name and renamed so that concurrent readers never see a partial file
+        temporary_filepath: Final[str] = f"{filepath}.{os.getpid()}.tmp.npz"
+        np.savez(temporary_filepath, **arrays)
+        os.replace(temporary_filepath, filepath)
+        logger.debug("Cached %s stage at %s", stage, filepath)
+        return arrays
+
+    def _get_filepath(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, stage, f"{key}.npz")
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import shutil
+from typing import Final, Literal
+
+import numpy as np
+import pandas as pd
+
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.device_spec import DEFAULT_DEVICE, DeviceSpec
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.sky_emissivity import (
+    MARTIN_BERDAHL_DIURNAL_COEFFICIENT,
+    MARTIN_BERDAHL_ELEVATION_COEFFICIENT,
+    MARTIN_BERDAHL_MONTHLY_COEFFICIENTS,
+    get_martin_berdahl_sky_emissivities,
+)
+from src.calculators.sky_temperature import SWINBANK_COEFFICIENT
+from src.exceptions import InsufficientClimateDataError
+
+logger = logging.getLogger(__name__)
+
+UNCERTAINTY_HOURLY_FILENAME: Final[str] = "uncertainty_per_dt.csv"
+UNCERTAINTY_FILENAME: Final[str] = "uncertainty.json"
+
+
+class UncertaintyModel:
+    """Draws `samples` sets of perturbed inputs and model parameters and propagates all of them through the sky
+    temperature and maximum power point models as single array computations.
+
+    Temperature errors are drawn once per sample and applied to every hour, since biases that persist across hours
+    dominate the uncertainty of a total. Coefficients are perturbed by a relative normal error, and the device's
+    non-radiative fraction eta by an absolute normal error clipped to [0, 0.99].
+    """
+
+    def __init__(
+        self,
+        samples: int = 100,
+        t_ambient_std_k: float = 0.5,
+        t_surface_std_k: float = 0.5,
+        coefficient_relative_std: float = 0.05,
+        eta_std: float = 0.01,
+        percentiles: tuple[float, ...] = (5, 50, 95),
+        chunk_size: int = 65536,
+        seed: int | None = 0,
+    ):
+        self.samples: Final[int] = samples
+        self.t_ambient_std_k: Final[float] = t_ambient_std_k
+        self.t_surface_std_k: Final[float] = t_surface_std_k
+        self.coefficient_relative_std: Final[float] = coefficient_relative_std
+        self.eta_std: Final[float] = eta_std
+        self.percentiles: Final[tuple[float, ...]] = percentiles
+        self.chunk_size: Final[int] = chunk_size
+        self.rng: Final[np.random.Generator] = np.random.default_rng(seed)
+
+    def get_power_output_samples(
+        self,
+        climate_data_obj: CopernicusClimateData,
+        lat: float,
+        lon: float,
+        dates: pd.DatetimeIndex,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        device: DeviceSpec = DEFAULT_DEVICE,
+        masked: bool = False,
+    ) -> np.ndarray:
+        """Power output in W m^-2 of the device with shape (samples, hours). Hours without valid climate data raise
+        InsufficientClimateDataError unless `masked`, in which case they are NaN."""
+        t_ambient: Final[np.ndarray] = climate_data_obj.get_values_from_dataset(
+            lat=lat, lon=lon, dataset_shortname="t2m", dates=dates
+        ) + self._draw_normal(scale=self.t_ambient_std_k)
+        t_surface: Final[np.ndarray] = climate_data_obj.get_values_from_dataset(
+            lat=lat, lon=lon, dataset_shortname="skt", dates=dates
+        ) + self._draw_normal(scale=self.t_surface_std_k)
+
+        t_sky: np.ndarray
+        match emissivity_method:
+            case "martin-berdahl":
+                emissivity: np.ndarray = get_martin_berdahl_sky_emissivities(
+                    t_dewpoint_monthly_average=climate_data_obj.get_average_values_from_dataset(
+                        dataset_shortname="d2m",
+                        lat=lat,
+                        lon=lon,
+                        dates=dates,
+                        period="month",
+                    )
+                    - 273.15,
+                    surface_pressure_mbar=climate_data_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="sp", dates=dates
+                    )
+                    / 100,
+                    hours=np.asarray(dates.hour),
+                    cloud_base_height_m=climate_data_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="cbh", dates=dates
+                    ),
+                    total_cloud_cover=climate_data_obj.get_values_from_dataset(
+                        lat=lat, lon=lon, dataset_shortname="tcc", dates=dates
+                    ),
+                    monthly_coefficients=tuple(
+                        self._draw_coefficient(coefficient)
+                        for coefficient in MARTIN_BERDAHL_MONTHLY_COEFFICIENTS
+                    ),
+                    diurnal_coefficient=self._draw_coefficient(
+                        MARTIN_BERDAHL_DIURNAL_COEFFICIENT
+                    ),
+                    elevation_coefficient=self._draw_coefficient(
+                        MARTIN_BERDAHL_ELEVATION_COEFFICIENT
+                    ),
+                    masked=masked,
+                )
+                t_sky = emissivity**0.25 * t_ambient
+            case "swinbank":
+                t_sky = self._draw_coefficient(SWINBANK_COEFFICIENT) * t_ambient**1.5
+            case _:
+                raise ValueError(
+                    "Formula not in defined formulae for sky temperature",
+                    emissivity_method,
+                )
+        if_valid: Final[np.ndarray] = ~np.any(
+            np.isnan(t_sky) | np.isnan(t_surface), axis=0
+        )
+        if not masked and not np.all(if_valid):
+            raise InsufficientClimateDataError("Neither t_surf or t_sky may be NaN")
+
+        eta: Final[np.ndarray] = np.clip(
+            device.eta + self._draw_normal(scale=self.eta_std), 0.0, 0.99
+        )
+        power_output_samples: Final[np.ndarray] = np.full(t_sky.shape, np.nan)
+        if not np.any(if_valid):
+            return power_output_samples
+        power_output_samples[:, if_valid] = self._solve(
+            t_sky=np.broadcast_to(t_sky, power_output_samples.shape)[:, if_valid],
+            t_cell=np.broadcast_to(t_surface, power_output_samples.shape)[:, if_valid],
+            eta=np.broadcast_to(eta, power_output_samples.shape)[:, if_valid],
+            device=device,
+        )
+        return power_output_samples
+
+    def get_hourly_percentiles(
+        self, power_output_samples: np.ndarray, dates: pd.DatetimeIndex
+    ) -> pd.DataFrame:
+        return pd.DataFrame(
+            np.percentile(power_output_samples, self.percentiles, axis=0).T,
+            index=dates,
+            columns=[
+                f"average_power_watts_per_sqm_p{percentile:g}"
+                for percentile in self.percentiles
+            ],
+        )
+
+    def _draw_normal(self, scale: float) -> np.ndarray:
+        return self.rng.normal(scale=scale, size=(self.samples, 1))
+
+    def _draw_coefficient(self, coefficient: float) -> np.ndarray:
+        return coefficient * (
+            1 + self._draw_normal(scale=self.coefficient_relative_std)
+        )
+
+    def _solve(
+        self, t_sky: np.ndarray, t_cell: np.ndarray, eta: np.ndarray, device: DeviceSpec
+    ) -> np.ndarray:
+        """solve_batch over the flattened samples in chunks, bounding the memory of its intermediate arrays"""
+        max_power: Final[np.ndarray] = np.empty(t_sky.size)
+        t_sky_flat, t_cell_flat, eta_flat = (
+            t_sky.ravel(),
+            np.ravel(t_cell),
+            np.ravel(eta),
+        )
+        for start in range(0, t_sky.size, self.chunk_size):
+            stop: int = start + self.chunk_size
+            max_power[start:stop] = MaximumPowerPointTracker.solve_batch(
+                t_sky=t_sky_flat[start:stop],
+                t_cell=t_cell_flat[start:stop],
+                E_g=device.E_g,
+                eta=eta_flat[start:stop],
+                voltage_bounds=device.voltage_bounds,
+                emissivity=device.emissivity,
+            )[1]
+        return max_power.reshape(t_sky.shape)
+
+
+class UncertaintyWriter:
+    """Writes hourly power output percentiles to uncertainty_per_dt.csv and percentiles of the total kWh to
+    uncertainty.json in `output_dir`, as month windows are appended. Per-sample totals are accumulated across windows
+    before taking percentiles, so the bands of the total are those of whole-period totals. They are saved with the
+    percentiles, so that an output can be extended from `previous_output_dir`, as PowerOutputWriter does.
+    """
+
+    def __init__(
+        self,
+        uncertainty_model: UncertaintyModel,
+        output_dir: str,
+        previous_output_dir: str | None = None,
+        if_save_hourly: bool = True,
+    ):
+        self.uncertainty_model: Final[UncertaintyModel] = uncertainty_model
+        self.if_save_hourly: Final[bool] = if_save_hourly
+        self.hourly_filepath: Final[str] = os.path.join(
+            output_dir, UNCERTAINTY_HOURLY_FILENAME
+        )
+        self.json_filepath: Final[str] = os.path.join(output_dir, UNCERTAINTY_FILENAME)
+        self.total_kwh_samples: Final[np.ndarray] = np.zeros(uncertainty_model.samples)
+        self._if_new_file: bool = True
+
+        if os.path.isfile(self.json_filepath):
+            os.remove(self.json_filepath)
+        if previous_output_dir is not None:
+            with open(
+                os.path.join(previous_output_dir, UNCERTAINTY_FILENAME)
+            ) as infile:
+                self.total_kwh_samples[:] = json.load(infile)[
+                    "total_kwh_per_square_m_samples"
+                ]
+            previous_hourly_filepath: Final[str] = os.path.join(
+                previous_output_dir, UNCERTAINTY_HOURLY_FILENAME
+            )
+            if if_save_hourly and os.path.isfile(previous_hourly_filepath):
+                shutil.copyfile(previous_hourly_filepath, self.hourly_filepath)
+                self._if_new_file = False
+
+    def append(self, power_output_samples: np.ndarray, dates: pd.DatetimeIndex) -> None:
+        self.total_kwh_samples += (
+            np.sum(np.where(power_output_samples > 0, power_output_samples, 0), axis=1)
+            / 1000
+        )
+        if self.if_save_hourly:
+            self.uncertainty_model.get_hourly_percentiles(
+                power_output_samples=power_output_samples, dates=dates
+            ).to_csv(
+                self.hourly_filepath,
+                mode="w" if self._if_new_file else "a",
+                header=self._if_new_file,
+            )
+            self._if_new_file = False
+
+    def close(self) -> dict[str, float]:
+        total_kwh_percentiles: Final[dict[str, float]] = {
+            f"p{percentile:g}": value
+            for percentile, value in zip(
+                self.uncertainty_model.percentiles,
+                np.percentile(
+                    self.total_kwh_samples, self.uncertainty_model.percentiles
+                ).tolist(),
+            )
+        }
+        with open(self.json_filepath, "w") as outfile:
+            json.dump(
+                {
+                    "samples": self.uncertainty_model.samples,
+                    "total_kwh_per_square_m_percentiles": total_kwh_percentiles,
+                    "total_kwh_per_square_m_samples": self.total_kwh_samples.tolist(),
+                },
+                outfile,
+            )
+        logger.info("Total kWh percentiles: %s", total_kwh_percentiles)
+        return total_kwh_percentiles
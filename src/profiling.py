@@ -0,0 +1,195 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Final, Iterator, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class _StageStatistics:
+    __slots__ = ("calls", "wall_time", "self_time", "peak_memory")
+
+    def __init__(self):
+        self.calls: int = 0
+        self.wall_time: float = 0.0
+        self.self_time: float = 0.0
+        self.peak_memory: int = 0
+
+
+class _OpenStage:
+    __slots__ = ("path", "start_time", "child_time", "start_memory", "peak_memory")
+
+    def __init__(self, path: tuple[str, ...], start_memory: int):
+        self.path: Final[tuple[str, ...]] = path
+        self.start_time: Final[float] = time.perf_counter()
+        self.child_time: float = 0.0
+        self.start_memory: Final[int] = start_memory
+        self.peak_memory: int = start_memory
+
+
+class StageProfiler:
+    """Wall time, call counts and peak traced memory per pipeline stage.
+
+    Disabled by default, in which case instrumented code pays only an attribute lookup. Stages may nest; the
+    report contains per-stage totals and a folded-stack file that flamegraph.pl and speedscope can read.
+
+    Each thread nests its stages on its own stack, so stages of PowerOutputPipeline's threads are reported as
+    separate roots. tracemalloc's peak is process-wide, so with several threads peak memory of a stage includes
+    allocations made concurrently by the other threads.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.counters: defaultdict[str, int] = defaultdict(int)
+        self._statistics: defaultdict[tuple[str, ...], _StageStatistics] = defaultdict(
+            _StageStatistics
+        )
+        self._lock: Final[threading.Lock] = threading.Lock()
+        self._local: Final[threading.local] = threading.local()
+        self._start_time: float = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._start_time = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def count(self, counter_name: str, amount: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[counter_name] += amount
+
+    @contextmanager
+    def stage(self, stage_name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        stack: Final[list[_OpenStage]] = self._get_stack()
+        self._update_parent_peak_memory(stack)
+        parent_path: Final[tuple[str, ...]] = stack[-1].path if stack else tuple()
+        open_stage: Final[_OpenStage] = _OpenStage(
+            path=(*parent_path, stage_name),
+            start_memory=tracemalloc.get_traced_memory()[0],
+        )
+        stack.append(open_stage)
+        try:
+            yield
+        finally:
+            self._update_parent_peak_memory(stack)
+            stack.pop()
+
+            wall_time: Final[float] = time.perf_counter() - open_stage.start_time
+            with self._lock:
+                statistics: Final[_StageStatistics] = self._statistics[open_stage.path]
+                statistics.calls += 1
+                statistics.wall_time += wall_time
+                statistics.self_time += wall_time - open_stage.child_time
+                statistics.peak_memory = max(
+                    statistics.peak_memory,
+                    open_stage.peak_memory - open_stage.start_memory,
+                )
+
+            if stack:
+                stack[-1].child_time += wall_time
+                stack[-1].peak_memory = max(
+                    stack[-1].peak_memory, open_stage.peak_memory
+                )
+
+    def get_report(self) -> dict[str, Any]:
+        stages: dict[str, dict[str, float | int]] = dict()
+        with self._lock:
+            statistics_items: Final[list] = list(self._statistics.items())
+        for path, statistics in statistics_items:
+            stage_report = stages.setdefault(
+                path[-1],
+                {
+                    "calls": 0,
+                    "wall_time_seconds": 0.0,
+                    "self_time_seconds": 0.0,
+                    "peak_memory_bytes": 0,
+                },
+            )
+            stage_report["calls"] += statistics.calls
+            stage_report["self_time_seconds"] += statistics.self_time
+            stage_report["peak_memory_bytes"] = max(
+                stage_report["peak_memory_bytes"], statistics.peak_memory
+            )
+            if path[-1] not in path[:-1]:  # recursive stages would be counted twice
+                stage_report["wall_time_seconds"] += statistics.wall_time
+
+        with self._lock:
+            counters: Final[dict[str, int]] = dict(self.counters)
+        cache_hits: Final[int] = counters.get(
+            "maximum_power_point_tracker.cache_hits", 0
+        )
+        cache_lookups: Final[int] = cache_hits + counters.get(
+            "maximum_power_point_tracker.cache_misses", 0
+        )
+        return {
+            "total_wall_time_seconds": time.perf_counter() - self._start_time,
+            "stages": stages,
+            "counters": counters,
+            "maximum_power_point_tracker_cache_hit_rate": (
+                cache_hits / cache_lookups if cache_lookups else None
+            ),
+        }
+
+    def get_folded_stacks(self) -> list[str]:
+        """Brendan Gregg's folded stack format, weighted by self time in microseconds"""
+        with self._lock:
+            statistics_items: Final[list] = sorted(self._statistics.items())
+        return [
+            f"{';'.join(path)} {round(statistics.self_time * 1e6)}"
+            for path, statistics in statistics_items
+        ]
+
+    def save_report(self, output_dir: str) -> None:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp: Final[str] = time.strftime("%Y%m%d-%H%M%S")
+        with open(os.path.join(output_dir, f"profile_{timestamp}.json"), "w") as f:
+            json.dump(self.get_report(), f, indent=2)
+        with open(os.path.join(output_dir, f"profile_{timestamp}.folded"), "w") as f:
+            f.write("\n".join(self.get_folded_stacks()) + "\n")
+
+    def _get_stack(self) -> list[_OpenStage]:
+        """Open stages of the calling thread"""
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @staticmethod
+    def _update_parent_peak_memory(stack: list[_OpenStage]) -> None:
+        """tracemalloc holds a single peak, so fold it into the open stage before it is reset"""
+        if stack:
+            stack[-1].peak_memory = max(
+                stack[-1].peak_memory, tracemalloc.get_traced_memory()[1]
+            )
+        tracemalloc.reset_peak()
+
+
+profiler: Final[StageProfiler] = StageProfiler()
+
+
+def profiled(stage_name: str) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,589 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Final, Iterator, Literal
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.coordinates_for_assessment import (
+    CLIMATE_DATA_TILE_DEGREES,
+    get_climate_data_tile,
+)
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.sky_temperature import SkyTemperature
+from src.dates import get_month_windows_between_period
+from src.exceptions import InsufficientClimateDataError
+from src.plots.processed_data_loader import ResultsIndex, SpatialResultsIndex
+from src.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BANDGAP_EV: Final[float] = 0.17
+OUTPUT_COLUMNS: Final[list[str]] = [
+    "average_power_watts_per_sqm",
+    "optimal_voltage",
+    "t_sky",
+    "t_surf",
+]
+
+
+class _CachedClimateData:
+    __slots__ = ("loaded", "climate_data_obj", "error", "checkouts", "if_evicted")
+
+    def __init__(self):
+        self.loaded: Final[threading.Event] = threading.Event()
+        self.climate_data_obj: CopernicusClimateData | None = None
+        self.error: BaseException | None = None
+        self.checkouts: int = 0
+        self.if_evicted: bool = False
+
+
+class ClimateDataCache:
+    """Keeps the most recently used CopernicusClimateData, one per climate data tile and month, open in memory.
+
+    A tile and month is downloaded and loaded by the first request for it, outside the cache's lock: concurrent
+    requests for the same tile and month wait for that load, while requests for other tiles go ahead. Climate data
+    is checked out for the duration of a request, and evicted climate data is closed once no request holds it.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries: Final[int] = max_entries
+        self._entries: OrderedDict[
+            tuple[int, int, int, int], _CachedClimateData
+        ] = OrderedDict()
+        self._lock: Final[threading.Lock] = threading.Lock()
+
+    @contextmanager
+    def checkout(
+        self, lat: float, lon: float, year: int, month: int
+    ) -> Iterator[CopernicusClimateData]:
+        key: Final[tuple[int, int, int, int]] = (
+            *self.get_tile(lat=lat, lon=lon),
+            year,
+            month,
+        )
+        with self._lock:
+            cached: _CachedClimateData | None = self._entries.get(key)
+            if_loader: Final[bool] = cached is None
+            if cached is None:
+                profiler.count("power_service.climate_data_cache_misses")
+                cached = _CachedClimateData()
+                self._entries[key] = cached
+            else:
+                profiler.count("power_service.climate_data_cache_hits")
+                self._entries.move_to_end(key)
+            cached.checkouts += 1
+
+        try:
+            if if_loader:
+                self._load(key=key, cached=cached)
+            cached.loaded.wait()
+            if cached.error is not None:
+                # Every request waiting on the failed load gets its error, as with concurrent.futures
+                raise cached.error
+            yield cached.climate_data_obj
+        finally:
+            with self._lock:
+                cached.checkouts -= 1
+                if_close: bool = cached.if_evicted and cached.checkouts == 0
+            if if_close and cached.climate_data_obj is not None:
+                cached.climate_data_obj.close()
+
+    @staticmethod
+    def get_tile(lat: float, lon: float) -> tuple[int, int]:
+        """Climate data tile containing the point (see get_climate_data_tile)"""
+        return get_climate_data_tile(lat=lat, lon=lon)
+
+    def _load(self, key: tuple[int, int, int, int], cached: _CachedClimateData) -> None:
+        try:
+            # Requested at the tile's centre, so that its climate data is that of the tile whichever point was
+            # requested first
+            cached.climate_data_obj = CopernicusClimateData(
+                if_load_entire_earth=False,
+                lon=(key[1] + 0.5) * CLIMATE_DATA_TILE_DEGREES,
+                lat=(key[0] + 0.5) * CLIMATE_DATA_TILE_DEGREES,
+                year=key[2],
+                months=[key[3]],
+            )
+        except Exception as e:
+            cached.error = e
+            # Forgotten so that a later request retries the download
+            with self._lock:
+                if self._entries.get(key) is cached:
+                    del self._entries[key]
+            return
+        finally:
+            cached.loaded.set()
+
+        evicted_climate_data_objs: Final[list[CopernicusClimateData]] = []
+        with self._lock:
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.if_evicted = True
+                if evicted.checkouts == 0 and evicted.climate_data_obj is not None:
+                    evicted_climate_data_objs.append(evicted.climate_data_obj)
+        for climate_data_obj in evicted_climate_data_objs:
+            climate_data_obj.close()
+
+
+class _PendingSolve:
+    __slots__ = ("keys", "done", "results")
+
+    def __init__(self, keys: list[tuple[float, float, float]]):
+        self.keys: Final[list[tuple[float, float, float]]] = keys
+        self.done: Final[threading.Event] = threading.Event()
+        self.results: dict[
+            tuple[float, float, float], tuple[float, float]
+        ] | None = None
+
+
+class BatchingSolver:
+    """Solves maximum power points for concurrent requests together.
+
+    Requests arriving within `batch_window_seconds` of each other are merged, and the (E_g, t_sky, t_cell) points
+    that are not yet cached are solved with a single MaximumPowerPointTracker.solve_batch call. Temperatures are
+    rounded to 0.1 K as in MaximumPowerPointTracker, so the cache is shared between sites with similar climates.
+    The cache keeps the `max_entries` most recently used points.
+    """
+
+    def __init__(
+        self, batch_window_seconds: float = 0.005, max_entries: int = 1_000_000
+    ):
+        self.batch_window_seconds: Final[float] = batch_window_seconds
+        self.max_entries: Final[int] = max_entries
+        # Only used by the worker thread
+        self.cache: Final[
+            OrderedDict[tuple[float, float, float], tuple[float, float]]
+        ] = OrderedDict()
+        self._pending: Final[queue.Queue[_PendingSolve]] = queue.Queue()
+        self._worker: Final[threading.Thread] = threading.Thread(
+            target=self._run, name="power_service_solver", daemon=True
+        )
+        self._worker.start()
+
+    def solve(
+        self, t_sky: np.ndarray, t_cell: np.ndarray, E_g: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(optimal voltage, max power) for each hour"""
+        keys: Final[list[tuple[float, float, float]]] = list(
+            zip(
+                [E_g] * len(t_sky),
+                np.round(t_sky, 1).tolist(),
+                np.round(t_cell, 1).tolist(),
+            )
+        )
+        pending_solve: Final[_PendingSolve] = _PendingSolve(keys=keys)
+        self._pending.put(pending_solve)
+        pending_solve.done.wait()
+        if pending_solve.results is None:
+            raise RuntimeError("Batched maximum power point solve failed")
+
+        solutions: Final[np.ndarray] = np.array(
+            [pending_solve.results[key] for key in keys], dtype=float
+        ).reshape((len(keys), 2))
+        return solutions[:, 0], solutions[:, 1]
+
+    def _run(self) -> None:
+        while True:
+            batch: list[_PendingSolve] = [self._pending.get()]
+            deadline: float = time.monotonic() + self.batch_window_seconds
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                # Solutions are collected before the cache is trimmed, so a batch larger than the cache is answered
+                solutions: dict[
+                    tuple[float, float, float], tuple[float, float]
+                ] = self._solve(
+                    keys={key for pending_solve in batch for key in pending_solve.keys}
+                )
+                for pending_solve in batch:
+                    pending_solve.results = {
+                        key: solutions[key] for key in pending_solve.keys
+                    }
+            except Exception:
+                logger.exception("Batched maximum power point solve failed")
+            finally:
+                for pending_solve in batch:
+                    pending_solve.done.set()
+
+    def _solve(
+        self, keys: set[tuple[float, float, float]]
+    ) -> dict[tuple[float, float, float], tuple[float, float]]:
+        solutions: Final[dict[tuple[float, float, float], tuple[float, float]]] = {
+            key: self.cache[key] for key in keys if key in self.cache
+        }
+        for key in solutions:
+            self.cache.move_to_end(key)
+        uncached_keys: Final[list[tuple[float, float, float]]] = [
+            key for key in keys if key not in solutions
+        ]
+        profiler.count("maximum_power_point_tracker.cache_hits", len(solutions))
+        profiler.count("maximum_power_point_tracker.cache_misses", len(uncached_keys))
+        if uncached_keys:
+            E_g, t_sky, t_cell = np.array(uncached_keys, dtype=float).T
+            optimal_voltages, max_powers = MaximumPowerPointTracker.solve_batch(
+                t_sky=t_sky, t_cell=t_cell, E_g=E_g
+            )
+            solved: dict[tuple[float, float, float], tuple[float, float]] = dict(
+                zip(uncached_keys, zip(optimal_voltages.tolist(), max_powers.tolist()))
+            )
+            solutions.update(solved)
+            self.cache.update(solved)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return solutions
+
+
+class PowerQueryService:
+    """Answers power output queries for arbitrary sites from warm climate data and maximum power point caches, and
+    finds the processed results nearest to them"""
+
+    def __init__(
+        self,
+        climate_data_cache: ClimateDataCache | None = None,
+        solver: BatchingSolver | None = None,
+        results_index: ResultsIndex | None = None,
+    ):
+        self.climate_data_cache: Final[ClimateDataCache] = (
+            climate_data_cache if climate_data_cache is not None else ClimateDataCache()
+        )
+        self.solver: Final[BatchingSolver] = (
+            solver if solver is not None else BatchingSolver()
+        )
+        self.results_index: Final[ResultsIndex] = (
+            results_index if results_index is not None else ResultsIndex()
+        )
+        # The results index and spatial index files are updated by one request at a time
+        self._results_lock: Final[threading.Lock] = threading.Lock()
+
+    def get_nearest_results(
+        self,
+        lat: float,
+        lon: float,
+        start_date: datetime,
+        end_date: datetime,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        n: int = 1,
+    ) -> pd.DataFrame:
+        """ResultsIndex entries of the `n` processed locations nearest to (lat, lon), nearest first, with their
+        distance_km (see SpatialResultsIndex)"""
+        with self._results_lock:
+            self.results_index.update()
+            return SpatialResultsIndex(
+                results_index=self.results_index,
+                emissivity_method=emissivity_method,
+                start_date=start_date,
+                end_date=end_date,
+            ).get_nearest(lat=lat, lon=lon, n=n)
+
+    def get_power_output(
+        self,
+        lat: float,
+        lon: float,
+        start_date: datetime,
+        end_date: datetime,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        E_g: float = DEFAULT_BANDGAP_EV,
+    ) -> tuple[pd.DataFrame, float]:
+        """Hourly output with the columns written by save_power_output_between_dates, and the total kWh of positive
+        power output"""
+        window_dfs: list[pd.DataFrame] = []
+        for window_start_date, window_end_date in get_month_windows_between_period(
+            start_date=start_date, end_date=end_date
+        ):
+            with self.climate_data_cache.checkout(
+                lat=lat,
+                lon=lon,
+                year=window_start_date.year,
+                month=window_start_date.month,
+            ) as climate_data_obj:
+                dates: pd.DatetimeIndex = pd.date_range(
+                    window_start_date,
+                    window_end_date.replace(hour=23),
+                    freq="h",
+                )
+                t_surf: np.ndarray = climate_data_obj.get_values_from_dataset(
+                    lat=lat, lon=lon, dataset_shortname="skt", dates=dates
+                )
+                t_sky: np.ndarray = SkyTemperature(
+                    surface_temperature_obj=climate_data_obj, lat=lat, lon=lon
+                ).get_sky_temperatures(dates=dates, formula=emissivity_method)
+                if np.any(np.isnan(t_surf)) or np.any(np.isnan(t_sky)):
+                    raise InsufficientClimateDataError(
+                        "Neither t_surf or t_sky may be NaN"
+                    )
+
+            # Solved after checking the climate data back in, so that it can be closed if evicted meanwhile
+            optimal_voltage, power_output = self.solver.solve(
+                t_sky=t_sky, t_cell=t_surf, E_g=E_g
+            )
+            window_dfs.append(
+                pd.DataFrame(
+                    data={
+                        "average_power_watts_per_sqm": power_output,
+                        "optimal_voltage": optimal_voltage,
+                        "t_sky": t_sky,
+                        "t_surf": t_surf,
+                    },
+                    index=dates,
+                )
+            )
+
+        dt_power_df: Final[pd.DataFrame] = pd.concat(window_dfs)
+        power_output_watts: Final[np.ndarray] = dt_power_df[
+            "average_power_watts_per_sqm"
+        ].to_numpy()
+        total_kwh: Final[float] = float(
+            np.sum(power_output_watts[power_output_watts > 0]) / 1000
+        )
+        return dt_power_df, total_kwh
+
+
+class _QueryError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status: Final[HTTPStatus] = status
+
+
+def _get_parameter(
+    query: dict[str, list[str]], name: str, default: str | None = None
+) -> str:
+    values: Final[list[str] | None] = query.get(name)
+    if values:
+        return values[0]
+    if default is None:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, f"Missing parameter: {name}")
+    return default
+
+
+def _parse_site_query(
+    query: dict[str, list[str]]
+) -> tuple[float, float, datetime, datetime, Literal["swinbank", "martin-berdahl"]]:
+    try:
+        lat: Final[float] = float(_get_parameter(query, "lat"))
+        lon: Final[float] = float(_get_parameter(query, "lon"))
+        start_date: Final[datetime] = datetime.fromisoformat(
+            _get_parameter(query, "start")
+        )
+        end_date: Final[datetime] = datetime.fromisoformat(_get_parameter(query, "end"))
+    except ValueError as e:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, str(e)) from e
+
+    emissivity_method: Final[str] = _get_parameter(query, "method", "martin-berdahl")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise _QueryError(HTTPStatus.BAD_REQUEST, "lat or lon out of range")
+    if end_date < start_date:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, "end must not precede start")
+    if emissivity_method not in {"swinbank", "martin-berdahl"}:
+        raise _QueryError(
+            HTTPStatus.BAD_REQUEST, f"Unknown method: {emissivity_method}"
+        )
+    return lat, lon, start_date, end_date, emissivity_method  # type: ignore[return-value]
+
+
+def _parse_query(
+    query: dict[str, list[str]]
+) -> tuple[
+    float, float, datetime, datetime, Literal["swinbank", "martin-berdahl"], float, str
+]:
+    lat, lon, start_date, end_date, emissivity_method = _parse_site_query(query)
+    try:
+        E_g: Final[float] = float(_get_parameter(query, "eg", str(DEFAULT_BANDGAP_EV)))
+    except ValueError as e:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, str(e)) from e
+
+    response_format: Final[str] = _get_parameter(query, "format", "json")
+    if not 0 < E_g:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, "eg must be positive")
+    if response_format not in {"json", "arrow"}:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, f"Unknown format: {response_format}")
+    return lat, lon, start_date, end_date, emissivity_method, E_g, response_format
+
+
+def _parse_sites_query(
+    query: dict[str, list[str]]
+) -> tuple[
+    float, float, datetime, datetime, Literal["swinbank", "martin-berdahl"], int
+]:
+    lat, lon, start_date, end_date, emissivity_method = _parse_site_query(query)
+    try:
+        n: Final[int] = int(_get_parameter(query, "n", "1"))
+    except ValueError as e:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, str(e)) from e
+    if not 0 < n:
+        raise _QueryError(HTTPStatus.BAD_REQUEST, "n must be positive")
+    return lat, lon, start_date, end_date, emissivity_method, n
+
+
+def _get_arrow_body(dt_power_df: pd.DataFrame, metadata: dict[str, str]) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise _QueryError(
+            HTTPStatus.NOT_IMPLEMENTED, "Arrow output requires pyarrow"
+        ) from e
+
+    table = pa.Table.from_pandas(
+        dt_power_df.rename_axis("datetime").reset_index(), preserve_index=False
+    ).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def create_request_handler(
+    service: PowerQueryService,
+) -> type[BaseHTTPRequestHandler]:
+    class PowerRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/sites":
+                self._send_nearest_results(parse_qs(url.query))
+                return
+            if url.path != "/power":
+                self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path: {url.path}")
+                return
+
+            try:
+                (
+                    lat,
+                    lon,
+                    start_date,
+                    end_date,
+                    emissivity_method,
+                    E_g,
+                    response_format,
+                ) = _parse_query(parse_qs(url.query))
+                dt_power_df, total_kwh = service.get_power_output(
+                    lat=lat,
+                    lon=lon,
+                    start_date=start_date,
+                    end_date=end_date,
+                    emissivity_method=emissivity_method,
+                    E_g=E_g,
+                )
+                metadata: dict[str, str] = {
+                    "lat": str(lat),
+                    "lon": str(lon),
+                    "method": emissivity_method,
+                    "E_g": str(E_g),
+                    "total_kwh_per_square_m": str(total_kwh),
+                }
+                if response_format == "arrow":
+                    self._send(
+                        HTTPStatus.OK,
+                        "application/vnd.apache.arrow.stream",
+                        _get_arrow_body(dt_power_df=dt_power_df, metadata=metadata),
+                    )
+                    return
+
+                body: dict = {
+                    "lat": lat,
+                    "lon": lon,
+                    "start": start_date.isoformat(),
+                    "end": end_date.isoformat(),
+                    "method": emissivity_method,
+                    "E_g": E_g,
+                    "total_kwh_per_square_m": total_kwh,
+                    "hourly": {
+                        "datetime": [dt.isoformat() for dt in dt_power_df.index],
+                        **{
+                            column: dt_power_df[column].tolist()
+                            for column in OUTPUT_COLUMNS
+                        },
+                    },
+                }
+                self._send(HTTPStatus.OK, "application/json", json.dumps(body).encode())
+            except _QueryError as e:
+                self._send_error(e.status, str(e))
+            except InsufficientClimateDataError as e:
+                self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+            except Exception:
+                logger.exception("Failed to answer %s", self.path)
+                self._send_error(
+                    HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error"
+                )
+
+        def _send_nearest_results(self, query: dict[str, list[str]]) -> None:
+            try:
+                (
+                    lat,
+                    lon,
+                    start_date,
+                    end_date,
+                    emissivity_method,
+                    n,
+                ) = _parse_sites_query(query)
+                nearest_results: pd.DataFrame = service.get_nearest_results(
+                    lat=lat,
+                    lon=lon,
+                    start_date=start_date,
+                    end_date=end_date,
+                    emissivity_method=emissivity_method,
+                    n=n,
+                )
+                body: dict = {
+                    "lat": lat,
+                    "lon": lon,
+                    "start": start_date.isoformat(),
+                    "end": end_date.isoformat(),
+                    "method": emissivity_method,
+                    "sites": nearest_results[
+                        ["lat", "lon", "total_kwh_per_square_m", "distance_km"]
+                    ].to_dict(orient="records"),
+                }
+                self._send(HTTPStatus.OK, "application/json", json.dumps(body).encode())
+            except _QueryError as e:
+                self._send_error(e.status, str(e))
+            except Exception:
+                logger.exception("Failed to answer %s", self.path)
+                self._send_error(
+                    HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error"
+                )
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(format, *args)
+
+        def _send(self, status: HTTPStatus, content_type: str, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: HTTPStatus, message: str) -> None:
+            self._send(
+                status, "application/json", json.dumps({"error": message}).encode()
+            )
+
+    return PowerRequestHandler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000) -> None:
+    """Serve `GET /power?lat=&lon=&start=&end=&method=&eg=&format=json|arrow`, and the processed results nearest to a
+    site at `GET /sites?lat=&lon=&start=&end=&method=&n=`, until interrupted"""
+    server: Final[ThreadingHTTPServer] = ThreadingHTTPServer(
+        (host, port), create_request_handler(service=PowerQueryService())
+    )
+    logger.info("Serving power output queries on http://%s:%d/power", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping power output service")
+    finally:
+        server.server_close()
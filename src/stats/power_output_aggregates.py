@@ -0,0 +1,148 @@
+import os
+from typing import Final
+
+import numpy as np
+import pandas as pd
+
+AGGREGATES_FILENAME: Final[str] = "aggregates.csv"
+# Hours of day 0-23 take groups 0-23 and months 1-12 groups 24-35, as in SummaryStatistics.get_summary_statistics
+GROUP_QUANTITY: Final[int] = 24 + 12
+AGGREGATE_COLUMNS: Final[list[str]] = [
+    "period",
+    "value",
+    "count",
+    "mean",
+    "m2",
+    "min",
+    "max",
+    "positive_hours",
+    "total_kwh",
+]
+
+
+class PowerOutputAggregates:
+    """Hour of day and month aggregates of power output, updated as hourly results are computed so that statistics
+    don't need the hourly data to be kept.
+
+    Like SummaryStatistics, count, mean, variance, min and max are of non-negative power output. Mean and variance
+    are accumulated with Welford's algorithm, generalised to merging a whole batch of hours at once (Chan et al.), so
+    that they stay accurate over many years of hours. positive_hours and total_kwh count only positive power output,
+    as the total in json_data.json does. Hours with NaN power output are ignored.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "positive_hours", "total_kwh")
+
+    def __init__(self):
+        self.count: np.ndarray = np.zeros(GROUP_QUANTITY, dtype=np.int64)
+        self.mean: np.ndarray = np.zeros(GROUP_QUANTITY)
+        self.m2: np.ndarray = np.zeros(GROUP_QUANTITY)
+        self.min: np.ndarray = np.full(GROUP_QUANTITY, np.inf)
+        self.max: np.ndarray = np.full(GROUP_QUANTITY, -np.inf)
+        self.positive_hours: np.ndarray = np.zeros(GROUP_QUANTITY, dtype=np.int64)
+        self.total_kwh: np.ndarray = np.zeros(GROUP_QUANTITY)
+
+    def update(self, dates: pd.DatetimeIndex, power: np.ndarray) -> None:
+        """Add hourly power outputs (W m^-2) at `dates`"""
+        group_codes: Final[np.ndarray] = np.concatenate(
+            (np.asarray(dates.hour), 23 + np.asarray(dates.month))
+        )
+        group_power: Final[np.ndarray] = np.concatenate((power, power))
+        if_non_negative: Final[np.ndarray] = group_power >= 0
+        if_positive: Final[np.ndarray] = group_power > 0
+
+        non_negative_codes: Final[np.ndarray] = group_codes[if_non_negative]
+        non_negative_power: Final[np.ndarray] = group_power[if_non_negative]
+        batch_count: Final[np.ndarray] = np.bincount(
+            non_negative_codes, minlength=GROUP_QUANTITY
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            batch_mean: Final[np.ndarray] = np.where(
+                batch_count > 0,
+                np.bincount(
+                    non_negative_codes,
+                    weights=non_negative_power,
+                    minlength=GROUP_QUANTITY,
+                )
+                / batch_count,
+                0.0,
+            )
+        batch_m2: Final[np.ndarray] = np.bincount(
+            non_negative_codes,
+            weights=(non_negative_power - batch_mean[non_negative_codes]) ** 2,
+            minlength=GROUP_QUANTITY,
+        )
+
+        count: Final[np.ndarray] = self.count + batch_count
+        delta: Final[np.ndarray] = batch_mean - self.mean
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.mean = np.where(
+                count > 0, self.mean + delta * batch_count / count, 0.0
+            )
+            self.m2 = np.where(
+                count > 0,
+                self.m2 + batch_m2 + delta**2 * self.count * batch_count / count,
+                0.0,
+            )
+        self.count = count
+        np.minimum.at(self.min, non_negative_codes, non_negative_power)
+        np.maximum.at(self.max, non_negative_codes, non_negative_power)
+        self.positive_hours += np.bincount(
+            group_codes[if_positive], minlength=GROUP_QUANTITY
+        )
+        self.total_kwh += (
+            np.bincount(
+                group_codes[if_positive],
+                weights=group_power[if_positive],
+                minlength=GROUP_QUANTITY,
+            )
+            / 1000
+        )
+
+    def get_std(self) -> np.ndarray:
+        """Sample standard deviation of each group, NaN for groups with fewer than two hours"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """One row per group, with period ("hour" or "month") and value as in SummaryStatistics. min and max are NaN
+        for groups without data."""
+        group_slots: Final[np.ndarray] = np.arange(GROUP_QUANTITY)
+        return pd.DataFrame(
+            {
+                "period": np.where(group_slots < 24, "hour", "month"),
+                "value": np.where(group_slots < 24, group_slots, group_slots - 23),
+                "count": self.count,
+                "mean": self.mean,
+                "m2": self.m2,
+                "min": np.where(self.count > 0, self.min, np.nan),
+                "max": np.where(self.count > 0, self.max, np.nan),
+                "positive_hours": self.positive_hours,
+                "total_kwh": self.total_kwh,
+            },
+            columns=AGGREGATE_COLUMNS,
+        )
+
+    def save(self, filepath: str) -> None:
+        # Written under a temporary name and renamed so that the aggregates are never left partially written
+        temporary_filepath: Final[str] = f"{filepath}.{os.getpid()}.tmp"
+        self.to_dataframe().to_csv(temporary_filepath, index=False)
+        os.replace(temporary_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath: str) -> "PowerOutputAggregates":
+        aggregates_df: Final[pd.DataFrame] = pd.read_csv(
+            filepath, float_precision="round_trip"
+        )
+        if len(aggregates_df) != GROUP_QUANTITY:
+            raise ValueError("Expected one row per hour of day and month", filepath)
+        aggregates: Final[PowerOutputAggregates] = cls()
+        aggregates.count = aggregates_df["count"].to_numpy(dtype=np.int64)
+        aggregates.mean = aggregates_df["mean"].to_numpy(dtype=float)
+        aggregates.m2 = aggregates_df["m2"].to_numpy(dtype=float)
+        aggregates.min = aggregates_df["min"].fillna(np.inf).to_numpy(dtype=float)
+        aggregates.max = aggregates_df["max"].fillna(-np.inf).to_numpy(dtype=float)
+        aggregates.positive_hours = aggregates_df["positive_hours"].to_numpy(
+            dtype=np.int64
+        )
+        aggregates.total_kwh = aggregates_df["total_kwh"].to_numpy(dtype=float)
+        return aggregates
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Final, Literal
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src.plots.processed_data_loader import ResultsIndex
+from src.processing.stage_cache import StageCache
+
+logger = logging.getLogger(__name__)
+
+REGIONAL_STATISTICS_FILENAME: Final[str] = "regional_statistics.csv"
+
+
+class RegionalStatistics:
+    """Statistics of the total kWh m^-2 of every processed location within each region, e.g. country or admin area
+    polygons, named by `region_column`.
+
+    Locations are assigned to regions by a spatial join against the regions' spatial index, built once. Assignments
+    are cached in the `stage_cache` by the locations and the region geometries, so later runs over the same
+    locations skip the join. Statistics are weighted by cos(latitude), the relative area of a cell of a regular
+    lat/lon grid, so that high-latitude locations don't dominate. Locations are those processed between
+    `start_date` and `end_date`.
+    """
+
+    def __init__(
+        self,
+        regions: gpd.GeoDataFrame,
+        region_column: str = "name",
+        stage_cache: StageCache | None = None,
+        start_date: datetime = datetime(2023, 1, 1),
+        end_date: datetime = datetime(2023, 1, 31),
+    ):
+        if region_column not in regions.columns:
+            raise ValueError("Regions have no column", region_column)
+        self.regions: Final[gpd.GeoDataFrame] = (
+            regions if regions.crs is None else regions.to_crs("EPSG:4326")
+        ).reset_index(drop=True)
+        self.region_column: Final[str] = region_column
+        self.start_date: Final[datetime] = start_date
+        self.end_date: Final[datetime] = end_date
+        self.stage_cache: Final[StageCache] = stage_cache or StageCache()
+        self.regions_hash: Final[str] = hashlib.sha256(
+            b"".join(self.regions.geometry.to_wkb())
+        ).hexdigest()
+
+    @classmethod
+    def from_file(
+        cls,
+        filepath: str,
+        region_column: str = "name",
+        stage_cache: StageCache | None = None,
+        start_date: datetime = datetime(2023, 1, 1),
+        end_date: datetime = datetime(2023, 1, 31),
+    ) -> "RegionalStatistics":
+        """Regions from any file geopandas can read, e.g. the Natural Earth admin 0 countries. geopandas no longer
+        ships a copy of those, so the file must be given."""
+        return cls(
+            regions=gpd.read_file(filepath),
+            region_column=region_column,
+            stage_cache=stage_cache,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def get_region_codes(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Row of the regions containing each location, -1 for locations outside every region (e.g. at sea).
+        Locations on a border between regions are assigned to the first."""
+
+        def compute_region_codes() -> dict[str, np.ndarray]:
+            point_indices, region_indices = self.regions.sindex.query(
+                gpd.points_from_xy(x=lon, y=lat, crs="EPSG:4326"),
+                predicate="within",
+            )
+            order: np.ndarray = np.lexsort((region_indices, point_indices))
+            first_points, first_indices = np.unique(
+                point_indices[order], return_index=True
+            )
+            region_codes: np.ndarray = np.full(len(lat), -1, dtype=np.int64)
+            region_codes[first_points] = region_indices[order][first_indices]
+            return {"region_code": region_codes}
+
+        return self.stage_cache.get_or_compute(
+            "region_assignments",
+            compute=compute_region_codes,
+            lat=np.asarray(lat, dtype=float),
+            lon=np.asarray(lon, dtype=float),
+            regions=self.regions_hash,
+        )["region_code"]
+
+    def get_regional_statistics(self, locations_df: pd.DataFrame) -> pd.DataFrame:
+        """Area-weighted mean and standard deviation, minimum and maximum of total_kwh_per_square_m of the lat, lon
+        locations of `locations_df` in each region, with the number of locations. Every region is reduced at once
+        with bincount; regions without locations are omitted."""
+        region_codes: Final[np.ndarray] = self.get_region_codes(
+            lat=locations_df["lat"].to_numpy(), lon=locations_df["lon"].to_numpy()
+        )
+        if_in_region: Final[np.ndarray] = region_codes >= 0
+        codes: Final[np.ndarray] = region_codes[if_in_region]
+        total_kwh: Final[np.ndarray] = locations_df["total_kwh_per_square_m"].to_numpy(
+            dtype=float
+        )[if_in_region]
+        weights: Final[np.ndarray] = np.cos(
+            np.radians(locations_df["lat"].to_numpy(dtype=float)[if_in_region])
+        )
+        region_quantity: Final[int] = len(self.regions)
+
+        counts: Final[np.ndarray] = np.bincount(codes, minlength=region_quantity)
+        weight_sums: Final[np.ndarray] = np.bincount(
+            codes, weights=weights, minlength=region_quantity
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means: Final[np.ndarray] = (
+                np.bincount(
+                    codes, weights=weights * total_kwh, minlength=region_quantity
+                )
+                / weight_sums
+            )
+            stds: Final[np.ndarray] = np.sqrt(
+                np.bincount(
+                    codes,
+                    weights=weights * (total_kwh - means[codes]) ** 2,
+                    minlength=region_quantity,
+                )
+                / weight_sums
+            )
+        minimums: Final[np.ndarray] = np.full(region_quantity, np.inf)
+        maximums: Final[np.ndarray] = np.full(region_quantity, -np.inf)
+        np.minimum.at(minimums, codes, total_kwh)
+        np.maximum.at(maximums, codes, total_kwh)
+
+        if_populated: Final[np.ndarray] = counts > 0
+        return pd.DataFrame(
+            {
+                "region": self.regions[self.region_column].to_numpy(),
+                "locations": counts,
+                "mean_kwh_per_square_m": means,
+                "std_kwh_per_square_m": stds,
+                "min_kwh_per_square_m": minimums,
+                "max_kwh_per_square_m": maximums,
+            }
+        )[if_populated].reset_index(drop=True)
+
+    def output_regional_statistics(
+        self, emissivity_method: Literal["swinbank", "martin-berdahl"]
+    ) -> pd.DataFrame:
+        """Regional statistics of every location processed for the period, written to a single table in the
+        period's output directory"""
+        results_index: Final[ResultsIndex] = ResultsIndex()
+        results_index.update()
+        entries: Final[pd.DataFrame] = results_index.get_entries(
+            emissivity_method=emissivity_method,
+            start_date=self.start_date,
+            end_date=self.end_date,
+        )
+        statistics_df: Final[pd.DataFrame] = self.get_regional_statistics(
+            locations_df=entries
+        )
+
+        output_dir: Final[str] = os.path.abspath(
+            f"data/out/{emissivity_method}/"
+            f"{self.start_date.strftime('%Y%m%d-%H%M%S')}_{self.end_date.strftime('%Y%m%d-%H%M%S')}/"
+        )
+        os.makedirs(output_dir, exist_ok=True)
+        statistics_df.to_csv(
+            os.path.join(output_dir, REGIONAL_STATISTICS_FILENAME), index=False
+        )
+        logger.info(
+            "Wrote statistics of %d locations in %d regions to %s",
+            statistics_df["locations"].sum(),
+            len(statistics_df),
+            output_dir,
+        )
+        return statistics_df
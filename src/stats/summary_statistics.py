@@ -1,26 +1,50 @@
+import calendar
+import logging
 import os
 from datetime import datetime
-from typing import Final, Literal
+from typing import Final, Iterable, Literal
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import plotly.io as pio
 
-from src.plots.processed_data_loader import get_dict_of_processed_data
+from src.plots.figure_renderer import get_data_hash, renderer
+from src.plots.processed_data_loader import (
+    ResultsIndex,
+    get_dict_of_processed_data,
+    get_entries_with_hourly_data,
+    iter_processed_data,
+)
+from src.stats.power_output_aggregates import AGGREGATES_FILENAME, PowerOutputAggregates
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_STATISTICS_FILENAME: Final[str] = "summary_statistics.csv"
 
 
 class SummaryStatistics:
+    """Summary statistics of the power output of every location processed between `start_date` and `end_date`"""
+
+    def __init__(
+        self,
+        start_date: datetime = datetime(2022, 1, 1),
+        end_date: datetime = datetime(2022, 12, 31),
+    ):
+        self.start_date: Final[datetime] = start_date
+        self.end_date: Final[datetime] = end_date
+
     def output_summary_statistics(
         self, emissivity_method: Literal["swinbank", "martin-berdahl"]
     ):
-        start_date: Final[datetime] = datetime(2022, 1, 1)
-        end_date: Final[datetime] = datetime(2022, 12, 31)
+        start_date: Final[datetime] = self.start_date
+        end_date: Final[datetime] = self.end_date
         data_dict: Final[
             dict[int, tuple[float, float, float, pd.DataFrame]]
         ] = get_dict_of_processed_data(
             emissivity_method=emissivity_method,
             start_date=start_date,
             end_date=end_date,
+            columns=["average_power_watts_per_sqm"],
         )
 
         for index, data_tuple in data_dict.items():
@@ -85,20 +109,249 @@ class SummaryStatistics:
 
             fig.update_layout(showlegend=False)
             fig_month.update_layout(showlegend=False)
-            fig.show()
-            fig_month.show()
+            renderer.show(fig)
+            renderer.show(fig_month)
 
-            pio.write_image(
+            data_hash: str = get_data_hash(df["average_power_watts_per_sqm"])
+            renderer.write_image(
                 fig,
-                os.path.join(
+                filepath=os.path.join(
                     output_dir, f"mean_potential_by_hour_{emissivity_method}.pdf"
                 ),
-                format="pdf",
+                data_hash=data_hash,
             )
-            pio.write_image(
+            renderer.write_image(
                 fig_month,
-                os.path.join(
+                filepath=os.path.join(
                     output_dir, f"mean_potential_by_month_{emissivity_method}.pdf"
                 ),
-                format="pdf",
+                data_hash=data_hash,
+            )
+
+    def output_consolidated_summary_statistics(
+        self,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        if_render_plots: bool = False,
+    ) -> pd.DataFrame:
+        """Hour of day and month means and standard deviations of non-negative power output for every location,
+        computed in one pass over all locations and written to a single table in the period's output directory.
+        Locations with aggregates saved during prediction are read from those, and only the others from their hourly
+        data.
+        """
+        results_index: Final[ResultsIndex] = ResultsIndex()
+        results_index.update()
+        entries: Final[pd.DataFrame] = results_index.get_entries(
+            emissivity_method=emissivity_method,
+            start_date=self.start_date,
+            end_date=self.end_date,
+        )
+        if_aggregated: Final[np.ndarray] = np.array(
+            [
+                os.path.isfile(os.path.join(path, AGGREGATES_FILENAME))
+                for path in entries["path"]
+            ],
+            dtype=bool,
+        )
+        hourly_entries: Final[pd.DataFrame] = get_entries_with_hourly_data(
+            entries[~if_aggregated]
+        )
+        statistics_df: Final[pd.DataFrame] = (
+            pd.concat(
+                [
+                    self.get_summary_statistics_from_aggregates(
+                        entries=entries[if_aggregated]
+                    ),
+                    self.get_summary_statistics(
+                        locations_df=hourly_entries[["lat", "lon"]],
+                        long_df=self.get_long_table(
+                            processed_data=iter_processed_data(
+                                entries=hourly_entries,
+                                columns=["average_power_watts_per_sqm"],
+                            )
+                        ),
+                    ),
+                ],
+                ignore_index=True,
+            )
+            .sort_values(["lat", "lon", "period", "value"], kind="stable")
+            .reset_index(drop=True)
+        )
+
+        output_dir: Final[str] = os.path.abspath(
+            f"data/out/{emissivity_method}/"
+            f"{self.start_date.strftime('%Y%m%d-%H%M%S')}_{self.end_date.strftime('%Y%m%d-%H%M%S')}/"
+        )
+        os.makedirs(output_dir, exist_ok=True)
+        statistics_df.to_csv(
+            os.path.join(output_dir, SUMMARY_STATISTICS_FILENAME), index=False
+        )
+        logger.info(
+            "Wrote summary statistics for %d locations to %s",
+            len(entries),
+            output_dir,
+        )
+
+        if if_render_plots:
+            self.render_summary_statistics_plots(
+                statistics_df=statistics_df,
+                emissivity_method=emissivity_method,
+                output_dir=output_dir,
+            )
+        return statistics_df
+
+    @staticmethod
+    def get_long_table(
+        processed_data: Iterable[tuple[float, float, float, pd.DataFrame]]
+    ) -> pd.DataFrame:
+        """One row per location and hour with non-negative power output. Locations are numbered in the order of
+        `processed_data`, and hour and month are stored as small integers to keep thousands of locations in memory.
+        """
+        location_arrays: Final[list[np.ndarray]] = []
+        hour_arrays: Final[list[np.ndarray]] = []
+        month_arrays: Final[list[np.ndarray]] = []
+        power_arrays: Final[list[np.ndarray]] = []
+        for location, (_, _, _, df) in enumerate(processed_data):
+            power: np.ndarray = df["average_power_watts_per_sqm"].to_numpy()
+            if_non_negative: np.ndarray = power >= 0
+            location_arrays.append(
+                np.full(np.count_nonzero(if_non_negative), location, dtype=np.int32)
             )
+            hour_arrays.append(
+                np.asarray(df.index.hour, dtype=np.int8)[if_non_negative]
+            )
+            month_arrays.append(
+                np.asarray(df.index.month, dtype=np.int8)[if_non_negative]
+            )
+            power_arrays.append(power[if_non_negative])
+
+        return pd.DataFrame(
+            {
+                "location": np.concatenate(location_arrays or [np.empty(0, np.int32)]),
+                "hour": np.concatenate(hour_arrays or [np.empty(0, np.int8)]),
+                "month": np.concatenate(month_arrays or [np.empty(0, np.int8)]),
+                "average_power_watts_per_sqm": np.concatenate(
+                    power_arrays or [np.empty(0)]
+                ),
+            }
+        )
+
+    @staticmethod
+    def get_summary_statistics(
+        locations_df: pd.DataFrame, long_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Mean and sample standard deviation of power output by location and hour of day, and by location and month.
+
+        Each row of `long_df` is assigned one group for its hour and one for its month, and every group is reduced at
+        once with bincount, which needs far less memory than a pandas groupby over millions of rows. Columns are lat,
+        lon, period ("hour" or "month"), value, mean and std; groups without data are omitted.
+        """
+        group_count_per_location: Final[int] = 24 + 12
+        location_offsets: Final[np.ndarray] = (
+            long_df["location"].to_numpy(dtype=np.int64) * group_count_per_location
+        )
+        power: Final[np.ndarray] = long_df["average_power_watts_per_sqm"].to_numpy()
+        group_codes: Final[np.ndarray] = np.concatenate(
+            (
+                location_offsets + long_df["hour"].to_numpy(),
+                location_offsets + 23 + long_df["month"].to_numpy(),
+            )
+        )
+        group_power: Final[np.ndarray] = np.concatenate((power, power))
+        group_quantity: Final[int] = len(locations_df) * group_count_per_location
+
+        counts: Final[np.ndarray] = np.bincount(group_codes, minlength=group_quantity)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means: Final[np.ndarray] = (
+                np.bincount(group_codes, weights=group_power, minlength=group_quantity)
+                / counts
+            )
+            stds: Final[np.ndarray] = np.sqrt(
+                np.bincount(
+                    group_codes,
+                    weights=(group_power - means[group_codes]) ** 2,
+                    minlength=group_quantity,
+                )
+                / (counts - 1)
+            )
+
+        if_populated: Final[np.ndarray] = counts > 0
+        group_slots: Final[np.ndarray] = np.tile(
+            np.arange(group_count_per_location), len(locations_df)
+        )
+        locations: Final[np.ndarray] = np.repeat(
+            np.arange(len(locations_df)), group_count_per_location
+        )
+        return pd.DataFrame(
+            {
+                "lat": locations_df["lat"].to_numpy()[locations],
+                "lon": locations_df["lon"].to_numpy()[locations],
+                "period": np.where(group_slots < 24, "hour", "month"),
+                "value": np.where(group_slots < 24, group_slots, group_slots - 23),
+                "mean": means,
+                "std": np.where(counts > 1, stds, np.nan),
+            }
+        )[if_populated].reset_index(drop=True)
+
+    @staticmethod
+    def get_summary_statistics_from_aggregates(entries: pd.DataFrame) -> pd.DataFrame:
+        """get_summary_statistics for entries of a ResultsIndex, from the aggregates saved alongside their results"""
+        statistics_dfs: Final[list[pd.DataFrame]] = []
+        for entry in entries.itertuples(index=False):
+            aggregates: PowerOutputAggregates = PowerOutputAggregates.load(
+                os.path.join(entry.path, AGGREGATES_FILENAME)
+            )
+            aggregates_df: pd.DataFrame = aggregates.to_dataframe()
+            statistics_dfs.append(
+                pd.DataFrame(
+                    {
+                        "lat": entry.lat,
+                        "lon": entry.lon,
+                        "period": aggregates_df["period"],
+                        "value": aggregates_df["value"],
+                        "mean": aggregates_df["mean"],
+                        "std": aggregates.get_std(),
+                    }
+                )[aggregates.count > 0]
+            )
+        return pd.concat(
+            statistics_dfs
+            or [pd.DataFrame(columns=["lat", "lon", "period", "value", "mean", "std"])],
+            ignore_index=True,
+        )
+
+    @staticmethod
+    def render_summary_statistics_plots(
+        statistics_df: pd.DataFrame,
+        emissivity_method: Literal["swinbank", "martin-berdahl"],
+        output_dir: str,
+    ) -> None:
+        """The per-location hour of day and month bar charts of output_summary_statistics, from the consolidated
+        table"""
+        for (lat, lon, period), period_df in statistics_df.groupby(
+            ["lat", "lon", "period"]
+        ):
+            location_dir: str = os.path.join(output_dir, f"{lat}_{lon}")
+            filepath: str = os.path.join(
+                location_dir, f"mean_potential_by_{period}_{emissivity_method}.pdf"
+            )
+            data_hash: str = get_data_hash(period_df[["value", "mean", "std"]])
+            if renderer.is_up_to_date(filepath=filepath, data_hash=data_hash):
+                continue
+
+            index: list = (
+                period_df["value"].tolist()
+                if period == "hour"
+                else [calendar.month_name[month] for month in period_df["value"]]
+            )
+            fig = px.bar(
+                pd.Series(period_df["mean"].to_numpy(), index=index),
+                error_y=period_df["std"].to_numpy(),
+                labels={
+                    "value": "Mean Potential Power (Wm<sup>-2</sup>)",
+                    "index": "Hour of Day" if period == "hour" else "Month of Year",
+                },
+            )
+            fig.update_layout(showlegend=False)
+
+            os.makedirs(location_dir, exist_ok=True)
+            renderer.write_image(fig, filepath=filepath, data_hash=data_hash)
@@ -1,8 +1,19 @@
 from datetime import datetime
 from typing import Final
 
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
 from astropy import units as u
 
+from benchmarks.synthetic_era5 import create_synthetic_month_datasets
+from src.api.copernicus_climate_data import (
+    CopernicusClimateData,
+    interpolate_bilinearly,
+)
+from src.processing.save_output_between_dates import get_temperatures_between_dates
+
 
 class TestGetValuesFromAPI:
     def test_get_average_monthly_dewpoint_temperature(
@@ -31,3 +42,150 @@ class TestGetValuesFromAPI:
         )
         assert round(value.value, 1) == 1244.5
         assert value.unit == u.meter
+
+
+class TestBilinearInterpolation:
+    @staticmethod
+    def _get_dataset(values: np.ndarray) -> xr.Dataset:
+        return xr.Dataset(
+            {"skt": (("time", "latitude", "longitude"), values)},
+            coords={
+                "time": pd.date_range("2022-01-01", periods=len(values), freq="h"),
+                "latitude": [53.5, 53.25],
+                "longitude": [-7.0, -6.75],
+            },
+        )
+
+    def test_interpolates_between_grid_cells(self) -> None:
+        values: Final[np.ndarray] = np.stack(
+            [np.array([[0.0, 1.0], [2.0, 3.0]]) + hour for hour in range(3)]
+        )
+        climate_data_obj: Final[
+            CopernicusClimateData
+        ] = CopernicusClimateData.from_datasets(
+            temperature_datasets={(1, "skt"): self._get_dataset(values)},
+            interpolation="bilinear",
+        )
+        interpolated: Final[np.ndarray] = climate_data_obj.get_values_from_dataset(
+            lat=53.3,
+            lon=-6.8,
+            dataset_shortname="skt",
+            dates=pd.date_range("2022-01-01", periods=3, freq="h"),
+        )
+        # 0.8 of the way from the 53.5 to the 53.25 row, and 0.8 of the way from the -7 to the -6.75 column
+        np.testing.assert_allclose(interpolated, [2.4, 3.4, 4.4])
+
+    def test_excludes_corners_without_data(self) -> None:
+        values: Final[np.ndarray] = np.array([[[np.nan, 1.0], [2.0, 3.0]]] * 2)
+        climate_data_obj: Final[
+            CopernicusClimateData
+        ] = CopernicusClimateData.from_datasets(
+            temperature_datasets={(1, "skt"): self._get_dataset(values)},
+            interpolation="bilinear",
+        )
+        value: Final[float] = climate_data_obj.get_value_from_dataset(
+            lat=53.375,
+            lon=-6.875,
+            dataset_shortname="skt",
+            date=datetime(year=2022, month=1, day=1, hour=1),
+        )
+        assert value == pytest.approx(2.0)
+
+    def test_matches_nearest_at_grid_cells(self) -> None:
+        temperature_datasets: Final = create_synthetic_month_datasets(
+            lat=53.4, lon=-6.3, year=2022, month=1
+        )
+        dates: Final[pd.DatetimeIndex] = pd.date_range(
+            "2022-01-02", "2022-01-03 23:00", freq="h"
+        )
+        for dataset_shortname in ["skt", "t2m", "tcc", "sp", "cbh"]:
+            np.testing.assert_allclose(
+                *[
+                    CopernicusClimateData.from_datasets(
+                        temperature_datasets=temperature_datasets,
+                        interpolation=interpolation,
+                    ).get_values_from_dataset(
+                        lat=53.5,
+                        lon=-6.5,
+                        dataset_shortname=dataset_shortname,
+                        dates=dates,
+                    )
+                    for interpolation in ["nearest", "bilinear"]
+                ],
+                rtol=1e-6,
+            )
+
+    def test_interpolates_once_per_point_and_dataset_over_a_month(self, monkeypatch):
+        calls: list[tuple[str, float, float]] = []
+
+        def counting_interpolate_bilinearly(data_array, lat, lon):
+            calls.append((data_array.name, lat, lon))
+            return interpolate_bilinearly(data_array=data_array, lat=lat, lon=lon)
+
+        monkeypatch.setattr(
+            "src.api.copernicus_climate_data.interpolate_bilinearly",
+            counting_interpolate_bilinearly,
+        )
+        climate_data_obj: Final[
+            CopernicusClimateData
+        ] = CopernicusClimateData.from_datasets(
+            temperature_datasets=create_synthetic_month_datasets(
+                lat=53.4, lon=-6.3, year=2022, month=1
+            ),
+            interpolation="bilinear",
+        )
+        dates: Final[pd.DatetimeIndex] = pd.date_range(
+            "2022-01-02", "2022-01-31 23:00", freq="h"
+        )
+
+        t_skies, t_surfs = get_temperatures_between_dates(
+            climate_data_obj=climate_data_obj,
+            lon=-6.3,
+            lat=53.4,
+            dates=dates,
+            emissivity_method="martin-berdahl",
+        )
+
+        assert len(t_skies) == len(t_surfs) == len(dates)
+        assert sorted(calls) == sorted(set(calls))
+        assert {name for name, _, _ in calls} == {
+            "skt",
+            "t2m",
+            "tcc",
+            "sp",
+            "d2m",
+            "cbh",
+        }
+
+
+class TestClimateDataTiles:
+    class _CachedGribs:
+        def get_cached(self, filepath: str) -> bool:
+            return True
+
+        def evict(self, keep: list[str]) -> None:
+            pass
+
+    @pytest.mark.parametrize(
+        "lat, lon, box",
+        [
+            (53.4, -6.3, "53_54_-7_-6"),
+            (53.0, -7.0, "53_54_-7_-6"),
+            (90.0, 180.0, "89_90_179_180"),
+        ],
+    )
+    def test_loads_the_tile_containing_the_coordinate(self, monkeypatch, lat, lon, box):
+        opened_filepaths: list[str] = []
+        monkeypatch.setattr(
+            "src.api.copernicus_climate_data.grib_cache", self._CachedGribs()
+        )
+        monkeypatch.setattr(
+            CopernicusClimateData,
+            "open_dataset",
+            staticmethod(lambda filepath: opened_filepaths.append(filepath)),
+        )
+        CopernicusClimateData(
+            if_load_entire_earth=False, year=2022, months=[1], lon=lon, lat=lat
+        )
+        assert opened_filepaths
+        assert all(f"/{box}/" in filepath for filepath in opened_filepaths)
@@ -0,0 +1,113 @@
+import os
+import time
+
+from src.api import grib_cache as grib_cache_module
+from src.api.grib_cache import GribCacheManager
+
+
+def _write_grib(filepath: str, size: int) -> str:
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "wb") as outfile:
+        outfile.write(b"GRIB" + b"\0" * (size - 8) + b"7777")
+    return filepath
+
+
+class TestGribCacheManager:
+    def test_evicts_least_recently_used_within_budget(self, tmp_path):
+        grib_cache = GribCacheManager(
+            budget_bytes=250, manifest_filepath=str(tmp_path / "manifest.json")
+        )
+        filepaths = [
+            _write_grib(str(tmp_path / f"era5_skt/{month}/download.grib"), size=100)
+            for month in range(3)
+        ]
+        for filepath in filepaths:
+            grib_cache.add(filepath)
+            time.sleep(0.01)
+        _write_grib(f"{filepaths[1]}.923a8.idx", size=10)
+        assert grib_cache.get_cached(filepaths[0])
+
+        grib_cache.evict(keep=[filepaths[2]])
+
+        assert [os.path.isfile(filepath) for filepath in filepaths] == [
+            True,
+            False,
+            True,
+        ]
+        assert not os.path.isfile(f"{filepaths[1]}.923a8.idx")
+        assert grib_cache.statistics["evictions"] == 1
+        assert (
+            GribCacheManager(
+                manifest_filepath=str(tmp_path / "manifest.json")
+            ).get_size()
+            == 200
+        )
+
+    def test_discards_truncated_files_and_adopts_unknown_ones(self, tmp_path):
+        grib_cache = GribCacheManager(
+            manifest_filepath=str(tmp_path / "manifest.json"), verify_checksums=True
+        )
+        truncated_filepath = _write_grib(str(tmp_path / "a/download.grib"), size=100)
+        grib_cache.add(truncated_filepath)
+        with open(truncated_filepath, "r+b") as outfile:
+            outfile.truncate(60)
+        unknown_filepath = _write_grib(str(tmp_path / "b/download.grib"), size=100)
+
+        assert not grib_cache.get_cached(truncated_filepath)
+        assert not os.path.isfile(truncated_filepath)
+        assert grib_cache.get_cached(unknown_filepath)
+        assert not grib_cache.get_cached(str(tmp_path / "c/download.grib"))
+        assert grib_cache.statistics == {
+            "hits": 1,
+            "misses": 2,
+            "invalid": 1,
+            "evictions": 0,
+            "evicted_bytes": 0,
+        }
+
+    def test_checksums_only_computed_for_verification(self, tmp_path, monkeypatch):
+        checksummed_filepaths = []
+        get_file_checksum = grib_cache_module.get_file_checksum
+
+        def record_checksum(filepath: str) -> str:
+            checksummed_filepaths.append(filepath)
+            return get_file_checksum(filepath)
+
+        monkeypatch.setattr("src.api.grib_cache.get_file_checksum", record_checksum)
+        grib_cache = GribCacheManager(manifest_filepath=str(tmp_path / "manifest.json"))
+        filepath = _write_grib(str(tmp_path / "a/download.grib"), size=100)
+        grib_cache.add(filepath)
+        assert grib_cache.get_cached(filepath)
+        assert checksummed_filepaths == []
+
+        grib_cache.configure(budget_bytes=None, verify_checksums=True)
+        assert grib_cache.get_cached(filepath)
+        assert grib_cache.get_cached(filepath)
+        assert checksummed_filepaths == [filepath, filepath]
+        # Same size and framing, different content
+        with open(filepath, "r+b") as outfile:
+            outfile.seek(50)
+            outfile.write(b"\1")
+        assert not grib_cache.get_cached(filepath)
+
+    def test_flushes_only_changes_without_budget(self, tmp_path, monkeypatch):
+        grib_cache = GribCacheManager(manifest_filepath=str(tmp_path / "manifest.json"))
+        saves = []
+        save_manifest = grib_cache._save_manifest
+
+        def record_save():
+            saves.append(len(grib_cache._get_manifest()))
+            save_manifest()
+
+        monkeypatch.setattr(grib_cache, "_save_manifest", record_save)
+        filepath = _write_grib(str(tmp_path / "a/download.grib"), size=100)
+
+        grib_cache.add(filepath)
+        grib_cache.evict()
+        assert saves == [1]
+        assert grib_cache.get_cached(filepath)
+        grib_cache.evict()
+        assert saves == [1]
+        grib_cache.flush()
+        grib_cache.flush()
+        assert saves == [1, 1]
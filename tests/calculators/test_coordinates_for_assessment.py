@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.calculators.coordinates_for_assessment import (
+    get_climate_data_tile,
+    get_coordinates_for_assessment,
+)
+
+
+class TestGetCoordinatesForAssessment:
+    def test_default_resolution(self):
+        coordinates: np.ndarray = get_coordinates_for_assessment()
+        assert coordinates.shape == (822, 2)
+        assert coordinates[0].tolist() == [-179.5, -84.5]
+
+    def test_coordinates_grouped_by_tile(self):
+        coordinates: np.ndarray = get_coordinates_for_assessment(resolution=0.5)
+        tiles: list[tuple[int, int]] = [
+            get_climate_data_tile(lat=lat, lon=lon) for lon, lat in coordinates
+        ]
+        tile_changes: int = sum(
+            previous_tile != tile for previous_tile, tile in zip(tiles, tiles[1:])
+        )
+        assert tile_changes == len(set(tiles)) - 1
+
+    @pytest.mark.parametrize("resolution", [0.0, -1.0])
+    def test_resolution_must_be_positive(self, resolution):
+        with pytest.raises(ValueError):
+            get_coordinates_for_assessment(resolution=resolution)
+
+
+class TestGetClimateDataTile:
+    @pytest.mark.parametrize(
+        "lat, lon, tile",
+        [
+            (53.4, -6.3, (53, -7)),
+            (53.0, -7.0, (53, -7)),
+            (90.0, 180.0, (89, 179)),
+            (-90.0, -180.0, (-90, -180)),
+        ],
+    )
+    def test_tile(self, lat, lon, tile):
+        assert get_climate_data_tile(lat=lat, lon=lon) == tile
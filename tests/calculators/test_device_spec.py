@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from astropy import units as u
+
+from src.calculators.device_spec import DeviceSpec
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+
+
+class TestDeviceSpec:
+    def test_from_string(self):
+        device = DeviceSpec.from_string("InSb:0.23:0.05:0.9:-2:0")
+        assert (device.name, device.E_g, device.eta, device.emissivity) == (
+            "InSb",
+            0.23,
+            0.05,
+            0.9,
+        )
+        assert device.voltage_bounds == (-2.0, 0.0)
+        assert DeviceSpec.from_string("HgCdTe:0.17").eta == 0.03
+        with pytest.raises(ValueError):
+            DeviceSpec.from_string("InSb")
+        with pytest.raises(ValueError):
+            DeviceSpec.from_string("InSb:0.23:0.05:1.5")
+
+    @pytest.mark.parametrize(
+        "device_str",
+        [
+            "InSb:0.23:0.05:1:-1:0.23",
+            "InSb:0.23:0.05:1:-1:0.5",
+            "InSb:0.23:0.05:1:0:-1",
+            "InSb:0",
+        ],
+    )
+    def test_rejects_invalid_voltage_bounds_and_bandgap(self, device_str):
+        with pytest.raises(ValueError):
+            DeviceSpec.from_string(device_str)
+
+    def test_voltage_bounds_below_bandgap_give_finite_power(self):
+        device = DeviceSpec.from_string("InSb:0.23:0.05:1:-1:0.2")
+        _, max_powers = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.array([270.0]),
+            t_cell=np.array([300.0]),
+            E_g=device.E_g,
+            eta=device.eta,
+            voltage_bounds=device.voltage_bounds,
+        )
+        assert np.isfinite(max_powers).all()
+
+    def test_scalar_and_batch_solves_use_device_parameters(self):
+        device = DeviceSpec(name="grey", E_g=0.2, eta=0.05, emissivity=0.8)
+        mpp_object = device.get_maximum_power_point_tracker(
+            t_sky=270 * u.Kelvin, t_cell=300 * u.Kelvin
+        )
+        _, max_powers = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.array([270.0]),
+            t_cell=np.array([300.0]),
+            E_g=device.E_g,
+            eta=device.eta,
+            emissivity=device.emissivity,
+        )
+        black_body_power = MaximumPowerPointTracker(
+            t_sky=270 * u.Kelvin, t_cell=300 * u.Kelvin, E_g=0.2 * u.eV, eta=0.05
+        ).max_power
+
+        assert np.isclose(max_powers[0], mpp_object.max_power.value, atol=1e-3)
+        assert mpp_object.max_power.value == pytest.approx(
+            0.8 * black_body_power.value, rel=1e-2
+        )
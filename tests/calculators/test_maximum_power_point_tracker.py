@@ -1,3 +1,4 @@
+import numpy as np
 from astropy import units as u
 
 from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
@@ -12,3 +13,38 @@ class TestMaximumPowerPointTracker:
         ).get_max_power()
         assert round(max_power.value, 1) == 40.8
         assert max_power.unit == (u.watt / (u.meter**2))
+
+    def test_solve_batch_matches_scalar_solve(self):
+        optimal_voltages, max_powers = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.array([270.0, 255.7]), t_cell=np.array([443.0, 280.4]), E_g=0.17
+        )
+        for t_sky, t_cell, optimal_voltage, max_power in zip(
+            [270.0, 255.7], [443.0, 280.4], optimal_voltages, max_powers
+        ):
+            mpp_object = MaximumPowerPointTracker(
+                t_sky=t_sky * u.Kelvin, t_cell=t_cell * u.Kelvin, E_g=0.17 * u.eV
+            )
+            assert abs(optimal_voltage - mpp_object.optimal_voltage.value) <= 0.002
+            assert np.isclose(max_power, mpp_object.max_power.value, atol=1e-3)
+
+    def test_solve_batch_sensitivities_match_finite_differences(self):
+        inputs = dict(
+            t_sky=np.array([250.0, 262.3]),
+            t_cell=np.array([280.0, 291.1]),
+            E_g=np.array([0.17, 0.23]),
+        )
+        _, _, sensitivities = MaximumPowerPointTracker.solve_batch(
+            **inputs, tolerance=1e-10, if_sensitivities=True
+        )
+        for name, step in [("t_sky", 1e-3), ("t_cell", 1e-3), ("E_g", 1e-6)]:
+            max_powers = [
+                MaximumPowerPointTracker.solve_batch(
+                    **{**inputs, name: inputs[name] + sign * step}, tolerance=1e-12
+                )[1]
+                for sign in [1, -1]
+            ]
+            np.testing.assert_allclose(
+                sensitivities[name],
+                (max_powers[0] - max_powers[1]) / (2 * step),
+                rtol=1e-5,
+            )
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.parametric_sweep import ParametricSweep
+
+
+class TestParametricSweep:
+    def test_sweep_matches_batch_solve_and_is_cached(self, tmp_path):
+        sweep = ParametricSweep(
+            t_sky=[250.0, 270.0],
+            t_cell=[300.0, 443.0],
+            E_g=[0.1, 0.17],
+            eta=[0.0, 0.03],
+            chunk_size=5,
+            cache_dir=str(tmp_path),
+        )
+        results = sweep.get_results()
+        assert dict(results.sizes) == {"t_sky": 2, "t_cell": 2, "E_g": 2, "eta": 2}
+
+        optimal_voltage, max_power = MaximumPowerPointTracker.solve_batch(
+            t_sky=270.0, t_cell=443.0, E_g=0.17, eta=0.03
+        )
+        cell = dict(t_sky=270.0, t_cell=443.0, E_g=0.17, eta=0.03)
+        assert results.optimal_voltage.sel(cell).item() == optimal_voltage
+        assert np.isclose(results.max_power.sel(cell).item(), max_power)
+
+        assert os.listdir(tmp_path) == [f"{sweep.get_cache_key()}.npz"]
+        cached_results = sweep.get_results()
+        np.testing.assert_array_equal(cached_results.max_power, results.max_power)
@@ -0,0 +1,22 @@
+import numpy as np
+from astropy import units as u
+
+from src.calculators.total_power_output import TotalPowerOutput, get_photon_flux_array
+
+
+class TestTotalPowerOutput:
+    def test_photon_flux_array_matches_quadrature(self):
+        temperatures = np.array([240.3, 270.0, 443.0])
+        chemical_potentials = np.array([0.0, -0.05, -0.5])
+        photon_fluxes = get_photon_flux_array(
+            E_g=0.17, T=temperatures, Delta_mu=chemical_potentials
+        )
+        for T, Delta_mu, photon_flux in zip(
+            temperatures, chemical_potentials, photon_fluxes
+        ):
+            expected_photon_flux = TotalPowerOutput(
+                E_g=0.17 * u.eV
+            ).get_photon_flux_emitted_from_semiconductor(
+                T=T * u.Kelvin, Delta_mu=Delta_mu * u.eV
+            )
+            assert np.isclose(photon_flux, expected_photon_flux.value, rtol=1e-8)
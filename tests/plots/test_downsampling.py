@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.plots.downsampling import get_lttb_indices, get_min_max_indices
+
+
+class TestDownsampling:
+    def test_min_max_keeps_extremes_of_every_series(self):
+        values = np.sin(np.linspace(0, 20, 10_000))[np.newaxis, :] * np.array(
+            [[1.0], [2.0]]
+        )
+        values[1, 1234] = 100.0
+
+        indices = get_min_max_indices(values=values, max_points=200)
+
+        for series, series_indices in enumerate(indices):
+            assert len(series_indices) <= 200
+            assert values[series, series_indices].max() == values[series].max()
+            assert values[series, series_indices].min() == values[series].min()
+            assert series_indices[0] == 0 and series_indices[-1] == 9_999
+
+    def test_lttb_keeps_spikes_and_ignores_nan(self):
+        x = np.arange(5_000)
+        values = np.zeros((1, 5_000))
+        values[0, 2_500] = 10.0
+        values[0, 100:110] = np.nan
+
+        [indices] = get_lttb_indices(x=x, values=values, max_points=100)
+
+        assert len(indices) == 100
+        assert 2_500 in indices
+        assert not np.any(np.isnan(values[0, indices]))
@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.plots.figure_renderer import FigureRenderer, get_data_hash
+
+
+class TestFigureRenderer:
+    def test_headless_export_skips_unchanged_data(self, tmp_path):
+        df = pd.DataFrame({"x": [1, 2, 3], "y": [2.0, 4.0, 8.0]})
+        filepath = os.path.join(tmp_path, "figure.html")
+        renderer = FigureRenderer(
+            headless=True,
+            manifest_filepath=os.path.join(tmp_path, "render_manifest.json"),
+        )
+
+        data_hash = get_data_hash(df)
+        renderer.write_image(
+            go.Figure(go.Scatter(x=df.x, y=df.y)),
+            filepath=filepath,
+            image_format="html",
+            data_hash=data_hash,
+        )
+        assert not os.path.exists(filepath)
+        renderer.close()
+        assert os.path.isfile(filepath)
+
+        reopened_renderer = FigureRenderer(
+            headless=True, manifest_filepath=renderer.manifest_filepath
+        )
+        assert reopened_renderer.is_up_to_date(filepath=filepath, data_hash=data_hash)
+        df.loc[0, "y"] = 3.0
+        assert not reopened_renderer.is_up_to_date(
+            filepath=filepath, data_hash=get_data_hash(df)
+        )
@@ -0,0 +1,128 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.plots.processed_data_loader import (
+    ResultsIndex,
+    SpatialResultsIndex,
+    get_dict_of_processed_data,
+    iter_processed_data,
+)
+
+
+def _write_output(lat: float, lon: float, total_kwh: float) -> str:
+    output_dir = os.path.abspath(
+        f"data/out/martin-berdahl/20220101-000000_20220102-000000/{lat}_{lon}/"
+    )
+    os.makedirs(output_dir)
+    pd.DataFrame(
+        {
+            "average_power_watts_per_sqm": [1.0, 2.0],
+            "optimal_voltage": [-0.01, -0.02],
+            "t_sky": [250.0, 251.0],
+            "t_surf": [280.0, 281.0],
+        },
+        index=pd.DatetimeIndex(["2022-01-01 00:00", "2022-01-01 01:00"]),
+    ).to_csv(os.path.join(output_dir, "data_per_dt.csv"))
+    with open(os.path.join(output_dir, "json_data.json"), "w") as outfile:
+        json.dump({"total_kwh_per_square_m": total_kwh}, outfile)
+    return output_dir
+
+
+class TestResultsIndex:
+    def test_update_is_incremental_and_loads_requested_columns(
+        self, tmp_path, monkeypatch
+    ):
+        monkeypatch.chdir(tmp_path)
+        _write_output(lat=53.4, lon=-6.3, total_kwh=1.5)
+        ResultsIndex().update()
+
+        _write_output(lat=-2.5, lon=10.5, total_kwh=0.5)
+        results_index = ResultsIndex()
+        assert len(results_index.entries) == 1
+        results_index.update()
+
+        entries = results_index.get_entries(
+            emissivity_method="martin-berdahl",
+            start_date=datetime(2022, 1, 1),
+            end_date=datetime(2022, 1, 2),
+            locations=[(53.4, -6.3)],
+        )
+        assert entries["total_kwh_per_square_m"].tolist() == [1.5]
+
+        [(lat, lon, total_kwh, df)] = list(
+            iter_processed_data(entries=entries, columns=["t_sky"])
+        )
+        assert (lat, lon, total_kwh) == (53.4, -6.3, 1.5)
+        assert df.columns.tolist() == ["t_sky"]
+        assert isinstance(df.index, pd.DatetimeIndex)
+
+    def test_locations_without_hourly_data_are_skipped(
+        self, tmp_path, monkeypatch, caplog
+    ):
+        monkeypatch.chdir(tmp_path)
+        _write_output(lat=53.4, lon=-6.3, total_kwh=1.5)
+        # As saved by save_power_output_between_dates with if_save_hourly False
+        os.remove(
+            os.path.join(
+                _write_output(lat=51.5, lon=-0.1, total_kwh=0.5), "data_per_dt.csv"
+            )
+        )
+
+        processed_data = get_dict_of_processed_data(
+            emissivity_method="martin-berdahl",
+            start_date=datetime(2022, 1, 1),
+            end_date=datetime(2022, 1, 2),
+            columns=["average_power_watts_per_sqm"],
+        )
+        assert [(lat, lon) for lat, lon, _, _ in processed_data.values()] == [
+            (53.4, -6.3)
+        ]
+        assert "Skipping 1 of 2 locations saved without hourly data" in caplog.text
+
+
+class TestSpatialResultsIndex:
+    def test_nearest_radius_and_bounds_queries(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        for lat, lon in [(53.4, -6.3), (51.5, -0.1), (0.0, 179.5), (0.0, -179.5)]:
+            _write_output(lat=lat, lon=lon, total_kwh=1.0)
+        results_index = ResultsIndex()
+        results_index.update()
+        spatial_index = SpatialResultsIndex(
+            results_index=results_index,
+            emissivity_method="martin-berdahl",
+            start_date=datetime(2022, 1, 1),
+            end_date=datetime(2022, 1, 2),
+        )
+
+        nearest = spatial_index.get_nearest(lat=53.3, lon=-6.2, n=2)
+        assert list(zip(nearest["lat"], nearest["lon"])) == [(53.4, -6.3), (51.5, -0.1)]
+        assert nearest["distance_km"].iloc[1] == pytest.approx(464, abs=5)
+
+        across_antimeridian = spatial_index.get_within_radius(
+            lat=0.0, lon=180.0, radius_km=100
+        )
+        assert sorted(across_antimeridian["lon"]) == [-179.5, 179.5]
+        np.testing.assert_allclose(across_antimeridian["distance_km"], 55.6, atol=0.1)
+
+        in_bounds = spatial_index.get_within_bounds(
+            min_lat=-1, min_lon=170, max_lat=1, max_lon=-170
+        )
+        assert sorted(in_bounds["lon"]) == [-179.5, 179.5]
+
+        index_filepath = "data/out/results_spatial_index/martin-berdahl_20220101-000000_20220102-000000.npz"
+        modified_time = os.path.getmtime(index_filepath)
+        reopened_spatial_index = SpatialResultsIndex(
+            results_index=results_index,
+            emissivity_method="martin-berdahl",
+            start_date=datetime(2022, 1, 1),
+            end_date=datetime(2022, 1, 2),
+        )
+        assert os.path.getmtime(index_filepath) == modified_time
+        np.testing.assert_array_equal(
+            reopened_spatial_index.tree.data, spatial_index.tree.data
+        )
@@ -0,0 +1,80 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from src.plots.figure_renderer import FigureRenderer
+from src.plots.resource_assessment_choropleth_map import CreateChoroplethMap, get_raster
+
+
+class TestGetRaster:
+    def test_locations_are_averaged_within_cells(self):
+        df = pd.DataFrame(
+            {
+                "lat": [53.3, 53.4, -10.0],
+                "lon": [-6.4, -6.3, 20.0],
+                "value": [1.0, 3.0, 5.0],
+            }
+        )
+        raster = get_raster(df=df, resolution=0.5)
+
+        assert raster.shape == (360, 720)
+        assert raster.sel(lat=53.25, lon=-6.25).item() == 2.0
+        assert raster.sel(lat=-9.75, lon=20.25).item() == 5.0
+        assert np.count_nonzero(np.isfinite(raster.values)) == 2
+
+
+class TestCreateRasterMap:
+    df = pd.DataFrame({"lat": [53.4], "lon": [-6.3], "value": [1.0]})
+
+    def test_requested_geotiff_without_rioxarray_raises(self, tmp_path, monkeypatch):
+        # A None entry makes `import rioxarray` raise ImportError
+        monkeypatch.setitem(sys.modules, "rioxarray", None)
+        with pytest.raises(ImportError, match="--extras geotiff"):
+            CreateChoroplethMap.create_raster_map(
+                df=self.df,
+                emissivity_method="swinbank",
+                resolution=1.0,
+                base_path=str(tmp_path),
+                if_export_geotiff=True,
+            )
+        assert list(tmp_path.iterdir()) == []
+
+    def test_geotiff_requires_raster_resolution(self):
+        with pytest.raises(ValueError):
+            CreateChoroplethMap().create_map(
+                emissivity_method="swinbank", if_export_geotiff=True
+            )
+
+    def test_unchanged_grids_are_not_rewritten(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            "src.plots.resource_assessment_choropleth_map.renderer",
+            FigureRenderer(
+                headless=True,
+                manifest_filepath=str(tmp_path / "render_manifest.json"),
+            ),
+        )
+        kwargs = dict(
+            emissivity_method="swinbank", resolution=1.0, base_path=str(tmp_path)
+        )
+        CreateChoroplethMap.create_raster_map(df=self.df, **kwargs)
+        grid_filepaths = sorted(tmp_path.glob("assessment_grid_*.nc"))
+        assert len(grid_filepaths) == 4
+        modified_times = [filepath.stat().st_mtime_ns for filepath in grid_filepaths]
+
+        written = []
+        monkeypatch.setattr(
+            xr.DataArray,
+            "to_netcdf",
+            lambda raster, filepath: written.append(filepath),
+        )
+        CreateChoroplethMap.create_raster_map(df=self.df, **kwargs)
+        assert written == []
+        assert [
+            filepath.stat().st_mtime_ns for filepath in grid_filepaths
+        ] == modified_times
+
+        CreateChoroplethMap.create_raster_map(df=self.df.assign(value=2.0), **kwargs)
+        assert len(written) == 4
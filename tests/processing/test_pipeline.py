@@ -0,0 +1,100 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from benchmarks.synthetic_era5 import create_synthetic_month_datasets
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.processing.pipeline import PowerOutputPipeline
+from src.processing.save_output_between_dates import (
+    get_output_dir,
+    save_power_output_between_dates,
+)
+
+
+class TestPowerOutputPipeline:
+    start_date = datetime(2022, 1, 31)
+    end_date = datetime(2022, 2, 1)
+    coordinates = [(-6.3, 53.4), (-6.3, 54.4), (-8.3, 52.4)]
+    failing_lat = 54.4
+
+    def _get_climate_data(
+        self, if_load_entire_earth, year, months, lon, lat, interpolation="nearest"
+    ) -> CopernicusClimateData:
+        """Synthetic climate data for a tile, without skin temperatures at `failing_lat`"""
+        datasets = {
+            key: dataset
+            for month in months
+            for key, dataset in create_synthetic_month_datasets(
+                lat=lat, lon=lon, year=year, month=month
+            ).items()
+        }
+        if lat == self.failing_lat:
+            for month in months:
+                datasets[(month, "skt")] = datasets[(month, "skt")] * float("nan")
+        return CopernicusClimateData.from_datasets(
+            temperature_datasets=datasets, interpolation=interpolation
+        )
+
+    def _read_outputs(self, lon: float, lat: float) -> tuple[bytes, bytes]:
+        output_dir = get_output_dir(
+            emissivity_method="swinbank",
+            start_date=self.start_date,
+            end_date=self.end_date,
+            lat=lat,
+            lon=lon,
+        )
+        outputs = []
+        for filename in ["data_per_dt.csv", "json_data.json"]:
+            with open(os.path.join(output_dir, filename), "rb") as infile:
+                outputs.append(infile.read())
+        return outputs[0], outputs[1]
+
+    def test_matches_sequential_output_and_skips_only_failing_coordinates(
+        self, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(
+            "src.processing.pipeline.CopernicusClimateData", self._get_climate_data
+        )
+        monkeypatch.setattr(
+            "src.processing.save_output_between_dates.CopernicusClimateData",
+            self._get_climate_data,
+        )
+
+        (tmp_path / "pipelined").mkdir()
+        monkeypatch.chdir(tmp_path / "pipelined")
+        with pytest.warns(UserWarning, match=f"lat: {self.failing_lat}"):
+            PowerOutputPipeline(
+                start_date=self.start_date,
+                end_date=self.end_date,
+                emissivity_method="swinbank",
+                prefetch=1,
+            ).run(coordinates=self.coordinates)
+        pipelined_outputs = {
+            (lon, lat): self._read_outputs(lon=lon, lat=lat)
+            for lon, lat in self.coordinates
+            if lat != self.failing_lat
+        }
+        assert not os.path.exists(
+            get_output_dir(
+                emissivity_method="swinbank",
+                start_date=self.start_date,
+                end_date=self.end_date,
+                lat=self.failing_lat,
+                lon=-6.3,
+            )
+            + "json_data.json"
+        )
+
+        (tmp_path / "sequential").mkdir()
+        monkeypatch.chdir(tmp_path / "sequential")
+        for lon, lat in pipelined_outputs:
+            save_power_output_between_dates(
+                climate_data_obj=None,
+                lon=lon,
+                lat=lat,
+                start_date=self.start_date,
+                end_date=self.end_date,
+                emissivity_method="swinbank",
+            )
+            assert self._read_outputs(lon=lon, lat=lat) == pipelined_outputs[(lon, lat)]
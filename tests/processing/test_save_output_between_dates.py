@@ -0,0 +1,407 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_era5 import create_synthetic_month_datasets
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.device_spec import DeviceSpec
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.exceptions import InsufficientClimateDataError
+from src.processing.save_output_between_dates import (
+    SENSITIVITY_COLUMNS,
+    get_output_dir,
+    get_power_output_between_dates,
+    get_temperatures_between_dates,
+    save_power_output_between_dates,
+)
+from src.processing.stage_cache import StageCache
+
+
+class TestGetPowerOutputBetweenDates:
+    lat = 53.4
+    lon = -6.3
+    start_date = datetime(2022, 1, 2)
+
+    def _get_climate_data_with_gaps(self) -> CopernicusClimateData:
+        datasets = create_synthetic_month_datasets(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        skt = datasets[(1, "skt")]
+        if_gap = skt["time"].isin(
+            pd.to_datetime(["2022-01-02 03:00", "2022-01-02 04:00"]).append(
+                pd.date_range("2022-01-02 10:00", periods=5, freq="h")
+            )
+        )
+        datasets[(1, "skt")] = skt.where(~if_gap)
+        return CopernicusClimateData.from_datasets(temperature_datasets=datasets)
+
+    def test_raises_on_missing_hours_unless_masked(self):
+        with pytest.raises(InsufficientClimateDataError):
+            get_power_output_between_dates(
+                climate_data_obj=self._get_climate_data_with_gaps(),
+                lon=self.lon,
+                lat=self.lat,
+                start_date=self.start_date,
+                end_date=self.start_date,
+                emissivity_method="swinbank",
+                progress=None,
+            )
+
+    def test_masked_fills_only_short_gaps(self):
+        dt_power_df, total_kwh = get_power_output_between_dates(
+            climate_data_obj=self._get_climate_data_with_gaps(),
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=self.start_date,
+            emissivity_method="swinbank",
+            progress=None,
+            masked=True,
+            max_gap_fill_hours=3,
+        )
+
+        power = dt_power_df["average_power_watts_per_sqm"]
+        assert len(dt_power_df) == 24
+        assert dt_power_df["gap_filled"].sum() == 2
+        assert dt_power_df.loc[
+            "2022-01-02 03:00":"2022-01-02 04:00", "gap_filled"
+        ].all()
+        assert power.loc["2022-01-02 03:00":"2022-01-02 04:00"].notna().all()
+        assert power.loc["2022-01-02 10:00":"2022-01-02 14:00"].isna().all()
+        assert power.notna().sum() == 19
+        assert total_kwh == pytest.approx(np.sum(power[power > 0]) / 1000)
+
+    def test_stage_cache_reuses_results_without_climate_data(self, tmp_path):
+        stage_cache = StageCache(cache_dir=str(tmp_path))
+        kwargs = dict(
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=self.start_date,
+            emissivity_method="swinbank",
+            progress=None,
+            masked=True,
+            stage_cache=stage_cache,
+        )
+        dt_power_df, total_kwh = get_power_output_between_dates(
+            climate_data_obj=self._get_climate_data_with_gaps(), **kwargs
+        )
+        cached_dt_power_df, cached_total_kwh = get_power_output_between_dates(
+            climate_data_obj=None, **kwargs
+        )
+
+        pd.testing.assert_frame_equal(cached_dt_power_df, dt_power_df)
+        assert cached_total_kwh == total_kwh
+        with pytest.raises(InsufficientClimateDataError):
+            get_power_output_between_dates(
+                climate_data_obj=None, **{**kwargs, "masked": False}
+            )
+
+    def test_evaluates_each_device_on_the_same_temperatures(self, tmp_path):
+        kwargs = dict(
+            climate_data_obj=self._get_climate_data_with_gaps(),
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=self.start_date,
+            emissivity_method="swinbank",
+            progress=None,
+            masked=True,
+        )
+        dt_power_df, total_kwh = get_power_output_between_dates(**kwargs)
+        devices_dt_power_df, devices_total_kwh = get_power_output_between_dates(
+            devices=[DeviceSpec(), DeviceSpec(name="InSb", E_g=0.23)], **kwargs
+        )
+
+        assert devices_total_kwh == total_kwh
+        pd.testing.assert_frame_equal(
+            devices_dt_power_df[dt_power_df.columns], dt_power_df
+        )
+        assert list(devices_dt_power_df.columns[4:]) == [
+            "average_power_watts_per_sqm_InSb",
+            "optimal_voltage_InSb",
+        ]
+        power_insb = devices_dt_power_df["average_power_watts_per_sqm_InSb"]
+        assert power_insb.notna().sum() == 17
+        assert (
+            power_insb.dropna() < dt_power_df["average_power_watts_per_sqm"].dropna()
+        ).all()
+
+    def test_sensitivities_match_batched_solve(self):
+        dt_power_df, _ = get_power_output_between_dates(
+            climate_data_obj=self._get_climate_data_with_gaps(),
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=self.start_date,
+            emissivity_method="swinbank",
+            progress=None,
+            masked=True,
+            max_gap_fill_hours=3,
+            sensitivities=True,
+        )
+
+        if_valid = dt_power_df["average_power_watts_per_sqm"].notna()
+        for column in SENSITIVITY_COLUMNS.values():
+            assert dt_power_df.loc[if_valid, column].notna().all()
+            assert dt_power_df.loc[~if_valid, column].isna().all()
+        (
+            optimal_voltages,
+            max_powers,
+            derivatives,
+        ) = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.round(dt_power_df.loc[if_valid, "t_sky"].to_numpy(), 1),
+            t_cell=np.round(dt_power_df.loc[if_valid, "t_surf"].to_numpy(), 1),
+            E_g=0.17,
+            if_sensitivities=True,
+        )
+        # The saved power output is from the per-hour solve at the same rounded temperatures, which rounds the
+        # optimal voltage to 1 mV
+        np.testing.assert_allclose(
+            dt_power_df.loc[if_valid, "average_power_watts_per_sqm"],
+            max_powers,
+            rtol=0,
+            atol=1e-3,
+        )
+        np.testing.assert_allclose(
+            dt_power_df.loc[if_valid, "optimal_voltage"],
+            optimal_voltages,
+            rtol=0,
+            atol=0.001,
+        )
+        np.testing.assert_allclose(
+            dt_power_df.loc[if_valid, "sensitivity_t_sky"], derivatives["t_sky"]
+        )
+        assert (dt_power_df.loc[if_valid, "sensitivity_t_surf"] > 0).all()
+
+    def test_masks_hours_without_cloud_cover(self):
+        datasets = create_synthetic_month_datasets(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        tcc = datasets[(1, "tcc")]
+        datasets[(1, "tcc")] = tcc.where(
+            ~tcc["time"].isin(pd.date_range("2022-01-02 06:00", periods=12, freq="h"))
+        )
+        climate_data_obj = CopernicusClimateData.from_datasets(
+            temperature_datasets=datasets
+        )
+        dates = pd.date_range(self.start_date, periods=24, freq="h")
+        kwargs = dict(
+            climate_data_obj=climate_data_obj,
+            lon=self.lon,
+            lat=self.lat,
+            dates=dates,
+            emissivity_method="martin-berdahl",
+        )
+
+        with pytest.raises(InsufficientClimateDataError):
+            get_temperatures_between_dates(**kwargs)
+        t_skies, t_surfs = get_temperatures_between_dates(masked=True, **kwargs)
+
+        # Cloud cover is only used under a cloud base; clear hours keep their sky temperature
+        if_cloudy = ~np.isnan(
+            climate_data_obj.get_values_from_dataset(
+                lat=self.lat, lon=self.lon, dataset_shortname="cbh", dates=dates
+            )
+        )
+        if_missing = np.asarray(
+            (dates >= "2022-01-02 06:00") & (dates < "2022-01-02 18:00")
+        )
+        assert np.any(if_cloudy & if_missing)
+        np.testing.assert_array_equal(np.isnan(t_skies), if_cloudy & if_missing)
+        assert not np.any(np.isnan(t_surfs))
+
+
+class TestPowerOutputWriter:
+    lat = 53.4
+    lon = -6.3
+    start_date = datetime(2022, 1, 31)
+    previous_end_date = datetime(2022, 1, 31)
+    end_date = datetime(2022, 2, 1)
+
+    @pytest.fixture(autouse=True)
+    def computed_dates(self, monkeypatch) -> list[pd.Timestamp]:
+        """Synthetic climate data for every window, recording the hours whose temperatures are computed"""
+        computed_dates = []
+
+        def get_climate_data(
+            if_load_entire_earth, year, months, lon, lat, interpolation="nearest"
+        ):
+            return CopernicusClimateData.from_datasets(
+                temperature_datasets=create_synthetic_month_datasets(
+                    lat=lat, lon=lon, year=year, month=months[0]
+                ),
+                interpolation=interpolation,
+            )
+
+        def record_temperatures(dates, **kwargs):
+            computed_dates.extend(dates)
+            return get_temperatures_between_dates(dates=dates, **kwargs)
+
+        monkeypatch.setattr(
+            "src.processing.save_output_between_dates.CopernicusClimateData",
+            get_climate_data,
+        )
+        monkeypatch.setattr(
+            "src.processing.save_output_between_dates.get_temperatures_between_dates",
+            record_temperatures,
+        )
+        return computed_dates
+
+    def _save(self, end_date: datetime, incremental: bool, **kwargs) -> None:
+        save_power_output_between_dates(
+            climate_data_obj=None,
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=end_date,
+            emissivity_method="swinbank",
+            incremental=incremental,
+            **kwargs,
+        )
+
+    def _read_output(self, end_date: datetime) -> tuple[bytes, dict]:
+        output_dir = get_output_dir(
+            emissivity_method="swinbank",
+            start_date=self.start_date,
+            end_date=end_date,
+            lat=self.lat,
+            lon=self.lon,
+        )
+        with open(os.path.join(output_dir, "data_per_dt.csv"), "rb") as infile:
+            hourly_data = infile.read()
+        with open(os.path.join(output_dir, "json_data.json")) as infile:
+            return hourly_data, json.load(infile)
+
+    def _get_full_output(self, tmp_path, monkeypatch, **kwargs) -> tuple[bytes, dict]:
+        (tmp_path / "full").mkdir()
+        monkeypatch.chdir(tmp_path / "full")
+        self._save(end_date=self.end_date, incremental=False, **kwargs)
+        return self._read_output(end_date=self.end_date)
+
+    def test_extends_previous_output_with_only_missing_hours(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        full_output = self._get_full_output(tmp_path, monkeypatch)
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        computed_dates.clear()
+        self._save(end_date=self.end_date, incremental=True)
+
+        assert computed_dates == list(
+            pd.date_range(self.end_date, periods=24, freq="h")
+        )
+        assert self._read_output(end_date=self.end_date) == full_output
+
+    def test_recomputes_previous_output_not_ending_on_its_end_date(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        full_output = self._get_full_output(tmp_path, monkeypatch)
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        previous_hourly_filepath = os.path.join(
+            get_output_dir(
+                emissivity_method="swinbank",
+                start_date=self.start_date,
+                end_date=self.previous_end_date,
+                lat=self.lat,
+                lon=self.lon,
+            ),
+            "data_per_dt.csv",
+        )
+        with open(previous_hourly_filepath, "rb") as infile:
+            previous_lines = infile.read().splitlines(keepends=True)
+        with open(previous_hourly_filepath, "wb") as outfile:
+            outfile.writelines(previous_lines[:-2])
+        computed_dates.clear()
+        self._save(end_date=self.end_date, incremental=True)
+
+        assert len(computed_dates) == 2 * 24
+        assert self._read_output(end_date=self.end_date) == full_output
+
+    def test_recomputes_previous_output_without_sensitivities(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        full_output = self._get_full_output(tmp_path, monkeypatch, sensitivities=True)
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        computed_dates.clear()
+        self._save(end_date=self.end_date, incremental=True, sensitivities=True)
+
+        assert len(computed_dates) == 2 * 24
+        assert self._read_output(end_date=self.end_date) == full_output
+        output_dir = get_output_dir(
+            emissivity_method="swinbank",
+            start_date=self.start_date,
+            end_date=self.end_date,
+            lat=self.lat,
+            lon=self.lon,
+        )
+        hourly_df = pd.read_csv(os.path.join(output_dir, "data_per_dt.csv"))
+        assert hourly_df[list(SENSITIVITY_COLUMNS.values())].notna().all(axis=None)
+
+    def test_recomputes_previous_output_of_other_devices(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        devices = [
+            DeviceSpec(name="InSb", E_g=0.23),
+            DeviceSpec(name="HgCdTe", E_g=0.1),
+        ]
+        full_output = self._get_full_output(tmp_path, monkeypatch, devices=devices)
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        computed_dates.clear()
+        self._save(end_date=self.end_date, incremental=True, devices=devices)
+
+        assert len(computed_dates) == 2 * 24
+        assert self._read_output(end_date=self.end_date) == full_output
+
+    def test_recomputes_previous_output_without_gap_filling(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        full_output = self._get_full_output(
+            tmp_path, monkeypatch, masked=True, max_gap_fill_hours=2
+        )
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        computed_dates.clear()
+        self._save(
+            end_date=self.end_date,
+            incremental=True,
+            masked=True,
+            max_gap_fill_hours=2,
+        )
+
+        assert len(computed_dates) == 2 * 24
+        assert self._read_output(end_date=self.end_date) == full_output
+        assert b"gap_filled" in full_output[0].splitlines()[0]
+
+    def test_recomputes_previous_output_interpolated_otherwise(
+        self, tmp_path, monkeypatch, computed_dates
+    ):
+        full_output = self._get_full_output(
+            tmp_path, monkeypatch, interpolation="bilinear"
+        )
+
+        (tmp_path / "incremental").mkdir()
+        monkeypatch.chdir(tmp_path / "incremental")
+        self._save(end_date=self.previous_end_date, incremental=False)
+        computed_dates.clear()
+        self._save(end_date=self.end_date, incremental=True, interpolation="bilinear")
+
+        assert len(computed_dates) == 2 * 24
+        assert self._read_output(end_date=self.end_date) == full_output
@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.processing.stage_cache import StageCache
+
+
+class TestStageCache:
+    def test_computes_once_per_distinct_inputs(self, tmp_path):
+        stage_cache = StageCache(cache_dir=str(tmp_path))
+        computed_inputs = []
+
+        def get_result(t_sky: np.ndarray, E_g: float) -> dict[str, np.ndarray]:
+            def compute() -> dict[str, np.ndarray]:
+                computed_inputs.append(E_g)
+                return {"power_output": t_sky * E_g}
+
+            return stage_cache.get_or_compute(
+                "maximum_power_points", compute=compute, t_sky=t_sky, E_g=E_g
+            )
+
+        t_sky = np.array([250.0, 260.0])
+        first = get_result(t_sky=t_sky, E_g=0.17)
+        assert stage_cache.contains("maximum_power_points", t_sky=t_sky, E_g=0.17)
+        np.testing.assert_array_equal(
+            get_result(t_sky=t_sky.copy(), E_g=0.17)["power_output"],
+            first["power_output"],
+        )
+        get_result(t_sky=t_sky, E_g=0.2)
+        get_result(t_sky=np.array([250.0, 261.0]), E_g=0.17)
+
+        assert computed_inputs == [0.17, 0.2, 0.17]
+        assert not stage_cache.contains("temperatures", t_sky=t_sky, E_g=0.17)
@@ -0,0 +1,216 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_era5 import create_synthetic_climate_data
+from src.calculators.device_spec import DeviceSpec
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.calculators.sky_temperature import SkyTemperature
+from src.exceptions import InsufficientClimateDataError
+from src.processing.save_output_between_dates import (
+    get_output_dir,
+    save_power_output_between_dates,
+)
+from src.processing.uncertainty import (
+    UNCERTAINTY_FILENAME,
+    UNCERTAINTY_HOURLY_FILENAME,
+    UncertaintyModel,
+)
+
+
+class TestUncertaintyModel:
+    lat = 53.4
+    lon = -6.3
+    dates = pd.date_range("2022-01-02", "2022-01-03 23:00", freq="h")
+
+    def test_samples_without_spread_match_deterministic_output(self):
+        climate_data_obj = create_synthetic_climate_data(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        power_output_samples = UncertaintyModel(
+            samples=2,
+            t_ambient_std_k=0,
+            t_surface_std_k=0,
+            coefficient_relative_std=0,
+            eta_std=0,
+        ).get_power_output_samples(
+            climate_data_obj=climate_data_obj,
+            lat=self.lat,
+            lon=self.lon,
+            dates=self.dates,
+            emissivity_method="martin-berdahl",
+        )
+
+        _, expected_power = MaximumPowerPointTracker.solve_batch(
+            t_sky=SkyTemperature(
+                surface_temperature_obj=climate_data_obj, lat=self.lat, lon=self.lon
+            ).get_sky_temperatures(dates=self.dates, formula="martin-berdahl"),
+            t_cell=climate_data_obj.get_values_from_dataset(
+                lat=self.lat, lon=self.lon, dataset_shortname="skt", dates=self.dates
+            ),
+            E_g=0.17,
+        )
+        assert power_output_samples.shape == (2, len(self.dates))
+        np.testing.assert_allclose(power_output_samples[0], expected_power)
+        np.testing.assert_allclose(power_output_samples[1], expected_power)
+
+    def test_hourly_percentiles_are_ordered(self):
+        climate_data_obj = create_synthetic_climate_data(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        uncertainty_model = UncertaintyModel(samples=50, chunk_size=1000)
+        hourly_percentiles = uncertainty_model.get_hourly_percentiles(
+            power_output_samples=uncertainty_model.get_power_output_samples(
+                climate_data_obj=climate_data_obj,
+                lat=self.lat,
+                lon=self.lon,
+                dates=self.dates,
+                emissivity_method="swinbank",
+            ),
+            dates=self.dates,
+        )
+
+        assert list(hourly_percentiles.columns) == [
+            "average_power_watts_per_sqm_p5",
+            "average_power_watts_per_sqm_p50",
+            "average_power_watts_per_sqm_p95",
+        ]
+        assert np.all(np.diff(hourly_percentiles.to_numpy(), axis=1) >= 0)
+        assert np.any(np.diff(hourly_percentiles.to_numpy(), axis=1) > 0)
+
+    def test_samples_are_of_the_device(self):
+        climate_data_obj = create_synthetic_climate_data(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        device = DeviceSpec(
+            name="InSb", E_g=0.23, eta=0.05, emissivity=0.9, voltage_bounds=(-2, 0)
+        )
+        power_output_samples = UncertaintyModel(
+            samples=1,
+            t_ambient_std_k=0,
+            t_surface_std_k=0,
+            coefficient_relative_std=0,
+            eta_std=0,
+        ).get_power_output_samples(
+            climate_data_obj=climate_data_obj,
+            lat=self.lat,
+            lon=self.lon,
+            dates=self.dates,
+            emissivity_method="swinbank",
+            device=device,
+        )
+
+        _, expected_power = MaximumPowerPointTracker.solve_batch(
+            t_sky=SkyTemperature(
+                surface_temperature_obj=climate_data_obj, lat=self.lat, lon=self.lon
+            ).get_sky_temperatures(dates=self.dates, formula="swinbank"),
+            t_cell=climate_data_obj.get_values_from_dataset(
+                lat=self.lat, lon=self.lon, dataset_shortname="skt", dates=self.dates
+            ),
+            E_g=device.E_g,
+            eta=device.eta,
+            voltage_bounds=device.voltage_bounds,
+            emissivity=device.emissivity,
+        )
+        np.testing.assert_allclose(power_output_samples[0], expected_power)
+
+    def test_masked_hours_without_climate_data_are_nan(self):
+        climate_data_obj = create_synthetic_climate_data(
+            lat=self.lat, lon=self.lon, year=2022, month=1
+        )
+        skt = climate_data_obj.temperature_datasets[(1, "skt")]
+        climate_data_obj.temperature_datasets[(1, "skt")] = skt.where(
+            skt["time"] != pd.Timestamp("2022-01-02 05:00")
+        )
+        kwargs = dict(
+            climate_data_obj=climate_data_obj,
+            lat=self.lat,
+            lon=self.lon,
+            dates=self.dates,
+            emissivity_method="swinbank",
+        )
+        uncertainty_model = UncertaintyModel(samples=10)
+
+        with pytest.raises(InsufficientClimateDataError):
+            uncertainty_model.get_power_output_samples(**kwargs)
+        power_output_samples = uncertainty_model.get_power_output_samples(
+            masked=True, **kwargs
+        )
+        np.testing.assert_array_equal(
+            np.isnan(power_output_samples).all(axis=0),
+            self.dates == pd.Timestamp("2022-01-02 05:00"),
+        )
+        assert not np.isnan(np.delete(power_output_samples, 5, axis=1)).any()
+
+
+class TestUncertaintyWriter:
+    lat = 53.4
+    lon = -6.3
+    start_date = datetime(2022, 1, 2)
+    previous_end_date = datetime(2022, 1, 2)
+    end_date = datetime(2022, 1, 3)
+
+    def _save(self, end_date: datetime, incremental: bool) -> str:
+        save_power_output_between_dates(
+            climate_data_obj=create_synthetic_climate_data(
+                lat=self.lat, lon=self.lon, year=2022, month=1
+            ),
+            lon=self.lon,
+            lat=self.lat,
+            start_date=self.start_date,
+            end_date=end_date,
+            emissivity_method="swinbank",
+            incremental=incremental,
+            uncertainty_model=UncertaintyModel(samples=20),
+        )
+        return get_output_dir(
+            emissivity_method="swinbank",
+            start_date=self.start_date,
+            end_date=end_date,
+            lat=self.lat,
+            lon=self.lon,
+        )
+
+    def test_extends_bands_of_previous_output(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        previous_output_dir = self._save(
+            end_date=self.previous_end_date, incremental=False
+        )
+        with open(os.path.join(previous_output_dir, UNCERTAINTY_FILENAME)) as infile:
+            previous_uncertainty = json.load(infile)
+
+        sampled_hours = []
+        get_power_output_samples = UncertaintyModel.get_power_output_samples
+
+        def record_sampled_hours(self, dates, **kwargs):
+            sampled_hours.extend(dates)
+            return get_power_output_samples(self, dates=dates, **kwargs)
+
+        monkeypatch.setattr(
+            UncertaintyModel, "get_power_output_samples", record_sampled_hours
+        )
+        output_dir = self._save(end_date=self.end_date, incremental=True)
+        assert sampled_hours == list(pd.date_range(self.end_date, periods=24, freq="h"))
+        with open(os.path.join(output_dir, UNCERTAINTY_FILENAME)) as infile:
+            uncertainty = json.load(infile)
+        hourly_percentiles = pd.read_csv(
+            os.path.join(output_dir, UNCERTAINTY_HOURLY_FILENAME), index_col=0
+        )
+        assert len(hourly_percentiles) == 2 * 24
+        assert hourly_percentiles.notna().all(axis=None)
+        with open(os.path.join(output_dir, "json_data.json")) as infile:
+            assert json.load(infile)["output_settings"]["uncertainty_samples"] == 20
+        # Each sample's total adds the new day's non-negative output to its previous total
+        assert np.all(
+            np.array(uncertainty["total_kwh_per_square_m_samples"])
+            >= np.array(previous_uncertainty["total_kwh_per_square_m_samples"])
+        )
+        assert list(uncertainty["total_kwh_per_square_m_percentiles"]) == [
+            "p5",
+            "p50",
+            "p95",
+        ]
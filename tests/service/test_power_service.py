@@ -0,0 +1,297 @@
+import json
+import math
+import os
+import threading
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_era5 import create_synthetic_month_datasets
+from src.api.copernicus_climate_data import CopernicusClimateData
+from src.calculators.maximum_power_point_tracker import MaximumPowerPointTracker
+from src.service.power_service import (
+    OUTPUT_COLUMNS,
+    BatchingSolver,
+    ClimateDataCache,
+    PowerQueryService,
+    create_request_handler,
+)
+
+FAILING_LAT = 54.4
+
+
+class _SyntheticClimateData:
+    """Stands in for CopernicusClimateData, recording the tiles it is asked to load. Skin temperatures are NaN in
+    the tile containing `FAILING_LAT`."""
+
+    def __init__(self):
+        self.requests: list[tuple[float, float, int, list[int]]] = []
+        self.closed: list[CopernicusClimateData] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, if_load_entire_earth, year, months, lon, lat):
+        with self._lock:
+            self.requests.append((lat, lon, year, months))
+        datasets = {
+            key: dataset
+            for month in months
+            for key, dataset in create_synthetic_month_datasets(
+                lat=lat, lon=lon, year=year, month=month
+            ).items()
+        }
+        if math.floor(lat) == math.floor(FAILING_LAT):
+            for month in months:
+                datasets[(month, "skt")] = datasets[(month, "skt")] * float("nan")
+        climate_data_obj = CopernicusClimateData.from_datasets(
+            temperature_datasets=datasets
+        )
+        climate_data_close = climate_data_obj.close
+
+        def close():
+            self.closed.append(climate_data_obj)
+            climate_data_close()
+
+        climate_data_obj.close = close
+        return climate_data_obj
+
+
+@pytest.fixture
+def synthetic_climate_data(monkeypatch) -> _SyntheticClimateData:
+    synthetic_climate_data = _SyntheticClimateData()
+    monkeypatch.setattr(
+        "src.service.power_service.CopernicusClimateData", synthetic_climate_data
+    )
+    return synthetic_climate_data
+
+
+@pytest.fixture
+def service_url(synthetic_climate_data, tmp_path, monkeypatch):
+    # Processed results are looked up under the working directory
+    monkeypatch.chdir(tmp_path)
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), create_request_handler(service=PowerQueryService())
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/power"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url: str) -> tuple[int, dict]:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+class TestPowerRequestHandler:
+    def test_json_output(self, service_url):
+        status, body = _get(
+            f"{service_url}?lat=53.4&lon=-6.3&start=2022-01-01&end=2022-01-02&method=swinbank"
+        )
+        assert status == HTTPStatus.OK
+        assert body["method"] == "swinbank"
+        assert len(body["hourly"]["datetime"]) == 48
+        assert body["hourly"]["datetime"][0] == "2022-01-01T00:00:00"
+        for column in OUTPUT_COLUMNS:
+            assert np.all(np.isfinite(body["hourly"][column]))
+        power = np.array(body["hourly"]["average_power_watts_per_sqm"])
+        assert body["total_kwh_per_square_m"] == pytest.approx(
+            power[power > 0].sum() / 1000
+        )
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "lon=-6.3&start=2022-01-01&end=2022-01-02",
+            "lat=53.4&lon=-6.3&start=yesterday&end=2022-01-02",
+            "lat=53.4&lon=-6.3&start=2022-01-02&end=2022-01-01",
+            "lat=53.4&lon=-6.3&start=2022-01-01&end=2022-01-02&method=unknown",
+        ],
+    )
+    def test_invalid_query_is_bad_request(self, service_url, query):
+        status, body = _get(f"{service_url}?{query}")
+        assert status == HTTPStatus.BAD_REQUEST
+        assert body["error"]
+
+    def test_point_on_whole_degrees(self, service_url, synthetic_climate_data):
+        status, body = _get(
+            f"{service_url}?lat=53&lon=-7&start=2022-01-01&end=2022-01-01"
+        )
+        assert status == HTTPStatus.OK
+        assert np.all(np.isfinite(body["hourly"]["average_power_watts_per_sqm"]))
+        assert synthetic_climate_data.requests == [(53.5, -6.5, 2022, [1])]
+
+    def test_nearest_processed_sites(self, service_url):
+        for lat, lon, total_kwh in [(53.4, -6.3, 1.5), (51.5, -0.1, 2.5)]:
+            output_dir = (
+                f"data/out/swinbank/20220101-000000_20220102-000000/{lat}_{lon}/"
+            )
+            os.makedirs(output_dir)
+            with open(os.path.join(output_dir, "json_data.json"), "w") as outfile:
+                json.dump({"total_kwh_per_square_m": total_kwh}, outfile)
+
+        status, body = _get(
+            f"{service_url.replace('/power', '/sites')}"
+            "?lat=53.3&lon=-6.2&start=2022-01-01&end=2022-01-02&method=swinbank&n=2"
+        )
+        assert status == HTTPStatus.OK
+        assert [(site["lat"], site["lon"]) for site in body["sites"]] == [
+            (53.4, -6.3),
+            (51.5, -0.1),
+        ]
+        assert body["sites"][0]["total_kwh_per_square_m"] == 1.5
+        assert body["sites"][0]["distance_km"] < body["sites"][1]["distance_km"]
+
+    def test_missing_climate_data_is_unprocessable(self, service_url):
+        status, body = _get(
+            f"{service_url}?lat={FAILING_LAT}&lon=-6.3&start=2022-01-01&end=2022-01-01"
+        )
+        assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+        assert body["error"]
+
+
+class TestClimateDataCache:
+    @pytest.mark.parametrize(
+        "lat, lon, tile",
+        [
+            (53.4, -6.3, (53, -7)),
+            (53.0, -7.0, (53, -7)),
+            (90.0, 180.0, (89, 179)),
+            (-90.0, -180.0, (-90, -180)),
+        ],
+    )
+    def test_get_tile(self, lat, lon, tile):
+        assert ClimateDataCache.get_tile(lat=lat, lon=lon) == tile
+
+    def test_points_in_a_tile_share_its_climate_data(self, synthetic_climate_data):
+        climate_data_cache = ClimateDataCache()
+        with climate_data_cache.checkout(lat=53.0, lon=-7.0, year=2022, month=1):
+            pass
+        with climate_data_cache.checkout(lat=53.9, lon=-6.1, year=2022, month=1):
+            pass
+        assert synthetic_climate_data.requests == [(53.5, -6.5, 2022, [1])]
+
+    def test_concurrent_requests_for_a_tile_load_it_once(self, synthetic_climate_data):
+        climate_data_cache = ClimateDataCache()
+        barrier = threading.Barrier(4)
+        climate_data_objs = []
+
+        def checkout():
+            barrier.wait()
+            with climate_data_cache.checkout(
+                lat=53.4, lon=-6.3, year=2022, month=1
+            ) as climate_data_obj:
+                climate_data_objs.append(climate_data_obj)
+
+        threads = [threading.Thread(target=checkout) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(synthetic_climate_data.requests) == 1
+        assert len(climate_data_objs) == 4
+        assert all(obj is climate_data_objs[0] for obj in climate_data_objs)
+
+    def test_other_tiles_load_while_a_tile_is_loading(self, monkeypatch):
+        if_slow_load_started = threading.Event()
+        if_slow_load_released = threading.Event()
+
+        def load(if_load_entire_earth, year, months, lon, lat):
+            if lat == 10.5:
+                if_slow_load_started.set()
+                if_slow_load_released.wait(timeout=10)
+            return object()
+
+        monkeypatch.setattr("src.service.power_service.CopernicusClimateData", load)
+        climate_data_cache = ClimateDataCache()
+
+        def checkout_slow_tile():
+            with climate_data_cache.checkout(lat=10.5, lon=0.5, year=2022, month=1):
+                pass
+
+        slow_thread = threading.Thread(target=checkout_slow_tile)
+        slow_thread.start()
+        assert if_slow_load_started.wait(timeout=10)
+        with climate_data_cache.checkout(lat=20.5, lon=0.5, year=2022, month=1):
+            assert not if_slow_load_released.is_set()
+        if_slow_load_released.set()
+        slow_thread.join()
+
+    def test_evicted_climate_data_is_closed_once_checked_in(
+        self, synthetic_climate_data
+    ):
+        climate_data_cache = ClimateDataCache(max_entries=1)
+        with climate_data_cache.checkout(
+            lat=53.4, lon=-6.3, year=2022, month=1
+        ) as first_climate_data_obj:
+            with climate_data_cache.checkout(lat=53.4, lon=-6.3, year=2022, month=2):
+                pass
+            assert synthetic_climate_data.closed == []
+            assert first_climate_data_obj.temperature_datasets
+        assert synthetic_climate_data.closed == [first_climate_data_obj]
+
+    def test_failed_load_is_retried(self, monkeypatch):
+        attempts = []
+
+        def load(if_load_entire_earth, year, months, lon, lat):
+            attempts.append(lat)
+            if len(attempts) == 1:
+                raise ConnectionError("CDS unavailable")
+            return object()
+
+        monkeypatch.setattr("src.service.power_service.CopernicusClimateData", load)
+        climate_data_cache = ClimateDataCache()
+        with pytest.raises(ConnectionError):
+            with climate_data_cache.checkout(lat=53.4, lon=-6.3, year=2022, month=1):
+                pass
+        with climate_data_cache.checkout(lat=53.4, lon=-6.3, year=2022, month=1):
+            pass
+        assert len(attempts) == 2
+
+
+class TestBatchingSolver:
+    def test_cache_keeps_most_recently_used_points(self):
+        solver = BatchingSolver(max_entries=3)
+        solver.solve(
+            t_sky=np.array([250.0, 251.0]), t_cell=np.array([280.0, 281.0]), E_g=0.17
+        )
+        solver.solve(t_sky=np.array([250.0]), t_cell=np.array([280.0]), E_g=0.17)
+        optimal_voltages, max_powers = solver.solve(
+            t_sky=np.array([252.0, 253.0]), t_cell=np.array([282.0, 283.0]), E_g=0.17
+        )
+
+        assert list(solver.cache) == [
+            (0.17, 250.0, 280.0),
+            (0.17, 252.0, 282.0),
+            (0.17, 253.0, 283.0),
+        ]
+        (
+            expected_optimal_voltages,
+            expected_max_powers,
+        ) = MaximumPowerPointTracker.solve_batch(
+            t_sky=np.array([252.0, 253.0]),
+            t_cell=np.array([282.0, 283.0]),
+            E_g=0.17,
+        )
+        np.testing.assert_array_equal(optimal_voltages, expected_optimal_voltages)
+        np.testing.assert_array_equal(max_powers, expected_max_powers)
+
+    def test_batch_larger_than_cache_is_solved(self):
+        solver = BatchingSolver(max_entries=1)
+        optimal_voltages, max_powers = solver.solve(
+            t_sky=np.array([250.0, 251.0, 252.0]),
+            t_cell=np.array([280.0, 281.0, 282.0]),
+            E_g=0.17,
+        )
+
+        assert len(solver.cache) == 1
+        assert np.all(np.isfinite(max_powers))
+        assert len(optimal_voltages) == 3
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from src.stats.power_output_aggregates import PowerOutputAggregates
+
+
+class TestPowerOutputAggregates:
+    def test_batched_updates_match_groupby(self, tmp_path):
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2022-01-01", "2022-03-31 23:00", freq="h")
+        power = rng.normal(loc=1000.0, scale=2000.0, size=len(index))
+        power[rng.choice(len(index), size=50, replace=False)] = np.nan
+
+        aggregates = PowerOutputAggregates()
+        for start in range(0, len(index), 500):
+            aggregates.update(
+                dates=index[start : start + 500], power=power[start : start + 500]
+            )
+        aggregates.save(str(tmp_path / "aggregates.csv"))
+        aggregates_df = PowerOutputAggregates.load(
+            str(tmp_path / "aggregates.csv")
+        ).to_dataframe()
+
+        df = pd.DataFrame({"power": power}, index=index)
+        for period, keys in [("hour", df.index.hour), ("month", df.index.month)]:
+            non_negative = df["power"].where(df["power"] >= 0)
+            expected = non_negative.groupby(keys).agg(
+                ["count", "mean", "std", "min", "max"]
+            )
+            positive = df["power"].where(df["power"] > 0).groupby(keys)
+            actual = aggregates_df[
+                (aggregates_df["period"] == period) & (aggregates_df["count"] > 0)
+            ]
+            np.testing.assert_array_equal(actual["value"], expected.index)
+            np.testing.assert_array_equal(actual["count"], expected["count"])
+            np.testing.assert_allclose(actual["mean"], expected["mean"])
+            np.testing.assert_allclose(
+                np.sqrt(actual["m2"] / (actual["count"] - 1)), expected["std"]
+            )
+            np.testing.assert_array_equal(actual["min"], expected["min"])
+            np.testing.assert_array_equal(actual["max"], expected["max"])
+            np.testing.assert_array_equal(actual["positive_hours"], positive.count())
+            np.testing.assert_allclose(actual["total_kwh"], positive.sum() / 1000)
+        assert (
+            aggregates_df.loc[aggregates_df["period"] == "month", "count"] == 0
+        ).sum() == 9
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from src.processing.stage_cache import StageCache
+from src.stats.regional_statistics import (
+    REGIONAL_STATISTICS_FILENAME,
+    RegionalStatistics,
+)
+
+
+class TestRegionalStatistics:
+    regions = gpd.GeoDataFrame(
+        {"name": ["North", "South"]},
+        geometry=[box(0, 0, 10, 60), box(0, -60, 10, 0)],
+        crs="EPSG:4326",
+    )
+    locations_df = pd.DataFrame(
+        {
+            "lat": [10.0, 50.0, -30.0, 20.0],
+            "lon": [5.0, 5.0, 5.0, 20.0],
+            "total_kwh_per_square_m": [1.0, 3.0, 2.0, 5.0],
+        }
+    )
+
+    def test_weights_by_area_and_excludes_locations_outside_regions(self, tmp_path):
+        statistics_df = RegionalStatistics(
+            regions=self.regions, stage_cache=StageCache(cache_dir=str(tmp_path))
+        ).get_regional_statistics(locations_df=self.locations_df)
+
+        weights = np.cos(np.radians([10.0, 50.0]))
+        mean = np.average([1.0, 3.0], weights=weights)
+        assert statistics_df["region"].tolist() == ["North", "South"]
+        assert statistics_df["locations"].tolist() == [2, 1]
+        np.testing.assert_allclose(statistics_df["mean_kwh_per_square_m"], [mean, 2.0])
+        np.testing.assert_allclose(
+            statistics_df["std_kwh_per_square_m"],
+            [np.sqrt(np.average(([1.0, 3.0] - mean) ** 2, weights=weights)), 0.0],
+        )
+        assert statistics_df["max_kwh_per_square_m"].tolist() == [3.0, 2.0]
+
+    def test_caches_region_assignments(self, tmp_path):
+        stage_cache = StageCache(cache_dir=str(tmp_path))
+        lat, lon = (
+            self.locations_df["lat"].to_numpy(),
+            self.locations_df["lon"].to_numpy(),
+        )
+        region_codes = RegionalStatistics(
+            regions=self.regions, stage_cache=stage_cache
+        ).get_region_codes(lat=lat, lon=lon)
+
+        np.testing.assert_array_equal(region_codes, [0, 0, 1, -1])
+        assert stage_cache.contains(
+            "region_assignments",
+            lat=lat,
+            lon=lon,
+            regions=RegionalStatistics(regions=self.regions).regions_hash,
+        )
+        moved_regions = self.regions.assign(geometry=self.regions.translate(xoff=15))
+        np.testing.assert_array_equal(
+            RegionalStatistics(
+                regions=moved_regions, stage_cache=stage_cache
+            ).get_region_codes(lat=lat, lon=lon),
+            [-1, -1, -1, 0],
+        )
+
+    def test_outputs_statistics_of_the_requested_period(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        for period, total_kwh in [
+            ("20230101-000000_20230131-000000", 1.0),
+            ("20220101-000000_20221231-000000", 4.0),
+        ]:
+            output_dir = f"data/out/swinbank/{period}/10.0_5.0/"
+            os.makedirs(output_dir)
+            with open(os.path.join(output_dir, "json_data.json"), "w") as outfile:
+                json.dump({"total_kwh_per_square_m": total_kwh}, outfile)
+
+        statistics_df = RegionalStatistics(
+            regions=self.regions,
+            stage_cache=StageCache(cache_dir=str(tmp_path / "cache")),
+            start_date=datetime(2022, 1, 1),
+            end_date=datetime(2022, 12, 31),
+        ).output_regional_statistics(emissivity_method="swinbank")
+
+        assert statistics_df["mean_kwh_per_square_m"].tolist() == [4.0]
+        assert os.path.isfile(
+            f"data/out/swinbank/20220101-000000_20221231-000000/{REGIONAL_STATISTICS_FILENAME}"
+        )
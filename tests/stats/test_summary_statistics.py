@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from src.stats.summary_statistics import SummaryStatistics
+
+
+class TestSummaryStatistics:
+    def test_consolidated_statistics_match_per_location_groupby(self):
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2022-01-01", "2022-03-31 23:00", freq="h")
+        data_dict = {
+            location_index: (
+                lat,
+                lon,
+                0.0,
+                pd.DataFrame(
+                    {"average_power_watts_per_sqm": rng.normal(size=len(index))},
+                    index=index,
+                ),
+            )
+            for location_index, (lat, lon) in enumerate([(-2.5, 10.5), (52.5, -7.5)])
+        }
+
+        statistics_df = SummaryStatistics.get_summary_statistics(
+            locations_df=pd.DataFrame(
+                [(lat, lon) for lat, lon, _, _ in data_dict.values()],
+                columns=["lat", "lon"],
+            ),
+            long_df=SummaryStatistics.get_long_table(processed_data=data_dict.values()),
+        )
+
+        for lat, lon, _, df in data_dict.values():
+            df = df[df["average_power_watts_per_sqm"] >= 0]
+            location_df = statistics_df[
+                (statistics_df["lat"] == lat) & (statistics_df["lon"] == lon)
+            ]
+            for period, keys in [("hour", df.index.hour), ("month", df.index.month)]:
+                expected = df.groupby(keys)["average_power_watts_per_sqm"].agg(
+                    ["mean", "std"]
+                )
+                actual = location_df[location_df["period"] == period]
+                np.testing.assert_array_equal(actual["value"], expected.index)
+                np.testing.assert_allclose(actual["mean"], expected["mean"])
+                np.testing.assert_allclose(actual["std"], expected["std"])
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from src.dates import (
+    get_hourly_dates_between_period,
+    get_hourly_datetimes_between_period,
+    get_month_windows_between_period,
+)
+
+
+class TestGetHourlyDatesBetweenPeriod:
+    def test_matches_hourly_datetimes(self):
+        start_date, end_date = datetime(2023, 12, 30), datetime(2024, 1, 2)
+        assert get_hourly_dates_between_period(
+            start_date=start_date, end_date=end_date
+        ).to_pydatetime().tolist() == get_hourly_datetimes_between_period(
+            start_date=start_date, end_date=end_date
+        )
+
+
+class TestGetMonthWindowsBetweenPeriod:
+    def test_spans_year_boundary(self):
+        assert get_month_windows_between_period(
+            start_date=datetime(2021, 12, 15), end_date=datetime(2022, 2, 3)
+        ) == [
+            (datetime(2021, 12, 15), datetime(2021, 12, 31)),
+            (datetime(2022, 1, 1), datetime(2022, 1, 31)),
+            (datetime(2022, 2, 1), datetime(2022, 2, 3)),
+        ]
+
+    def test_single_month(self):
+        assert get_month_windows_between_period(
+            start_date=datetime(2024, 2, 1), end_date=datetime(2024, 2, 29)
+        ) == [(datetime(2024, 2, 1), datetime(2024, 2, 29))]
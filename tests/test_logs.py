@@ -0,0 +1,157 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from src.logs import ProgressReporter, configure_logging
+
+
+class _Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr("src.logs.time.monotonic", clock)
+    return clock
+
+
+def _read_reports(json_stream_path) -> list[dict]:
+    with open(json_stream_path) as infile:
+        return [json.loads(line) for line in infile]
+
+
+class TestConfigureLogging:
+    def test_sets_level_and_format(self, monkeypatch):
+        root_logger = logging.getLogger()
+        # basicConfig only configures a root logger without handlers; restored after the test
+        monkeypatch.setattr(root_logger, "handlers", [])
+        monkeypatch.setattr(root_logger, "level", root_logger.level)
+
+        configure_logging(level="debug")
+
+        assert root_logger.level == logging.DEBUG
+        [handler] = root_logger.handlers
+        assert (
+            handler.formatter._fmt == "%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+
+
+class TestProgressReporter:
+    def test_reports_at_most_once_per_interval(self, clock, tmp_path, caplog):
+        caplog.set_level(logging.INFO, logger="src.logs")
+        json_stream_path = tmp_path / "progress.jsonl"
+        reporter = ProgressReporter(
+            total_coordinates=10,
+            hours_per_coordinate=24,
+            min_interval_seconds=10.0,
+            json_stream_path=str(json_stream_path),
+        )
+        for seconds in [1, 5, 9.9, 10, 12, 19.9, 20.5]:
+            clock.now = 1000.0 + seconds
+            reporter.add_hours(24)
+        reporter.close()
+
+        reports = _read_reports(json_stream_path)
+        assert [report["event"] for report in reports] == [
+            "progress",
+            "progress",
+            "finished",
+        ]
+        assert [report["hours_done"] for report in reports] == [96, 168, 168]
+        assert len(caplog.records) == 3
+
+    def test_json_lines_are_appended(self, clock, tmp_path):
+        json_stream_path = tmp_path / "progress.jsonl"
+        for _ in range(2):
+            reporter = ProgressReporter(
+                total_coordinates=2,
+                hours_per_coordinate=24,
+                json_stream_path=str(json_stream_path),
+            )
+            clock.now += 4
+            reporter.add_hours(24)
+            reporter.coordinate_completed(skipped=True)
+            reporter.close()
+
+        reports = _read_reports(json_stream_path)
+        assert len(reports) == 2
+        assert set(reports[0]) == {
+            "event",
+            "timestamp",
+            "elapsed_seconds",
+            "coordinates_done",
+            "coordinates_skipped",
+            "coordinates_total",
+            "hours_done",
+            "coordinates_per_second",
+            "hours_per_second",
+            "eta_seconds",
+        }
+        assert reports[1]["elapsed_seconds"] == pytest.approx(4.0)
+        assert reports[1]["coordinates_skipped"] == 1
+        assert reports[1]["coordinates_per_second"] == pytest.approx(0.25)
+
+    def test_eta(self, clock, tmp_path, caplog):
+        caplog.set_level(logging.INFO, logger="src.logs")
+        json_stream_path = tmp_path / "progress.jsonl"
+        reporter = ProgressReporter(
+            total_coordinates=4,
+            hours_per_coordinate=24,
+            min_interval_seconds=0.0,
+            json_stream_path=str(json_stream_path),
+        )
+        reporter.add_hours(0)
+        clock.now += 10
+        # From hourly throughput until the first coordinate completes
+        reporter.add_hours(12)
+        clock.now += 10
+        reporter.add_hours(12)
+        reporter.coordinate_completed()
+        reporter.close()
+
+        eta_seconds = [
+            report["eta_seconds"] for report in _read_reports(json_stream_path)
+        ]
+        assert eta_seconds[0] is None
+        assert eta_seconds[1] == pytest.approx((4 * 24 - 12) / 1.2)
+        assert eta_seconds[2] == pytest.approx(3 / 0.05)
+        assert "ETA unknown" in caplog.records[0].getMessage()
+        assert "ETA 0:01:10" in caplog.records[1].getMessage()
+
+    def test_counts_are_exact_across_threads(self, tmp_path):
+        json_stream_path = tmp_path / "progress.jsonl"
+        reporter = ProgressReporter(
+            total_coordinates=8000,
+            hours_per_coordinate=24,
+            min_interval_seconds=0.0,
+            json_stream_path=str(json_stream_path),
+        )
+
+        def report_coordinates():
+            for _ in range(1000):
+                reporter.add_hours(24)
+                reporter.coordinate_completed()
+
+        threads = [threading.Thread(target=report_coordinates) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reporter.close()
+
+        assert reporter.coordinates_done == 8000
+        assert reporter.hours_done == 8000 * 24
+        with open(json_stream_path) as infile:
+            reports = [json.loads(line) for line in infile]
+        assert reports[-1]["event"] == "finished"
+        assert reports[-1]["coordinates_done"] == 8000
+        # Every report is written whole and the counts it saw only ever increase
+        hours_done = [report["hours_done"] for report in reports]
+        assert hours_done == sorted(hours_done)
@@ -0,0 +1,145 @@
+import json
+import threading
+
+import pytest
+
+from src.profiling import StageProfiler, profiled, profiler
+
+
+class _Clock:
+    def __init__(self):
+        self.now: float = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr("src.profiling.time.perf_counter", clock)
+    return clock
+
+
+@pytest.fixture
+def stage_profiler():
+    stage_profiler = StageProfiler()
+    stage_profiler.enable()
+    yield stage_profiler
+    stage_profiler.disable()
+
+
+class TestStageProfiler:
+    def test_nested_stage_times(self, clock, stage_profiler):
+        with stage_profiler.stage("outer"):
+            clock.now += 2
+            for _ in range(2):
+                with stage_profiler.stage("inner"):
+                    clock.now += 3
+            clock.now += 1
+
+        stages = stage_profiler.get_report()["stages"]
+        assert stages["outer"]["calls"] == 1
+        assert stages["outer"]["wall_time_seconds"] == pytest.approx(9)
+        assert stages["outer"]["self_time_seconds"] == pytest.approx(3)
+        assert stages["inner"]["calls"] == 2
+        assert stages["inner"]["wall_time_seconds"] == pytest.approx(6)
+        assert stages["inner"]["self_time_seconds"] == pytest.approx(6)
+
+    def test_recursive_stages_are_counted_once(self, clock, stage_profiler):
+        with stage_profiler.stage("solve"):
+            clock.now += 1
+            with stage_profiler.stage("solve"):
+                clock.now += 2
+
+        stages = stage_profiler.get_report()["stages"]
+        assert stages["solve"]["calls"] == 2
+        assert stages["solve"]["wall_time_seconds"] == pytest.approx(3)
+        assert stages["solve"]["self_time_seconds"] == pytest.approx(3)
+
+    def test_counters_and_cache_hit_rate(self, stage_profiler):
+        assert (
+            stage_profiler.get_report()["maximum_power_point_tracker_cache_hit_rate"]
+            is None
+        )
+        stage_profiler.count("maximum_power_point_tracker.cache_hits", 3)
+        stage_profiler.count("maximum_power_point_tracker.cache_misses")
+        stage_profiler.count("downloads")
+
+        report = stage_profiler.get_report()
+        assert report["counters"]["downloads"] == 1
+        assert report["maximum_power_point_tracker_cache_hit_rate"] == 0.75
+
+    def test_peak_memory_includes_children(self, stage_profiler):
+        with stage_profiler.stage("outer"):
+            with stage_profiler.stage("inner"):
+                allocation = bytearray(10_000_000)
+            del allocation
+
+        stages = stage_profiler.get_report()["stages"]
+        assert stages["inner"]["peak_memory_bytes"] >= 10_000_000
+        assert stages["outer"]["peak_memory_bytes"] >= 10_000_000
+
+    def test_saves_json_report_and_folded_stacks(self, clock, stage_profiler, tmp_path):
+        with stage_profiler.stage("outer"):
+            clock.now += 0.5
+            with stage_profiler.stage("inner"):
+                clock.now += 0.25
+        stage_profiler.save_report(output_dir=str(tmp_path))
+
+        [json_filepath] = tmp_path.glob("profile_*.json")
+        with open(json_filepath) as infile:
+            report = json.load(infile)
+        assert report["stages"]["inner"]["wall_time_seconds"] == pytest.approx(0.25)
+        [folded_filepath] = tmp_path.glob("profile_*.folded")
+        assert folded_filepath.read_text() == "outer 500000\nouter;inner 250000\n"
+
+    def test_disabled_profiler_records_nothing(self):
+        stage_profiler = StageProfiler()
+        with stage_profiler.stage("outer"):
+            stage_profiler.count("downloads")
+        assert stage_profiler.get_report()["stages"] == {}
+        assert stage_profiler.get_report()["counters"] == {}
+
+    def test_profiled_functions_are_stages_of_the_global_profiler(self):
+        @profiled("double")
+        def double(value: int) -> int:
+            return 2 * value
+
+        assert double(2) == 4
+        profiler.enable()
+        try:
+            assert double(3) == 6
+        finally:
+            profiler.disable()
+        assert profiler.get_report()["stages"]["double"]["calls"] == 1
+
+    def test_threads_nest_stages_on_their_own_stacks(self, stage_profiler):
+        barrier = threading.Barrier(2)
+
+        def run_stages(stage_name: str):
+            with stage_profiler.stage(stage_name):
+                # Both threads have their stage open before either opens a child
+                barrier.wait()
+                for _ in range(100):
+                    with stage_profiler.stage("child"):
+                        stage_profiler.count("children")
+
+        threads = [
+            threading.Thread(target=run_stages, args=(stage_name,))
+            for stage_name in ["load", "compute"]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [line.split(" ")[0] for line in stage_profiler.get_folded_stacks()] == [
+            "compute",
+            "compute;child",
+            "load",
+            "load;child",
+        ]
+        report = stage_profiler.get_report()
+        assert report["stages"]["child"]["calls"] == 200
+        assert report["counters"]["children"] == 200